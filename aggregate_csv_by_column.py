@@ -1,19 +1,171 @@
 import pandas as pd
 import os
+import time
+import column_cache
+import compressed_csv
+import csv_dialect
+import incremental_csv
+import parallel_csv
+import sketches
+import stage_timer
 
-def load_csv(filename):
-    try:
-        # Attempts to load the file with a comma delimiter
-        data = pd.read_csv(filename)
-        return data
-    except pd.errors.ParserError:
-        # If an error occurs, tries to load with a semicolon delimiter
-        data = pd.read_csv(filename, delimiter=';', quotechar='"')
-        return data
+# Number of rows read at once by the chunked aggregation
+CHUNK_SIZE = 1_000_000
+# Number of the most frequent groups listed by the approximate mode
+TOP_K = 100
+
+def load_csv(filename, nrows=None):
+    # Loads the file with the delimiter, quote character and encoding detected from its beginning
+    data = csv_dialect.read_csv(filename, nrows=nrows)
+    return data
+
+def count_groups_in_chunks(filename, column_name, chunksize=CHUNK_SIZE):
+    # Reads the file with its detected dialect
+    read_options = csv_dialect.read_options(csv_dialect.detect_dialect(filename))
+    return count_groups(filename, column_name, chunksize, **read_options)
+
+def count_groups(filename, column_name, chunksize=CHUNK_SIZE, **read_options):
+    # Reads only the selected column chunk by chunk and keeps running counts per group,
+    # so the memory used depends on the number of distinct values, not on the file size.
+    # The values are read as text, pandas would guess the type of every chunk separately.
+    counts = pd.Series(dtype='int64')
+    total_rows = 0
+    start_time = time.perf_counter()
+
+    reader = compressed_csv.read_csv(filename, usecols=[column_name], dtype={column_name: str}, chunksize=chunksize,
+                                     **read_options)
+    for chunk in reader:
+        with stage_timer.stage('aggregate', len(chunk)):
+            chunk_counts = chunk[column_name].value_counts(sort=False, dropna=False)
+            counts = counts.add(chunk_counts, fill_value=0)
+        total_rows += len(chunk)
+
+    elapsed = time.perf_counter() - start_time
+    rows_per_second = total_rows / elapsed if elapsed > 0 else 0
+    print(f"\nProcessed {total_rows} rows in {elapsed:.2f} s ({rows_per_second:,.0f} rows/s).")
+
+    # Same shape as data.groupby(column_name).size().reset_index(name='Row Count'),
+    # the keys get the type of the whole column
+    counts = csv_dialect.typed_keys(counts).groupby(level=0).sum().astype('int64').sort_index()
+    counts.index.name = column_name
+    return counts.reset_index(name='Row Count')
+
+def count_groups_cached(filename, column_name):
+    # Loads only the selected column through the columnar cache (memory-mapped after the first run)
+    with stage_timer.stage('load') as load_stage:
+        data = column_cache.read_csv(filename, columns=[column_name])
+        load_stage.rows = len(data)
+    with stage_timer.stage('aggregate', len(data)):
+        return data.groupby(column_name, observed=True).size().reset_index(name='Row Count')
+
+def count_groups_in_parallel(filename, column_name, workers):
+    # Reads the file with its detected dialect
+    read_options = csv_dialect.read_options(csv_dialect.detect_dialect(filename))
+    partial_counts = parallel_csv.run_on_byte_ranges(count_byte_range, filename, workers, column_name,
+                                                     **read_options)
+
+    # Merges the partial counts of all byte ranges, the keys get the type of the whole column
+    with stage_timer.stage('merge partial results'):
+        counts = csv_dialect.typed_keys(pd.concat(partial_counts)).groupby(level=0).sum().astype('int64').sort_index()
+    counts.index.name = column_name
+    return counts.reset_index(name='Row Count')
+
+def count_groups_incremental(filename, column_name, chunksize=CHUNK_SIZE):
+    # Counts only the rows appended since the last run and adds them to the counts saved in the checkpoint.
+    # A truncated or rewritten file is counted again from the beginning.
+    # The keys are read and saved as text, only the result gets the type of the whole column.
+    checkpoint = incremental_csv.Checkpoint(filename, 'count', [column_name])
+    state = checkpoint.load() or {'keys': [], 'counts': []}
+    counts = pd.Series(state['counts'], index=incremental_csv.load_keys(state['keys']), dtype='int64')
+    start_time = time.perf_counter()
+
+    for chunk in checkpoint.new_chunks([column_name], chunksize, dtype={column_name: str}):
+        with stage_timer.stage('aggregate', len(chunk)):
+            counts = counts.add(chunk[column_name].value_counts(sort=False, dropna=False), fill_value=0)
+    counts = counts.astype('int64')
+    checkpoint.save({'keys': incremental_csv.save_keys(counts.index), 'counts': counts.tolist()})
+
+    elapsed = time.perf_counter() - start_time
+    print(f"\nProcessed {checkpoint.new_rows} new rows in {elapsed:.2f} s "
+          f"({checkpoint.rows + checkpoint.new_rows} rows in total).")
+
+    # A last line without a line break is counted now, but read again next time
+    tail = checkpoint.read_tail([column_name], dtype={column_name: str})
+    if tail is not None:
+        counts = counts.add(tail[column_name].value_counts(sort=False, dropna=False), fill_value=0)
+
+    counts = csv_dialect.typed_keys(counts).groupby(level=0).sum().astype('int64').sort_index()
+    counts.index.name = column_name
+    return counts.reset_index(name='Row Count')
+
+def count_groups_approximate(filename, column_name, top_k=TOP_K, chunksize=CHUNK_SIZE):
+    # Estimates the number of distinct groups (HyperLogLog) and the most frequent groups
+    # (Count-Min sketch with a heap of the top_k candidates) in fixed memory.
+    # Values are read as text, so equal values have the same hash in every chunk.
+    distinct = sketches.HyperLogLog()
+    frequencies = sketches.CountMinSketch()
+    top_groups = sketches.TopK(top_k, frequencies)
+    start_time = time.perf_counter()
+
+    reader = csv_dialect.read_csv(filename, usecols=[column_name], dtype=str, chunksize=chunksize)
+    for chunk in reader:
+        with stage_timer.stage('aggregate', len(chunk)):
+            chunk_counts = chunk[column_name].value_counts(sort=False)
+            hashes = sketches.hash_values(chunk_counts.index)
+            distinct.add_hashes(hashes)
+            frequencies.add_hashes(hashes, chunk_counts.to_numpy())
+            top_groups.update(chunk_counts.index, hashes)
+
+    elapsed = time.perf_counter() - start_time
+    total_rows = frequencies.total
+    rows_per_second = total_rows / elapsed if elapsed > 0 else 0
+    print(f"\nProcessed {total_rows} rows with a value in {elapsed:.2f} s ({rows_per_second:,.0f} rows/s).")
+
+    # Error bounds of the estimates
+    max_overestimate, probability = frequencies.error_bound()
+    print(f"Estimated number of distinct groups: {distinct.estimate():,.0f} "
+          f"(standard error {distinct.relative_error():.2%}).")
+    print(f"Counts of the {top_k} most frequent groups are never lower than the true counts and with "
+          f"probability {probability:.0%} higher by at most {max_overestimate:,.0f}.")
+
+    return pd.DataFrame(top_groups.items(), columns=[column_name, 'Estimated Row Count'])
+
+def count_byte_range(filename, start, end, columns, column_name, read_options):
+    # Counts rows per group in one byte range of the file chunk by chunk (runs in a worker process).
+    # The values are read as text, so every range has the same keys.
+    counts = pd.Series(dtype='int64')
+    for chunk in parallel_csv.read_byte_range(filename, start, end, columns, usecols=[column_name],
+                                              dtype={column_name: str}, **read_options):
+        counts = counts.add(chunk[column_name].value_counts(sort=False, dropna=False), fill_value=0)
+    return counts
+
+def ask_worker_count():
+    # Asks for the number of worker processes, one process is used by default
+    while True:
+        answer = input(f"\nEnter the number of worker processes (1-{os.cpu_count()}, Enter for 1): ").strip()
+        if not answer:
+            return 1
+        try:
+            workers = int(answer)
+            if workers >= 1:
+                return workers
+            print("Invalid number. Please try again.")
+        except ValueError:
+            print("Please enter a valid number.")
+
+def ask_approximate_mode():
+    # Asks whether the statistics should be estimated in fixed memory (for columns with very many distinct values)
+    answer = input("\nEstimate the number of groups and the most frequent groups only (approximate mode)? [y/N]: ")
+    return answer.strip().lower() in ('y', 'yes')
+
+def ask_incremental_mode():
+    # Asks whether only the rows appended since the last run should be aggregated
+    answer = input("\nUpdate the previous result with the appended rows only (incremental mode)? [y/N]: ")
+    return answer.strip().lower() in ('y', 'yes')
 
 def list_csv_files():
-    # Retrieves a list of all .csv files in the current directory
-    csv_files = [file for file in os.listdir('.') if file.lower().endswith('.csv')]
+    # Retrieves a list of all .csv files (also compressed .csv.gz, .csv.bz2 and .csv.xz) in the current directory
+    csv_files = [file for file in os.listdir('.') if compressed_csv.is_csv_file(file)]
     return csv_files
 
 def main():
@@ -40,9 +192,10 @@ def main():
         except ValueError:
             print("Please enter a valid number.")
 
-    # Load the selected CSV file into a DataFrame
+    # Read only the header of the selected CSV file to list the column names
     try:
-        data = load_csv(filename)
+        with stage_timer.stage('load header'):
+            columns = csv_dialect.read_header(filename)
     except FileNotFoundError:
         print(f"File '{filename}' was not found.")
         return
@@ -52,27 +205,59 @@ def main():
 
     # Display the column names
     print("\nColumn names in the file:")
-    for index, column in enumerate(data.columns, 1):
+    for index, column in enumerate(columns, 1):
         print(f"{index}. {column}")
 
     # Prompt to select a column for grouping data
     while True:
         try:
             column_choice = int(input("\nEnter the column number to group the data by: "))
-            if 1 <= column_choice <= len(data.columns):
-                column_name = data.columns[column_choice - 1]
+            if 1 <= column_choice <= len(columns):
+                column_name = columns[column_choice - 1]
                 break
             else:
                 print("Invalid number. Please try again.")
         except ValueError:
             print("Please enter a valid number.")
 
-    # Aggregate the data
-    aggregated_data = data.groupby(column_name).size().reset_index(name='Row Count')
+    # Estimate the statistics in fixed memory
+    if ask_approximate_mode():
+        try:
+            with stage_timer.stage('load and aggregate'):
+                approximate_data = count_groups_approximate(filename, column_name)
+        except Exception as e:
+            print(f"An error occurred while aggregating the file: {e}")
+            return
+        approximate_filename = compressed_csv.output_filename("export_approx.csv")
+        with stage_timer.stage('write', len(approximate_data)):
+            compressed_csv.to_csv(approximate_data, approximate_filename, index=False)
+        print(f"\nThe most frequent groups have been saved to '{approximate_filename}'.")
+        return
+
+    # Aggregate the data chunk by chunk, in several processes at once, or only the appended rows.
+    # A compressed file cannot be split into byte ranges, so it is always read chunk by chunk.
+    compressed = compressed_csv.is_compressed(filename)
+    incremental = not compressed and ask_incremental_mode()
+    workers = 1 if incremental or compressed else ask_worker_count()
+    try:
+        with stage_timer.stage('load and aggregate'):
+            if incremental:
+                aggregated_data = count_groups_incremental(filename, column_name)
+            elif workers > 1:
+                aggregated_data = count_groups_in_parallel(filename, column_name, workers)
+            elif column_cache.is_enabled():
+                aggregated_data = count_groups_cached(filename, column_name)
+            else:
+                aggregated_data = count_groups_in_chunks(filename, column_name)
+    except Exception as e:
+        print(f"An error occurred while aggregating the file: {e}")
+        return
 
     # Save the aggregated data to a new CSV file
-    aggregated_data.to_csv("export.csv", index=False)
-    print("\nAggregated data has been saved to 'export.csv'.")
+    export_filename = compressed_csv.output_filename("export.csv")
+    with stage_timer.stage('write', len(aggregated_data)):
+        compressed_csv.to_csv(aggregated_data, export_filename, index=False)
+    print(f"\nAggregated data has been saved to '{export_filename}'.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
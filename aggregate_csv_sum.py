@@ -1,20 +1,36 @@
+import numpy as np
 import pandas as pd
 import os
 import re
+import column_cache
+import compact_dtypes
+import compressed_csv
+import csv_dialect
+import incremental_csv
+import parallel_csv
+import stage_timer
 
-def load_csv(filename):
-    try:
-        # Tries to load a CSV file where the columns are separated by a comma (,)
-        data = pd.read_csv(filename)
-        return data
-    except pd.errors.ParserError:
-        # if an error occurs, tries to load with semicolon (;) separator
-        data = pd.read_csv(filename, delimiter=';', quotechar='"')
-        return data
+# Pattern of a valid number after removing spaces and replacing the decimal comma
+NUMBER_PATTERN = re.compile(r'^-?\d+(\.\d+)?$')
+# The same pattern for the Arrow string kernels, limited to ASCII digits (other values are checked one by one)
+ASCII_NUMBER_PATTERN = r'^-?[0-9]+(\.[0-9]+)?$'
+# Aggregates that can be computed for every numeric column (invalid = number of invalid values)
+AGGREGATES = ['sum', 'count', 'mean', 'min', 'max', 'invalid']
+# Number of rows read at once when several columns or aggregates are computed
+CHUNK_SIZE = 1_000_000
+
+def load_csv(filename, nrows=None, columns=None):
+    # Loads a CSV file with the separator, quote character and encoding detected from its beginning
+    if nrows is None:
+        # Whole file, through the columnar cache when it is turned on
+        data = column_cache.read_csv(filename, columns=columns)
+    else:
+        data = csv_dialect.read_csv(filename, nrows=nrows, usecols=columns)
+    return data
 
 def list_csv_files():
-    # Retrieves a list of all .csv files in the current directory
-    csv_files = [file for file in os.listdir('.') if file.lower().endswith('.csv')]
+    # Retrieves a list of all .csv files (also compressed .csv.gz, .csv.bz2 and .csv.xz) in the current directory
+    csv_files = [file for file in os.listdir('.') if compressed_csv.is_csv_file(file)]
     return csv_files
 
 def clean_numeric(value):
@@ -26,7 +42,7 @@ def clean_numeric(value):
     # Replaces the comma with a dot
     value_str = value_str.replace(',', '.')
     # Use regex to validate the number
-    if re.match(r'^-?\d+(\.\d+)?$', value_str):
+    if NUMBER_PATTERN.match(value_str):
         try:
             return float(value_str), True
         except ValueError:
@@ -34,6 +50,364 @@ def clean_numeric(value):
     else:
         return None, False
 
+def clean_numeric_column(values):
+    # Vectorized version of clean_numeric for a whole column.
+    # Returns the float values aligned with the original index (NaN for invalid rows)
+    # and a boolean mask of the invalid rows.
+    if pd.api.types.is_bool_dtype(values):
+        # str(True) is not a number
+        cleaned = pd.Series(np.nan, index=values.index)
+    elif pd.api.types.is_integer_dtype(values):
+        cleaned = values.astype('float64')
+    elif pd.api.types.is_float_dtype(values):
+        # str(value) passes the regex unless Python writes it in exponent notation (or inf)
+        magnitude = values.abs()
+        written_plainly = (magnitude < 1e16) & ((magnitude >= 1e-4) | (magnitude == 0))
+        cleaned = values.where(written_plainly)
+    elif is_arrow_backed(values) or compact_dtypes.arrow_string_dtype() is not None:
+        # Python strings are converted to Arrow strings, the kernels run the whole column in native code
+        cleaned = clean_arrow_strings(values)
+    else:
+        # Python strings without pyarrow: every distinct value is cleaned only once
+        codes, uniques = pd.factorize(values)
+        cleaned_uniques = clean_unique_values(np.asarray(uniques, dtype=object))
+        cleaned = pd.Series(np.where(codes >= 0, cleaned_uniques[codes], np.nan), index=values.index)
+    invalid_mask = cleaned.isna()
+    return cleaned, invalid_mask
+
+def is_arrow_backed(values):
+    # Checks whether the column is stored as Arrow strings
+    return isinstance(values.dtype, pd.ArrowDtype) or getattr(values.dtype, 'storage', None) == 'pyarrow'
+
+def clean_arrow_strings(values):
+    # Cleans text values with the Arrow string kernels: removes the spaces, replaces the decimal comma,
+    # validates the values by the pattern and casts the valid ones to floats at once.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    original = to_arrow_strings(values)
+    data = text_bytes(original)
+    text = pc.replace_substring(original, ' ', '') if (data == ord(' ')).any() else original
+    text = replace_ascii_byte(text, ',', '.')
+    is_number = pc.match_substring_regex(text, ASCII_NUMBER_PATTERN)
+    numbers = pc.cast(pc.if_else(is_number, text, pa.scalar(None, text.type)), pa.float64())
+    cleaned = pd.Series(numbers.to_numpy(zero_copy_only=False), index=values.index, dtype='float64')
+
+    # The Python pattern also accepts digits of other scripts and a line break at the end,
+    # such values are rare and cleaned one by one
+    if (data >= 0x80).any() or (data == ord('\n')).any():
+        unusual = pc.and_not(pc.or_(pc.invert(pc.string_is_ascii(original)), pc.ends_with(original, '\n')),
+                             is_number)
+        positions = np.flatnonzero(pc.fill_null(unusual, False).to_numpy(zero_copy_only=False))
+        cleaned.iloc[positions] = [clean_numeric(value)[0] for value in values.iloc[positions]]
+    return cleaned
+
+def to_arrow_strings(values):
+    # Returns the values as one Arrow string array, values that are not strings are written by str()
+    # like in clean_numeric
+    import pyarrow as pa
+
+    if not is_arrow_backed(values):
+        try:
+            return pa.array(values.to_numpy(dtype=object), type=pa.large_string(), from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            values = values.astype(compact_dtypes.arrow_string_dtype())
+    array = pa.array(values.array)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    return array.cast(pa.large_string())
+
+def text_bytes(array):
+    # Returns the UTF-8 bytes of all values of an Arrow string array (without copying them)
+    data = array.buffers()[2]
+    return np.frombuffer(data, dtype=np.uint8) if data is not None else np.empty(0, dtype=np.uint8)
+
+def replace_ascii_byte(array, old, new):
+    # Replaces one ASCII character by another in the bytes of an Arrow string array. The lengths of the
+    # values stay the same, so the offsets are reused, and an ASCII byte is never a part of another character.
+    import pyarrow as pa
+
+    data = text_bytes(array)
+    matches = data == ord(old)
+    if not matches.any():
+        return array
+    data = data.copy()
+    data[matches] = ord(new)
+    validity, offsets, _ = array.buffers()
+    return pa.Array.from_buffers(array.type, len(array), [validity, offsets, pa.py_buffer(data)],
+                                 array.null_count, array.offset)
+
+def clean_unique_values(uniques):
+    # Cleans an array of distinct values, the replacements are done on one joined string.
+    text = '\n'.join(map(str, uniques))
+    if text.count('\n') != max(len(uniques) - 1, 0):
+        # Some value contains a line break, falls back to cleaning value by value
+        return np.array([number if is_valid else np.nan for number, is_valid in map(clean_numeric, uniques)],
+                        dtype=np.float64)
+    parts = text.replace(' ', '').replace(',', '.').split('\n')
+    return np.array([float(part) if NUMBER_PATTERN.match(part) else np.nan for part in parts], dtype=np.float64)
+
+def sum_in_parallel(filename, group_column, numeric_column, workers):
+    # Reads the file with its detected dialect
+    read_options = csv_dialect.read_options(csv_dialect.detect_dialect(filename))
+    partial_results = parallel_csv.run_on_byte_ranges(sum_byte_range, filename, workers,
+                                                      group_column, numeric_column, **read_options)
+
+    # Merges the partial sums and renumbers the invalid rows by their position in the whole file
+    sums = []
+    total_valid = 0
+    invalid_entries = []
+    rows_before = 0
+    for partial_sums, valid_count, partial_invalid, row_count in partial_results:
+        sums.append(partial_sums)
+        total_valid += valid_count
+        invalid_entries.extend((rows_before + idx + 1, value) for idx, value in partial_invalid)
+        rows_before += row_count
+
+    # The keys get the type of the whole column
+    with stage_timer.stage('merge partial results'):
+        aggregated = csv_dialect.typed_keys(pd.concat(sums)).groupby(level=0).sum().sort_index()
+    aggregated.index.name = group_column
+    return aggregated.reset_index(name='Suma'), total_valid, invalid_entries
+
+def sum_byte_range(filename, start, end, columns, group_column, numeric_column, read_options):
+    # Cleans and sums the numeric values in one byte range of the file chunk by chunk (runs in a worker process).
+    # The group values are read as text, so every range has the same keys.
+    sums = []
+    total_valid = 0
+    invalid_entries = []
+    row_count = 0
+    for chunk in parallel_csv.read_byte_range(filename, start, end, columns, usecols=[group_column, numeric_column],
+                                              dtype={group_column: str}, **read_options):
+        partial_sums, valid_count, partial_invalid = sum_chunk(chunk, group_column, numeric_column, dropna=False)
+        sums.append(partial_sums)
+        total_valid += valid_count
+        invalid_entries.extend(partial_invalid)
+        row_count += len(chunk)
+    return pd.concat(sums).groupby(level=0, dropna=False).sum(), total_valid, invalid_entries, row_count
+
+def sum_chunk(data, group_column, numeric_column, dropna=True):
+    # Cleans and sums the numeric values of a part of the file,
+    # returns the partial sums, the number of valid values and (index, value) pairs of the invalid ones.
+    # With dropna=False the sum of the rows with a missing group value is kept too.
+    cleaned_values, invalid_mask = clean_numeric_column(data[numeric_column])
+    partial_sums = cleaned_values.groupby(data[group_column], dropna=dropna).sum()
+    partial_invalid = list(data.loc[invalid_mask, numeric_column].items())
+    return partial_sums, int((~invalid_mask).sum()), partial_invalid
+
+def sum_incremental(filename, group_column, numeric_column):
+    # Cleans and sums only the rows appended since the last run and adds them to the state saved in the checkpoint.
+    # A truncated or rewritten file is processed again from the beginning.
+    # The keys are read and saved as text, only the result gets the type of the whole column.
+    checkpoint = incremental_csv.Checkpoint(filename, 'sum', [group_column, numeric_column])
+    state = checkpoint.load() or {'keys': [], 'sums': [], 'valid': 0, 'invalid': []}
+    sums = [pd.Series(state['sums'], index=incremental_csv.load_keys(state['keys']), dtype='float64')]
+    key_dtype = {group_column: str}
+    total_valid = state['valid']
+    invalid_entries = [tuple(entry) for entry in state['invalid']]
+
+    def add_chunk(chunk):
+        nonlocal total_valid
+        partial_sums, valid_count, partial_invalid = sum_chunk(chunk, group_column, numeric_column, dropna=False)
+        sums.append(partial_sums)
+        total_valid += valid_count
+        invalid_entries.extend((idx + 1, value) for idx, value in partial_invalid)
+
+    for chunk in checkpoint.new_chunks([group_column, numeric_column], dtype=key_dtype):
+        with stage_timer.stage('clean and aggregate', len(chunk)):
+            add_chunk(chunk)
+    aggregated = pd.concat(sums).groupby(level=0, dropna=False).sum()
+    checkpoint.save({'keys': incremental_csv.save_keys(aggregated.index), 'sums': aggregated.tolist(),
+                     'valid': total_valid,
+                     'invalid': [[row, str(value)] for row, value in invalid_entries]})
+    print(f"\nProcessed {checkpoint.new_rows} new rows ({checkpoint.rows + checkpoint.new_rows} rows in total).")
+
+    # A last line without a line break is added now, but read again next time
+    tail = checkpoint.read_tail([group_column, numeric_column], dtype=key_dtype)
+    if tail is not None:
+        sums = [aggregated]
+        add_chunk(tail)
+        aggregated = pd.concat(sums).groupby(level=0, dropna=False).sum()
+
+    aggregated = csv_dialect.typed_keys(aggregated).groupby(level=0).sum().sort_index()
+    aggregated.index.name = group_column
+    return aggregated.reset_index(name='Suma'), total_valid, invalid_entries
+
+def aggregate_chunk(data, group_columns, numeric_columns):
+    # Cleans every numeric column once and computes the partial sum, count, min, max and number of invalid
+    # values of all numeric columns per group in one groupby. Returns the partial results (columns
+    # (aggregate, position of the numeric column)), the number of valid values per numeric column
+    # and (index, column, value) triples of the invalid values.
+    values = {}
+    invalid = {}
+    valid_counts = []
+    invalid_entries = []
+    for position, column in enumerate(numeric_columns):
+        cleaned_values, invalid_mask = clean_numeric_column(data[column])
+        values[position] = cleaned_values
+        invalid[position] = invalid_mask.astype('int64')
+        valid_counts.append(int((~invalid_mask).sum()))
+        invalid_entries.extend((idx, column, value) for idx, value in data.loc[invalid_mask, column].items())
+
+    # Positions instead of names, a numeric column can also be a group column
+    positions = list(values)
+    frame = pd.concat([pd.DataFrame(values), pd.DataFrame(invalid).add_prefix('invalid ')], axis=1)
+    # Groups with a missing key are kept, they are dropped after the keys get their types (see aggregate_columns)
+    grouped = frame.groupby([data[column] for column in group_columns], dropna=False)
+    sums = grouped.sum()
+    partial = pd.concat({
+        'sum': sums[positions],
+        'count': grouped[positions].count(),
+        'min': grouped[positions].min(),
+        'max': grouped[positions].max(),
+        'invalid': sums[[f'invalid {position}' for position in positions]].set_axis(positions, axis=1),
+    }, axis=1)
+    return partial, valid_counts, invalid_entries
+
+def combine_aggregates(partials):
+    # Combines partial results of several parts of the file (sums and counts are added, min and max kept)
+    combined = pd.concat(partials)
+    functions = {column: ('min' if column[0] == 'min' else 'max' if column[0] == 'max' else 'sum')
+                 for column in combined.columns}
+    return combined.groupby(level=list(range(combined.index.nlevels)), dropna=False).agg(functions)
+
+def finish_aggregates(partial, group_columns, numeric_columns, aggregates):
+    # Computes the means and returns one wide table with the columns '<numeric column>_<aggregate>'
+    result = pd.DataFrame(index=partial.index)
+    for position, column in enumerate(numeric_columns):
+        for aggregate in aggregates:
+            if aggregate == 'mean':
+                count = partial[('count', position)]
+                values = partial[('sum', position)] / count.where(count > 0)
+            else:
+                values = partial[(aggregate, position)]
+            result[f"{column}_{aggregate}"] = values
+    result = result.sort_index()
+    result.index.names = group_columns
+    return result.reset_index()
+
+def aggregate_columns(filename, group_columns, numeric_columns, aggregates, workers=1, chunksize=CHUNK_SIZE):
+    # Computes all aggregates of all numeric columns per composite group in one pass over the file:
+    # chunk by chunk in this process, or in byte ranges processed by several worker processes.
+    # Returns the wide table, the number of valid values per numeric column and (row, column, value)
+    # triples of the invalid values.
+    # The group values are read as text, so every chunk and range has the same keys.
+    usecols = list(dict.fromkeys(group_columns + numeric_columns))
+    key_dtype = {column: str for column in group_columns}
+    if workers > 1:
+        read_options = csv_dialect.read_options(csv_dialect.detect_dialect(filename))
+        parts = parallel_csv.run_on_byte_ranges(aggregate_byte_range, filename, workers, usecols,
+                                                group_columns, numeric_columns, dtype=key_dtype, **read_options)
+    else:
+        parts = []
+        rows_before = 0
+        for chunk in csv_dialect.read_csv(filename, usecols=usecols, dtype=key_dtype, chunksize=chunksize):
+            with stage_timer.stage('clean and aggregate', len(chunk)):
+                # The index of the chunks continues, it is made relative to the chunk like in a byte range
+                chunk.index -= rows_before
+                parts.append(aggregate_chunk(chunk, group_columns, numeric_columns) + (len(chunk),))
+            rows_before += len(chunk)
+        if not parts:
+            empty = csv_dialect.read_csv(filename, usecols=usecols, dtype=key_dtype, nrows=0)
+            parts.append(aggregate_chunk(empty, group_columns, numeric_columns) + (0,))
+
+    # Merges the partial results and numbers the invalid rows by their position in the whole file
+    valid_counts = [0] * len(numeric_columns)
+    invalid_entries = []
+    rows_before = 0
+    for _, partial_valid, partial_invalid, row_count in parts:
+        valid_counts = [total + count for total, count in zip(valid_counts, partial_valid)]
+        invalid_entries.extend((rows_before + idx + 1, column, value) for idx, column, value in partial_invalid)
+        rows_before += row_count
+    # The keys get the type of the whole column, keys that became equal ('007' and '7') are combined
+    with stage_timer.stage('merge partial results'):
+        partial = combine_aggregates([csv_dialect.typed_keys(combine_aggregates([part[0] for part in parts]))])
+    aggregated = finish_aggregates(partial, group_columns, numeric_columns, aggregates)
+    return aggregated, dict(zip(numeric_columns, valid_counts)), invalid_entries
+
+def aggregate_byte_range(filename, start, end, columns, usecols, group_columns, numeric_columns, read_options):
+    # Cleans and aggregates the numeric columns in one byte range of the file chunk by chunk (runs in a worker process)
+    partials = []
+    valid_counts = [0] * len(numeric_columns)
+    invalid_entries = []
+    row_count = 0
+    for chunk in parallel_csv.read_byte_range(filename, start, end, columns, usecols=usecols, **read_options):
+        partial, partial_valid, partial_invalid = aggregate_chunk(chunk, group_columns, numeric_columns)
+        partials.append(partial)
+        valid_counts = [total + count for total, count in zip(valid_counts, partial_valid)]
+        invalid_entries.extend(partial_invalid)
+        row_count += len(chunk)
+    return combine_aggregates(partials), valid_counts, invalid_entries, row_count
+
+def ask_worker_count():
+    # Asks for the number of worker processes, one process is used by default
+    while True:
+        answer = input(f"\nEnter the number of worker processes (1-{os.cpu_count()}, Enter for 1): ").strip()
+        if not answer:
+            return 1
+        try:
+            workers = int(answer)
+            if workers >= 1:
+                return workers
+            print("Invalid number. Try again")
+        except ValueError:
+            print("Please enter a valid number.")
+
+def select_columns(prompt, columns):
+    # Asks for one or more column numbers separated by commas and returns the selected column names
+    while True:
+        try:
+            choices = [int(part) for part in input(prompt).split(',') if part.strip()]
+            if choices and all(1 <= choice <= len(columns) for choice in choices):
+                return list(dict.fromkeys(columns[choice - 1] for choice in choices))
+            print("Invalid number. Try again")
+        except ValueError:
+            print("Please enter a valid number.")
+
+def ask_aggregates():
+    # Asks for the aggregates computed for every numeric column, only the sum is computed by default
+    while True:
+        answer = input(f"\nEnter the aggregates separated by commas ({', '.join(AGGREGATES)}), Enter for sum: ")
+        aggregates = list(dict.fromkeys(part.strip().lower() for part in answer.split(',') if part.strip()))
+        if not aggregates:
+            return ['sum']
+        unknown = [aggregate for aggregate in aggregates if aggregate not in AGGREGATES]
+        if not unknown:
+            return aggregates
+        print(f"Unknown aggregate: {', '.join(unknown)}. Try again")
+
+def aggregate_several_columns(filename, group_columns, numeric_columns, aggregates):
+    # Computes all aggregates in one pass, saves them as one wide table to export_suma.csv and prints the statistics.
+    # A compressed file cannot be split into byte ranges, so it is always read in this process.
+    workers = 1 if compressed_csv.is_compressed(filename) else ask_worker_count()
+    try:
+        with stage_timer.stage('load and aggregate'):
+            aggregated_data, valid_counts, invalid_entries = aggregate_columns(filename, group_columns,
+                                                                               numeric_columns, aggregates, workers)
+    except Exception as e:
+        print(f"An error occurred while processing the file: {e}")
+        return
+
+    export_filename = compressed_csv.output_filename("export_suma.csv")
+    with stage_timer.stage('write', len(aggregated_data)):
+        compressed_csv.to_csv(aggregated_data, export_filename, index=False)
+    print(f"\nThe aggregated data was saved to '{export_filename}'.")
+
+    print("\nStatistics of valid and non-valid values:")
+    for column in numeric_columns:
+        total_invalid = sum(1 for _, invalid_column, _ in invalid_entries if invalid_column == column)
+        print(f"Column '{column}': valid numbers: {valid_counts[column]}, numbers of invalid values: {total_invalid}")
+
+    if invalid_entries:
+        print("\nInvalid values:")
+        for row, column, val in sorted(invalid_entries, key=lambda entry: entry[0]):
+            print(f"Row {row} ({column}): {val}")
+
+def ask_incremental_mode():
+    # Asks whether only the rows appended since the last run should be aggregated
+    answer = input("\nUpdate the previous result with the appended rows only (incremental mode)? [y/N]: ")
+    return answer.strip().lower() in ('y', 'yes')
+
 def main():
     # Lists all CSV files in the current directory
     csv_files = list_csv_files()
@@ -58,9 +432,10 @@ def main():
         except ValueError:
             print("Please enter a valid number.")
 
-    # Loads the selected CSV file into the DataFrame
+    # Reads only the header of the selected CSV file to list the column names
     try:
-        data = load_csv(filename)
+        with stage_timer.stage('load header'):
+            columns = csv_dialect.read_header(filename)
     except FileNotFoundError:
         print(f"File '{filename}' not found.")
         return
@@ -70,58 +445,79 @@ def main():
 
     # Displays column names
     print("\nColumn names in the file:")
-    for index, column in enumerate(data.columns, 1):
+    for index, column in enumerate(columns, 1):
         print(f"{index}. {column}")
 
-    # Lets the user select a column for aggregation
-    while True:
-        try:
-            group_choice = int(input("\nEnter the column number to be used for aggregation: "))
-            if 1 <= group_choice <= len(data.columns):
-                group_column = data.columns[group_choice - 1]
-                break
-            else:
-                print("Invalid number. Try again")
-        except ValueError:
-            print("Please enter a valid number.")
+    # Lets the user select the columns for aggregation (several columns make a composite key)
+    group_columns = select_columns("\nEnter the column number to be used for aggregation "
+                                   "(several numbers separated by commas for a composite key): ", columns)
 
-    # Lets the user select a column of numeric values to be summed
-    while True:
-        try:
-            numeric_choice = int(input("\nEnter the number of the column with the numeric values to sum them together: "))
-            if 1 <= numeric_choice <= len(data.columns):
-                numeric_column = data.columns[numeric_choice - 1]
-                break
-            else:
-                print("Invalid number. Try again")
-        except ValueError:
-            print("Please enter a valid number.")
+    # Lets the user select the columns of numeric values to be summed
+    numeric_columns = select_columns("\nEnter the number of the column with the numeric values to sum them together "
+                                     "(several numbers separated by commas): ", columns)
 
-    # Initializing lists for valid and non-valid values
-    valid_values = []
-    invalid_entries = []
+    # Lets the user select the aggregates, only the sum is computed by default
+    aggregates = ask_aggregates()
+
+    # Several columns or aggregates are computed together and saved as one wide table
+    if len(group_columns) > 1 or len(numeric_columns) > 1 or aggregates != ['sum']:
+        aggregate_several_columns(filename, group_columns, numeric_columns, aggregates)
+        return
+    group_column = group_columns[0]
+    numeric_column = numeric_columns[0]
+
+    # A compressed file cannot be split into byte ranges, so it is always loaded in this process
+    compressed = compressed_csv.is_compressed(filename)
+    incremental = not compressed and ask_incremental_mode()
+    workers = 1 if incremental or compressed else ask_worker_count()
+    if incremental:
+        # Continues from the checkpoint of the previous run, only the appended rows are read
+        try:
+            with stage_timer.stage('load and aggregate'):
+                aggregated_data, total_valid, invalid_entries = sum_incremental(filename, group_column,
+                                                                                numeric_column)
+        except Exception as e:
+            print(f"An error occurred while processing the file: {e}")
+            return
+    elif workers > 1:
+        # Splits the file into byte ranges that are cleaned and summed in several processes
+        try:
+            with stage_timer.stage('load and aggregate'):
+                aggregated_data, total_valid, invalid_entries = sum_in_parallel(filename, group_column,
+                                                                                numeric_column, workers)
+        except Exception as e:
+            print(f"An error occurred while processing the file: {e}")
+            return
+    else:
+        # Loads the two selected columns of the CSV file into the DataFrame
+        try:
+            with stage_timer.stage('load') as load_stage:
+                data = load_csv(filename, columns=[group_column, numeric_column])
+                load_stage.rows = len(data)
+        except Exception as e:
+            print(f"An error occurred while loading the file: {e}")
+            return
 
-    # Performs numeric column cleaning and validation
-    for idx, value in data[numeric_column].items():
-        cleaned_value, is_valid = clean_numeric(value)
-        if is_valid:
-            valid_values.append(cleaned_value)
-        else:
-            invalid_entries.append((idx + 1, value))  # Uloží řádek a nevalidní hodnotu
+        # Performs numeric column cleaning and validation on the whole column at once
+        with stage_timer.stage('clean numbers', len(data)):
+            cleaned_values, invalid_mask = clean_numeric_column(data[numeric_column])
+            invalid_entries = [(idx + 1, value) for idx, value in data.loc[invalid_mask, numeric_column].items()]
+            total_valid = int((~invalid_mask).sum())
 
-    # Adds a new column with plain numeric values
-    data['__cleaned_numeric'] = valid_values + [None] * (len(data) - len(valid_values))
+        # Adds a new column with plain numeric values (aligned with the original rows)
+        data['__cleaned_numeric'] = cleaned_values
 
-    # Aggregates data by the selected column and sums the numeric values
-    aggregated_data = data.groupby(group_column)['__cleaned_numeric'].sum().reset_index(name='Suma')
+        # Aggregates data by the selected column and sums the numeric values
+        with stage_timer.stage('aggregate', len(data)):
+            aggregated_data = data.groupby(group_column, observed=True)['__cleaned_numeric'].sum().reset_index(name='Suma')
 
     # Saves aggregated data to a new CSV file export_suma.csv
-    export_filename = "export_suma.csv"
-    aggregated_data.to_csv(export_filename, index=False)
+    export_filename = compressed_csv.output_filename("export_suma.csv")
+    with stage_timer.stage('write', len(aggregated_data)):
+        compressed_csv.to_csv(aggregated_data, export_filename, index=False)
     print(f"\nThe aggregated data was saved to '{export_filename}'.")
 
     # Statistics of valid and non-valid values
-    total_valid = len(valid_values)
     total_invalid = len(invalid_entries)
 
     print("\nStatistics of valid and non-valid values:")
@@ -0,0 +1,464 @@
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Number of rows generated at once by the synthetic CSV generator
+GENERATOR_CHUNK_ROWS = 1_000_000
+# Names used in the text column, some of them contain HTML entities
+NAMES = ['Alice', 'Bob', 'Carol', 'Dave', 'Eve', 'Frank', 'Grace', 'Heidi']
+NAMES_WITH_ENTITIES = ['Tom &amp; Jerry', 'R&amp;D', '&lt;unknown&gt;', 'Caf&eacute;', '&quot;Quoted&quot;']
+INVALID_NUMBERS = ['N/A', 'unknown', ' - ']
+
+def generate_csv(path, rows, columns=6, key_cardinality=1000, duplicate_ratio=0.1, missing_ratio=0.01,
+                 decimal_comma=True, html_entities=True, delimiter=',', seed=42):
+    """
+    Writes a deterministic synthetic CSV file for the benchmarks.
+
+    The file has the columns id (duplicated in about duplicate_ratio of rows),
+    group (key_cardinality distinct values), amount (numbers, optionally with a
+    decimal comma and spaces between thousands, plus a few invalid values), name
+    (text, optionally with HTML entities) and numeric filler columns up to
+    the requested column count. Values in every column except id are left
+    empty with the probability missing_ratio.
+
+    Args:
+        path (str): The output file name.
+        rows (int): Number of data rows.
+        columns (int): Number of columns (at least 4).
+        key_cardinality (int): Number of distinct values in the group column.
+        duplicate_ratio (float): Share of rows repeating an earlier id.
+        missing_ratio (float): Share of empty values.
+        decimal_comma (bool): Whether amounts use a decimal comma and spaces between thousands.
+        html_entities (bool): Whether some names contain HTML entities.
+        delimiter (str): The delimiter of the file.
+        seed (int): Seed of the random generator.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(NAMES + (NAMES_WITH_ENTITIES if html_entities else []), dtype=object)
+    written = 0
+
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        while written < rows:
+            count = min(GENERATOR_CHUNK_ROWS, rows - written)
+            positions = np.arange(written, written + count)
+
+            # Duplicated rows repeat the id of a random earlier row
+            ids = positions.copy()
+            duplicated = (rng.random(count) < duplicate_ratio) & (positions > 0)
+            ids[duplicated] = (rng.random(int(duplicated.sum())) * positions[duplicated]).astype(np.int64)
+
+            amounts = np.round(rng.random(count) * 100_000 - 1_000, 2)
+            if decimal_comma:
+                amount_text = [f"{value:,.2f}".replace(',', ' ').replace('.', ',') for value in amounts]
+            else:
+                amount_text = [f"{value:.2f}" for value in amounts]
+            amount_text = np.array(amount_text, dtype=object)
+            invalid = rng.random(count) < 0.001
+            amount_text[invalid] = rng.choice(INVALID_NUMBERS, int(invalid.sum()))
+
+            data = {
+                'id': ['ID' + str(value) for value in ids],
+                'group': ['G' + str(value) for value in rng.integers(0, key_cardinality, count)],
+                'amount': amount_text,
+                'name': names[rng.integers(0, len(names), count)],
+            }
+            for index in range(4, max(columns, 4)):
+                data[f"col_{index}"] = rng.integers(0, 1_000_000, count)
+
+            chunk = pd.DataFrame(data)
+            for column in chunk.columns[1:]:
+                missing = rng.random(count) < missing_ratio
+                chunk[column] = chunk[column].astype(object).where(~missing, '')
+
+            chunk.to_csv(file, sep=delimiter, header=(written == 0), index=False)
+            written += count
+
+def generate_reference_csv(path, rows, key_count, html_entities=True, delimiter=',', seed=7):
+    """
+    Writes a synthetic reference file joined by id (used by the merge benchmarks).
+
+    Args:
+        path (str): The output file name.
+        rows (int): Number of data rows (ids repeat when rows > key_count).
+        key_count (int): Ids are drawn from ID0 to ID<key_count - 1>.
+        html_entities (bool): Whether some values contain HTML entities.
+        delimiter (str): The delimiter of the file.
+        seed (int): Seed of the random generator.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(NAMES + (NAMES_WITH_ENTITIES if html_entities else []), dtype=object)
+    pd.DataFrame({
+        'id': ['ID' + str(value) for value in rng.integers(0, max(key_count, 1), rows)],
+        'category': names[rng.integers(0, len(names), rows)],
+        'score': rng.integers(0, 100, rows),
+    }).to_csv(path, sep=delimiter, index=False)
+
+# Benchmark cases, each returns the number of processed rows and optionally its own measured time
+
+def case_remove_duplicates(path, reference_path, workers):
+    import remove_duplicates
+    df = remove_duplicates.load_csv_with_varied_delimiters(path)
+    remove_duplicates.remove_duplicates_and_show_stats(df, 'id')
+    return len(df), None
+
+def case_remove_duplicates_streaming(path, reference_path, workers):
+    import remove_duplicates
+    sample, read_options = remove_duplicates.peek_csv_with_varied_delimiters(path)
+    row_count, _ = remove_duplicates.remove_duplicates_streaming(path, 'id', 'cleaned.csv', read_options)
+    return row_count, None
+
+def case_remove_duplicates_whole_rows_streaming(path, reference_path, workers):
+    import remove_duplicates
+    sample, read_options = remove_duplicates.peek_csv_with_varied_delimiters(path)
+    row_count, _ = remove_duplicates.remove_duplicates_by_digest_streaming(path, None, 'cleaned.csv', read_options)
+    return row_count, None
+
+def case_merge_files(path, reference_path, workers):
+    import merge_two_csvs_by_column
+    merged_df = merge_two_csvs_by_column.merge_files(path, reference_path, 'id')
+    return len(merged_df), None
+
+def case_merge_files_streaming(path, reference_path, workers):
+    import merge_two_csvs_by_column
+    return merge_two_csvs_by_column.merge_files_streaming(path, reference_path, 'id', 'merged_output.csv'), None
+
+def case_scan_missing_values(path, reference_path, workers):
+    import find_missing_values
+    df = find_missing_values.load_csv_with_varied_delimiters(path)
+    find_missing_values.scan_missing_values(df)
+    return len(df), None
+
+def case_scan_missing_values_in_chunks(path, reference_path, workers):
+    import find_missing_values
+    find_missing_values.scan_missing_values_in_chunks(path)
+    return count_rows(path), None
+
+def case_scan_missing_values_bytes(path, reference_path, workers):
+    import find_missing_values
+    find_missing_values.scan_missing_values_in_bytes(path)
+    return count_rows(path), None
+
+def case_group_count(path, reference_path, workers):
+    import aggregate_csv_by_column
+    aggregate_csv_by_column.count_groups_in_chunks(path, 'group')
+    return count_rows(path), None
+
+def case_group_count_gzip(path, reference_path, workers):
+    import aggregate_csv_by_column
+    # Decompressed in a background thread while the chunks are parsed
+    aggregate_csv_by_column.count_groups_in_chunks(compressed_path(path), 'group')
+    return count_rows(path), None
+
+def case_group_count_gzip_decompress_first(path, reference_path, workers):
+    import aggregate_csv_by_column
+    # Decompresses the whole file to disk first, the way the archives were processed before
+    with gzip.open(compressed_path(path), 'rb') as source, open('decompressed.csv', 'wb') as target:
+        shutil.copyfileobj(source, target, 1 << 20)
+    aggregate_csv_by_column.count_groups_in_chunks('decompressed.csv', 'group')
+    os.remove('decompressed.csv')
+    return count_rows(path), None
+
+def case_group_count_parallel(path, reference_path, workers):
+    import aggregate_csv_by_column
+    aggregate_csv_by_column.count_groups_in_parallel(path, 'group', workers)
+    return count_rows(path), None
+
+def case_group_sum(path, reference_path, workers):
+    import aggregate_csv_sum
+    data = aggregate_csv_sum.load_csv(path, columns=['group', 'amount'])
+    cleaned_values, invalid_mask = aggregate_csv_sum.clean_numeric_column(data['amount'])
+    data['__cleaned_numeric'] = cleaned_values
+    data.groupby('group')['__cleaned_numeric'].sum()
+    return len(data), None
+
+def case_group_sum_parallel(path, reference_path, workers):
+    import aggregate_csv_sum
+    aggregate_csv_sum.sum_in_parallel(path, 'group', 'amount', workers)
+    return count_rows(path), None
+
+def case_clean_numeric(path, reference_path, workers):
+    import aggregate_csv_sum
+    values = aggregate_csv_sum.load_csv(path, columns=['amount'])['amount']
+    start_time = time.perf_counter()
+    for value in values:
+        aggregate_csv_sum.clean_numeric(value)
+    return len(values), time.perf_counter() - start_time
+
+def case_clean_numeric_column(path, reference_path, workers):
+    import aggregate_csv_sum
+    values = aggregate_csv_sum.load_csv(path, columns=['amount'])['amount']
+    start_time = time.perf_counter()
+    aggregate_csv_sum.clean_numeric_column(values)
+    return len(values), time.perf_counter() - start_time
+
+def case_dedupe_and_group(path, reference_path, workers):
+    return time_dedupe_and_group(path, compact=False)
+
+def case_dedupe_and_group_compact(path, reference_path, workers):
+    return time_dedupe_and_group(path, compact=True)
+
+def time_dedupe_and_group(path, compact):
+    """
+    Times drop_duplicates and groupby on the loaded file (the loading is not measured).
+    """
+    import compact_dtypes
+    import csv_dialect
+    df = csv_dialect.read_csv(path)
+    if compact:
+        df = compact_dtypes.compact(df)
+    start_time = time.perf_counter()
+    df.drop_duplicates(subset='id')
+    df.drop_duplicates(subset='group')
+    df.groupby('group', observed=True).size()
+    df.groupby('group', observed=True)['id'].first()
+    return len(df), time.perf_counter() - start_time
+
+CASES = {
+    'remove_duplicates': case_remove_duplicates,
+    'remove_duplicates_streaming': case_remove_duplicates_streaming,
+    'remove_duplicates_whole_rows_streaming': case_remove_duplicates_whole_rows_streaming,
+    'merge_files': case_merge_files,
+    'merge_files_streaming': case_merge_files_streaming,
+    'scan_missing_values': case_scan_missing_values,
+    'scan_missing_values_in_chunks': case_scan_missing_values_in_chunks,
+    'scan_missing_values_bytes': case_scan_missing_values_bytes,
+    'dedupe_and_group': case_dedupe_and_group,
+    'dedupe_and_group_compact': case_dedupe_and_group_compact,
+    'group_count': case_group_count,
+    'group_count_gzip': case_group_count_gzip,
+    'group_count_gzip_decompress_first': case_group_count_gzip_decompress_first,
+    'group_count_parallel': case_group_count_parallel,
+    'group_sum': case_group_sum,
+    'group_sum_parallel': case_group_sum_parallel,
+    'clean_numeric': case_clean_numeric,
+    'clean_numeric_column': case_clean_numeric_column,
+}
+
+def compressed_path(path):
+    """
+    Returns the name of the gzip copy of a generated file used by the compressed cases.
+    """
+    return path + '.gz'
+
+def count_rows(path):
+    """
+    Returns the number of data rows of a generated file (it has no line breaks inside values).
+    """
+    with open(path, 'rb') as file:
+        return sum(block.count(b'\n') for block in iter(lambda: file.read(1 << 20), b'')) - 1
+
+def read_status_mb(field):
+    """
+    Returns a memory field of /proc/self/status (e.g. VmRSS or VmHWM) in MB, None where it does not exist.
+    """
+    try:
+        with open('/proc/self/status', encoding='ascii') as file:
+            for line in file:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    """
+    Resets the peak resident set size of this process to its current size (Linux only).
+
+    Returns:
+        bool: True when the peak was reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb(who=None):
+    """
+    Returns the peak resident set size of this process in MB, None when it cannot be measured.
+
+    On Linux the peak since the last reset_peak_rss() is read from VmHWM.
+    Elsewhere, and for the largest finished child process (who=RUSAGE_CHILDREN),
+    ru_maxrss is used; it keeps the peak of the parent process a process was
+    started from, so it is only an upper bound.
+    """
+    if who is None:
+        peak = read_status_mb('VmHWM')
+        if peak is not None:
+            return peak
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_case(name, path, reference_path, workers, work_dir):
+    """
+    Runs one benchmark case, called in a fresh process so the peak memory belongs to the case.
+
+    The peak is measured from the memory after the imports (baseline_rss_mb):
+    peak_rss_mb is the peak of the whole process, peak_rss_delta_mb the
+    memory the case added on top of the baseline.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(work_dir)
+    # Imports pandas and the scripts before measuring the baseline memory
+    import aggregate_csv_by_column, aggregate_csv_sum, byte_scanner, find_missing_values  # noqa: F401
+    import merge_two_csvs_by_column, remove_duplicates  # noqa: F401
+    # The peak inherited from the parent process and reached by the imports is forgotten
+    reset_peak_rss()
+    baseline = read_status_mb('VmRSS')
+    if baseline is None:
+        baseline = peak_rss_mb()
+
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows, measured = CASES[name](path, reference_path, workers)
+    elapsed = measured if measured is not None else time.perf_counter() - start_time
+    peak = peak_rss_mb()
+
+    return {
+        'case': name,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed > 0 else None,
+        'peak_rss_mb': peak,
+        'peak_rss_delta_mb': peak - baseline if peak is not None and baseline is not None else None,
+        # Workers of the parallel cases
+        'peak_rss_children_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        'baseline_rss_mb': baseline,
+    }
+
+def generate_inputs(path, reference_path, rows, generator_options, compress):
+    """
+    Writes the input files of one row count (called in a separate process, so the
+    memory of the generator does not stay in the process that starts the cases).
+    """
+    generate_csv(path, rows, **generator_options)
+    generate_reference_csv(reference_path, max(rows // 10, 1), rows,
+                           html_entities=generator_options['html_entities'],
+                           delimiter=generator_options['delimiter'])
+    if compress:
+        with open(path, 'rb') as source, gzip.open(compressed_path(path), 'wb', compresslevel=6) as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+
+def run_benchmarks(rows_list, case_names, workers, generator_options, work_dir):
+    """
+    Generates the input files and runs every case for every row count.
+
+    Returns:
+        list: One result dictionary per case and row count.
+    """
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for rows in rows_list:
+        path = os.path.join(work_dir, f"benchmark_{rows}.csv")
+        reference_path = os.path.join(work_dir, f"reference_{rows}.csv")
+        print(f"Generating {rows} rows...")
+        compress = any('gzip' in name for name in case_names)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            executor.submit(generate_inputs, path, reference_path, rows, generator_options, compress).result()
+
+        for name in case_names:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_case, name, path, reference_path, workers, work_dir).result()
+            result['input_rows'] = rows
+            result['input_bytes'] = os.path.getsize(path)
+            results.append(result)
+            print_result(result)
+    return results
+
+def print_result(result):
+    """
+    Prints one line of the result table.
+    """
+    if result['peak_rss_delta_mb'] is not None:
+        peak = f"+{result['peak_rss_delta_mb']:.0f} MB (baseline {result['baseline_rss_mb']:.0f} MB)"
+    else:
+        peak = "n/a"
+    speed = f"{result['rows_per_second']:,.0f}" if result['rows_per_second'] else "n/a"
+    print(f"  {result['case']:<32} {result['seconds']:>9.3f} s {speed:>14} rows/s  peak RSS {peak}")
+
+def parse_arguments(argv=None):
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks the CSV toolkit on synthetic CSV files.")
+    parser.add_argument('--rows', type=float, nargs='+', default=[1e4, 1e5, 1e6],
+                        help="row counts to benchmark (1e4 to 1e8)")
+    parser.add_argument('--columns', type=int, default=6, help="number of columns (at least 4)")
+    parser.add_argument('--key-cardinality', type=int, default=1000, help="distinct values of the group column")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1, help="share of rows with a repeated id")
+    parser.add_argument('--missing-ratio', type=float, default=0.01, help="share of empty values")
+    parser.add_argument('--no-decimal-comma', action='store_true', help="write amounts with a decimal dot")
+    parser.add_argument('--no-html-entities', action='store_true', help="do not use HTML entities in names")
+    parser.add_argument('--delimiter', default=',', help="delimiter of the generated files")
+    parser.add_argument('--seed', type=int, default=42, help="seed of the generator")
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES),
+                        help="cases to run (all by default)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes for the parallel cases")
+    parser.add_argument('--work-dir', help="directory for the generated files (a temporary one by default)")
+    parser.add_argument('--output', help="JSON file with the results (benchmark_results/<time>.json by default)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    generator_options = {
+        'columns': args.columns,
+        'key_cardinality': args.key_cardinality,
+        'duplicate_ratio': args.duplicate_ratio,
+        'missing_ratio': args.missing_ratio,
+        'decimal_comma': not args.no_decimal_comma,
+        'html_entities': not args.no_html_entities,
+        'delimiter': args.delimiter,
+        'seed': args.seed,
+    }
+    rows_list = [int(rows) for rows in args.rows]
+
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+        results = run_benchmarks(rows_list, args.cases, args.workers, generator_options, args.work_dir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="csv_benchmark_") as work_dir:
+            results = run_benchmarks(rows_list, args.cases, args.workers, generator_options, work_dir)
+
+    created = datetime.now()
+    output = args.output or os.path.join('benchmark_results', f"benchmark_{created:%Y%m%d_%H%M%S}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump({
+            'created': created.isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'workers': args.workers,
+            'generator': generator_options,
+            'results': results,
+        }, file, indent=2)
+    print(f"\nResults saved to '{output}'.")
+
+if __name__ == "__main__":
+    main()
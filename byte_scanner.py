@@ -0,0 +1,305 @@
+import codecs
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+import compressed_csv
+import csv_dialect
+
+# Size of the blocks of the memory-mapped file tokenized at once (a block ends after a record)
+BLOCK_SIZE = 8 * 1024 * 1024
+# Encodings in which the delimiter, quote and line breaks are single ASCII bytes
+ASCII_COMPATIBLE_ENCODINGS = ('utf-8', 'utf-8-sig', 'cp1250', 'latin-1')
+# Labels of the issues, in the order of their codes
+ISSUE_LABELS = ('Missing value', 'Empty value after stripping')
+MISSING, EMPTY = 0, 1
+# One issue in a spill file: column position, row number and label (index into ISSUE_LABELS)
+ISSUE_RECORD = np.dtype([('column', '<i4'), ('row', '<i8'), ('label', 'u1')])
+
+# Byte values of the missing value markers (none of them is longer than 8 bytes)
+NA_BYTES = sorted(value.encode('ascii') for value in csv_dialect.DEFAULT_NA_VALUES if value)
+NA_MAX_LENGTH = 8
+NA_FIRST_BYTES = np.array(sorted({value[0] for value in NA_BYTES}), dtype=np.uint8)
+
+def pack_bytes(values, starts, lengths):
+    """
+    Packs fields of at most 8 bytes into one uint64 each, so they can be compared with numpy.
+
+    Args:
+        values (numpy.ndarray): The bytes (uint8).
+        starts (numpy.ndarray): Start positions of the fields.
+        lengths (numpy.ndarray): Lengths of the fields (at most 8).
+
+    Returns:
+        numpy.ndarray: The packed fields (uint64).
+    """
+    packed = np.zeros(len(starts), dtype=np.uint64)
+    for offset in range(NA_MAX_LENGTH):
+        present = offset < lengths
+        if not present.any():
+            break
+        byte = values[np.minimum(starts + offset, len(values) - 1)].astype(np.uint64)
+        packed |= np.where(present, byte, 0).astype(np.uint64) << np.uint64(8 * offset)
+    return packed
+
+NA_PACKED = pack_bytes(np.frombuffer(b''.join(NA_BYTES), dtype=np.uint8),
+                       np.cumsum([0] + [len(value) for value in NA_BYTES[:-1]]),
+                       np.array([len(value) for value in NA_BYTES]))
+
+class Unsupported(Exception):
+    """
+    The file uses CSV syntax the byte scanner does not reproduce (pandas has to read it).
+    """
+
+def can_scan(filename):
+    """
+    Checks whether a file can be scanned on its raw bytes: a plain file in an ASCII-compatible encoding.
+    """
+    if compressed_csv.is_compressed(filename) or os.path.getsize(filename) == 0:
+        return False
+    return csv_dialect.detect_dialect(filename)['encoding'] in ASCII_COMPATIBLE_ENCODINGS
+
+def scan_missing_values(filename, spill_file, block_size=BLOCK_SIZE):
+    """
+    Finds missing and empty values of a CSV file without building a DataFrame.
+
+    The file is memory-mapped and tokenized block by block with numpy: quote
+    parity marks the delimiters and line breaks inside quoted values, the
+    remaining ones split the bytes into fields. Only fields that can be an
+    issue (no visible ASCII character, or a missing value marker like NA) are
+    decoded. The issues are the same as those of scan_missing_values of
+    find_missing_values.py on the file read with pandas (dtype=str): default
+    missing value markers, skipped blank lines, short rows filled with missing
+    values and row numbers counted from the header as row 1.
+
+    The issues of every block are appended to the spill file as ISSUE_RECORD
+    records, sorted by column and row, so only the counts stay in memory.
+
+    Args:
+        filename (str): The CSV file name.
+        spill_file (file): Binary file the issue records are written to.
+        block_size (int): Number of bytes tokenized at once.
+
+    Returns:
+        dict: [missing, empty] counts per column, in the column order, or None
+            when the file cannot be scanned on its bytes (compressed, an
+            encoding like UTF-16, a lone carriage return, quotes inside unquoted
+            values, rows longer than the header, an unclosed quote or
+            undecodable bytes). The spill file is incomplete then.
+    """
+    if not can_scan(filename):
+        return None
+    dialect = csv_dialect.detect_dialect(filename)
+    try:
+        columns = csv_dialect.read_header(filename)
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise ValueError(f"Failed to load the file: {e}")
+
+    with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        try:
+            counts = scan_mapped(mapped, dialect, len(columns), block_size, spill_file)
+        except Unsupported:
+            return None
+    return {column: [int(missing), int(empty)] for column, (missing, empty) in zip(columns, counts.tolist())}
+
+def scan_mapped(mapped, dialect, column_count, block_size, spill_file):
+    """
+    Tokenizes the memory-mapped file block by block and spills the issues.
+
+    Returns:
+        numpy.ndarray: Missing and empty counts per column (one row per column).
+    """
+    data = np.frombuffer(mapped, dtype=np.uint8)
+    state = {'header_pending': dialect['has_header'], 'next_index': 0}
+    counts = np.zeros((column_count, len(ISSUE_LABELS)), dtype=np.int64)
+    # The byte order mark is not a part of the first column name
+    position = len(codecs.BOM_UTF8) if mapped[:3] == codecs.BOM_UTF8 else 0
+    while position < len(data):
+        end = min(position + block_size, len(data))
+        block = tokenize_block(data[position:end], dialect, end == len(data))
+        while block is None:
+            # No record ends in the block, it is extended until one does
+            end = min(position + 2 * (end - position), len(data))
+            block = tokenize_block(data[position:end], dialect, end == len(data))
+        records = issue_records(*find_block_issues(block, dialect, column_count, state))
+        counts += np.bincount(records['column'] * len(ISSUE_LABELS) + records['label'],
+                              minlength=counts.size).reshape(counts.shape)
+        spill_file.write(records.tobytes())
+        position += block['size']
+    return counts
+
+def issue_records(row_numbers, column_positions, codes):
+    """
+    Packs the issues of one block into ISSUE_RECORD records sorted by column and row.
+    """
+    order = np.lexsort((row_numbers, column_positions))
+    records = np.empty(len(order), dtype=ISSUE_RECORD)
+    records['column'] = column_positions[order]
+    records['row'] = row_numbers[order]
+    records['label'] = codes[order]
+    return records
+
+def tokenize_block(values, dialect, final):
+    """
+    Splits a block into fields, the block is cut after its last complete record.
+
+    A delimiter or line break is inside a quoted value when an odd number of
+    quotes precedes it, so only the positions of quotes, delimiters and line
+    breaks are collected from the bytes.
+
+    Args:
+        values (numpy.ndarray): Bytes of the block (uint8), starting at a record.
+        dialect (dict): The detected dialect.
+        final (bool): Whether the block ends with the file.
+
+    Returns:
+        dict: The bytes and the field boundaries, or None when no record ends in the block.
+    """
+    quotes = np.flatnonzero(values == ord(dialect['quotechar']))
+    separators = np.flatnonzero((values == ord(dialect['delimiter'])) | (values == ord('\n')))
+    if len(quotes):
+        separators = separators[np.searchsorted(quotes, separators) % 2 == 0]
+    is_break = values[separators] == ord('\n')
+    if not final:
+        breaks = np.flatnonzero(is_break)
+        if len(breaks) == 0:
+            return None
+        separators, is_break = separators[:breaks[-1] + 1], is_break[:breaks[-1] + 1]
+        values = values[:separators[-1] + 1]
+        quotes = quotes[:np.searchsorted(quotes, len(values))]
+    elif len(quotes) % 2:
+        raise Unsupported("A quoted value is not closed at the end of the file.")
+    check_quotes_and_line_breaks(values, quotes, dialect)
+
+    ends, ends_record = separators, is_break
+    if final and not (len(ends) and ends[-1] == len(values) - 1 and ends_record[-1]):
+        # The end of the file ends the last record, which has no line break
+        ends = np.append(ends, len(values))
+        ends_record = np.append(ends_record, True)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # The carriage return of a Windows line break is not a part of the last field
+    last = np.maximum(ends - 1, 0)
+    carriage_return = ends_record & (ends > starts) & (values[last] == ord('\r'))
+    ends = ends - carriage_return
+    return {'values': values, 'size': len(values), 'starts': starts, 'ends': ends, 'ends_record': ends_record}
+
+def check_quotes_and_line_breaks(values, quotes, dialect):
+    """
+    Rejects quotes and line breaks that pandas reads differently from a plain quote parity.
+
+    An opening quote has to start a field and a closing quote has to end it
+    (or be followed by a quote, as an escaped quote), a carriage return outside
+    quotes has to be followed by a line feed.
+    """
+    delimiter, quote = ord(dialect['delimiter']), ord(dialect['quotechar'])
+    opening, closing = quotes[0::2], quotes[1::2]
+    before = values[opening[opening > 0] - 1]
+    if not np.isin(before, np.array([delimiter, ord('\n'), quote], dtype=np.uint8)).all():
+        raise Unsupported("A quote inside an unquoted value.")
+    after = values[closing[closing + 1 < len(values)] + 1]
+    if not np.isin(after, np.array([delimiter, ord('\n'), ord('\r'), quote], dtype=np.uint8)).all():
+        raise Unsupported("A value continues after its closing quote.")
+    carriage_returns = np.flatnonzero(values == ord('\r'))
+    if len(quotes):
+        carriage_returns = carriage_returns[np.searchsorted(quotes, carriage_returns) % 2 == 0]
+    if len(carriage_returns):
+        following = carriage_returns + 1
+        if following[-1] >= len(values) or (values[following] != ord('\n')).any():
+            raise Unsupported("A carriage return without a line feed.")
+
+def find_block_issues(block, dialect, column_count, state):
+    """
+    Finds the missing and empty fields of the records of one block.
+
+    Args:
+        block (dict): The tokenized block (see tokenize_block).
+        dialect (dict): The detected dialect.
+        column_count (int): Number of columns of the file.
+        state (dict): The header and the data row counter carried between blocks.
+
+    Returns:
+        tuple: Arrays of row numbers, column positions and issue codes.
+    """
+    values, starts, ends, ends_record = block['values'], block['starts'], block['ends'], block['ends_record']
+    quote = ord(dialect['quotechar'])
+
+    # The last field, the first field and the number of fields of every record
+    last_field = np.flatnonzero(ends_record)
+    first_field = np.concatenate(([0], last_field[:-1] + 1))
+    field_counts = last_field - first_field + 1
+
+    # Values of quoted fields are between the quotes
+    lengths = ends - starts
+    first_byte = values[np.minimum(starts, len(values) - 1)]
+    quoted = (lengths > 0) & (first_byte == quote)
+    content_starts = starts + quoted
+    content_lengths = lengths - 2 * quoted
+    first_byte[quoted] = values[np.minimum(content_starts[quoted], len(values) - 1)]
+
+    # A value can be an issue only when it is empty, starts with a byte that is not a visible
+    # ASCII character (whitespace, non-ASCII), or is a missing value marker like NA
+    invisible = (first_byte <= 0x20) | (first_byte >= 0x7f)
+    maybe_marker = (content_lengths <= NA_MAX_LENGTH) & np.isin(first_byte, NA_FIRST_BYTES)
+    candidates = np.flatnonzero((content_lengths == 0) | invisible | maybe_marker)
+
+    # Blank lines (nothing but spaces and tabs) are skipped like in pandas.read_csv
+    valid = np.ones(len(first_field), dtype=bool)
+    single = np.flatnonzero(field_counts == 1)
+    single_fields = first_field[single]
+    maybe_blank = (lengths[single_fields] == 0) | (invisible[single_fields] & ~quoted[single_fields])
+    for position in single[maybe_blank]:
+        field = first_field[position]
+        if not values[starts[field]:ends[field]].tobytes().strip(b' \t'):
+            valid[position] = False
+    if state['header_pending'] and valid.any():
+        valid[np.argmax(valid)] = False
+        state['header_pending'] = False
+    if (field_counts[valid] > column_count).any():
+        raise Unsupported("A row has more fields than the header.")
+    row_numbers = state['next_index'] + np.cumsum(valid) + 1
+    state['next_index'] += int(valid.sum())
+
+    record = np.searchsorted(last_field, candidates)
+    candidates, record = candidates[valid[record]], record[valid[record]]
+    empty = content_lengths[candidates] == 0
+    marker = np.zeros(len(candidates), dtype=bool)
+    packable = np.flatnonzero(maybe_marker[candidates] & ~empty)
+    packed = pack_bytes(values, content_starts[candidates[packable]], content_lengths[candidates[packable]])
+    marker[packable] = np.isin(packed, NA_PACKED)
+    codes = np.full(len(candidates), -1, dtype=np.int64)
+    codes[empty | marker] = MISSING
+    # The remaining values are decoded (whitespace, or non-ASCII characters that may be whitespace)
+    for position in np.flatnonzero(invisible[candidates] & (codes < 0)):
+        field = candidates[position]
+        codes[position] = classify(values, content_starts[field], content_lengths[field], quoted[field], dialect)
+    issues = codes >= 0
+    candidates, record, codes = candidates[issues], record[issues], codes[issues]
+
+    # Short rows are filled with missing values
+    short_rows = np.flatnonzero(valid & (field_counts < column_count))
+    missing_counts = column_count - field_counts[short_rows]
+    filled_rows = np.repeat(short_rows, missing_counts)
+    filled_columns = (np.arange(len(filled_rows)) - np.repeat(np.cumsum(missing_counts) - missing_counts, missing_counts)
+                      + np.repeat(field_counts[short_rows], missing_counts))
+
+    return (np.concatenate((row_numbers[record], row_numbers[filled_rows])),
+            np.concatenate((candidates - first_field[record], filled_columns)),
+            np.concatenate((codes, np.full(len(filled_rows), MISSING))))
+
+def classify(values, start, length, quoted, dialect):
+    """
+    Decodes one field and returns its issue code, or -1 when it is not an issue.
+    """
+    raw = values[start:start + length].tobytes()
+    if quoted:
+        quote = dialect['quotechar'].encode('ascii')
+        raw = raw.replace(quote + quote, quote)
+    try:
+        text = raw.decode(dialect['encoding'])
+    except UnicodeDecodeError:
+        raise Unsupported("The bytes of a value cannot be decoded.")
+    if text in csv_dialect.DEFAULT_NA_VALUES:
+        return MISSING
+    return EMPTY if not text.strip() else -1
@@ -0,0 +1,184 @@
+import queue
+import threading
+
+import compressed_csv
+
+# Number of chunks parsed ahead of the transform stage
+READ_AHEAD_CHUNKS = 2
+# Number of chunks waiting for the writer thread (the transform stage waits when they are not written yet)
+WRITE_QUEUE_CHUNKS = 4
+# Serialized rows are written to the output file in blocks of about this size (characters)
+WRITE_BLOCK_SIZE = 8 * 1024 * 1024
+# Number of rows of a loaded DataFrame serialized at once by write_csv
+WRITE_SLICE_ROWS = 100_000
+# Seconds between checks of the stop event while a thread waits for a chunk
+POLL_SECONDS = 0.1
+
+def read_ahead(chunks, queue_chunks=READ_AHEAD_CHUNKS):
+    """
+    Iterates over chunks produced by a background reader thread.
+
+    The thread parses the next chunks while the caller transforms the previous
+    one (the C parser of pandas releases the GIL while tokenizing, reads and
+    decompression release it too). At most queue_chunks chunks wait in memory.
+    Leaving the loop early stops the thread.
+
+    Args:
+        chunks (iterable): The chunks, e.g. a pandas reader created with chunksize.
+        queue_chunks (int): Number of chunks read ahead.
+
+    Yields:
+        pandas.DataFrame: The chunks in their order.
+    """
+    items = queue.Queue(maxsize=queue_chunks)
+    stop = threading.Event()
+    thread = threading.Thread(target=produce_chunks, args=(chunks, items, stop), name="read ahead", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is None:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def produce_chunks(chunks, items, stop):
+    """
+    Puts the chunks into the queue (runs in the reader thread).
+
+    None marks the end, an error is passed to the consumer. A pandas reader is
+    closed in the thread that used it.
+    """
+    try:
+        for chunk in chunks:
+            if not compressed_csv.put_block(items, chunk, stop):
+                return
+        compressed_csv.put_block(items, None, stop)
+    except Exception as error:
+        compressed_csv.put_block(items, error, stop)
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+class ChunkWriter:
+    """
+    Writes DataFrame chunks to a plain or compressed CSV file in a background thread.
+
+    The caller serializes every chunk and the thread writes (and compresses)
+    the text while the caller prepares the next chunks. Writes and compression
+    release the GIL, so they run in parallel with the parsing and transforms.
+    The serialized rows are collected and written in blocks of about
+    WRITE_BLOCK_SIZE characters, so a slow or network-mounted disk gets few
+    large writes. At most WRITE_QUEUE_CHUNKS chunks wait for the thread, then
+    write() waits too (backpressure), so memory stays bounded. The header is
+    written with the first chunk.
+
+    Usage:
+        with ChunkWriter(filename) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    """
+
+    def __init__(self, filename, index=False, queue_chunks=WRITE_QUEUE_CHUNKS, block_size=WRITE_BLOCK_SIZE):
+        self.filename = filename
+        self.index = index
+        self.header = True
+        self.output = compressed_csv.open_output(filename)
+        self.chunks = queue.Queue(maxsize=queue_chunks)
+        self.stop = threading.Event()
+        self.error = None
+        self.rows = 0
+        self.thread = threading.Thread(target=self.write_blocks, args=(block_size,),
+                                       name=f"write {filename}", daemon=True)
+        self.thread.start()
+
+    def write(self, chunk):
+        """
+        Serializes a chunk and queues it for writing, waits while the queue is full.
+        """
+        text = chunk.to_csv(header=self.header, index=self.index)
+        self.header = False
+        if not compressed_csv.put_block(self.chunks, text, self.stop):
+            self.raise_error()
+        self.rows += len(chunk)
+
+    def write_blocks(self, block_size):
+        """
+        Writes the queued text in blocks (runs in the writer thread).
+        """
+        pending = []
+        pending_size = 0
+        try:
+            while True:
+                try:
+                    text = self.chunks.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    if self.stop.is_set():
+                        return
+                    continue
+                if text is None:
+                    break
+                pending.append(text)
+                pending_size += len(text)
+                if pending_size >= block_size:
+                    self.output.write(''.join(pending))
+                    pending, pending_size = [], 0
+            if pending:
+                self.output.write(''.join(pending))
+            self.output.flush()
+        except Exception as error:
+            self.error = error
+            self.stop.set()
+
+    def close(self, abort=False):
+        """
+        Writes the remaining chunks and closes the file (abort drops the queued chunks).
+        """
+        if self.output.closed:
+            return
+        if abort:
+            self.stop.set()
+        else:
+            compressed_csv.put_block(self.chunks, None, self.stop)
+        self.thread.join()
+        self.output.close()
+        if not abort:
+            self.raise_error()
+
+    def raise_error(self):
+        """
+        Raises the error of the writer thread in the caller.
+        """
+        if self.error is not None:
+            raise self.error
+        if self.stop.is_set():
+            raise RuntimeError(f"The writer of '{self.filename}' was stopped.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(abort=exc_type is not None)
+        return False
+
+def write_csv(df, filename, index=False, slice_rows=WRITE_SLICE_ROWS):
+    """
+    Saves a loaded DataFrame to a plain or compressed CSV file through a ChunkWriter.
+
+    The rows are serialized in slices, so the file is written and compressed
+    by the writer thread while the next slices are serialized.
+
+    Args:
+        df (pandas.DataFrame): The data to save.
+        filename (str): The output file name (compressed according to its extension).
+        index (bool): Whether to write the index.
+        slice_rows (int): Number of rows serialized at once.
+    """
+    with ChunkWriter(filename, index=index) as writer:
+        for start in range(0, max(len(df), 1), slice_rows):
+            writer.write(df.iloc[start:start + slice_rows])
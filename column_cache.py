@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import compact_dtypes
+import csv_dialect
+
+# Directory with cached columns, created next to the source CSV file
+CACHE_DIRNAME = '.csv_cache'
+# Environment variable that turns the cache on (e.g. CSV_TOOLKIT_CACHE=1)
+ENABLE_VARIABLE = 'CSV_TOOLKIT_CACHE'
+# Environment variable with the size limit of one cache directory in MB
+MAX_SIZE_VARIABLE = 'CSV_TOOLKIT_CACHE_MAX_MB'
+DEFAULT_MAX_SIZE_MB = 2048
+META_FILENAME = 'meta.json'
+# Version of the entry format, entries of other versions are never used (and evicted over time)
+CACHE_VERSION = 2
+# Read options applied to the cached text on load, other options are read directly from the file
+CACHED_OPTIONS = {'dtype'}
+
+def is_enabled():
+    """
+    Checks whether the columnar cache is turned on by the environment variable.
+    """
+    return os.environ.get(ENABLE_VARIABLE, '').strip().lower() not in ('', '0', 'no', 'false')
+
+def read_csv(filename, columns=None, **read_options):
+    """
+    Reads a CSV file through the columnar cache.
+
+    On the first load the whole file is parsed as text and every column is
+    stored as NumPy files in a cache entry next to the source file, numeric
+    columns also as numbers. Later loads memory-map only the requested
+    columns. The entry is keyed on the path, size and modification time of
+    the file only; the dtype option is applied on load, so readers with and
+    without dtype=str share one entry. Other read options bypass the cache.
+    When the cache is turned off, the file is read directly. The loaded data
+    gets compact dtypes when they are turned on (see compact_dtypes.py).
+
+    Args:
+        filename (str): The CSV file name.
+        columns (list, optional): Columns to return (all when None).
+        **read_options: Additional options for pandas.read_csv (e.g. dtype=str).
+
+    Returns:
+        pandas.DataFrame: The loaded data, columns in the order of the file.
+    """
+    if not is_enabled() or set(read_options) - CACHED_OPTIONS:
+        return compact_dtypes.compact_if_enabled(csv_dialect.read_csv(filename, usecols=columns, **read_options))
+
+    dtype = read_options.get('dtype')
+    cache_root = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIRNAME)
+    entry_dir = os.path.join(cache_root, cache_key(filename))
+    if os.path.exists(os.path.join(entry_dir, META_FILENAME)):
+        try:
+            return compact_dtypes.compact_if_enabled(load_entry(entry_dir, columns, dtype))
+        except (OSError, ValueError, KeyError):
+            # A damaged entry is rebuilt
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+    df = csv_dialect.read_csv(filename, dtype=str)
+    types = csv_dialect.ColumnTypes()
+    types.update(df)
+    try:
+        if write_entry(entry_dir, df, types):
+            evict_old_entries(cache_root, max_cache_bytes(), keep=entry_dir)
+            return compact_dtypes.compact_if_enabled(load_entry(entry_dir, columns, dtype))
+    except OSError:
+        # The cache is optional, e.g. the directory may be read-only
+        shutil.rmtree(entry_dir + '.tmp', ignore_errors=True)
+
+    if columns is not None:
+        df = df[[column for column in df.columns if column in columns]]
+    # Without an entry the text is converted in memory, like load_entry does
+    requested = {name: requested_dtype(name, dtype) for name in df.columns}
+    types.apply(df, skip=[name for name, value in requested.items() if value is not None])
+    for name, value in requested.items():
+        if value is not None and not is_text_dtype(value):
+            df[name] = df[name].astype(value)
+    return compact_dtypes.compact_if_enabled(df)
+
+def cache_key(filename):
+    """
+    Returns the name of the cache entry for a file (its path, size and modification time).
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    identity = json.dumps([CACHE_VERSION, path, stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+def requested_dtype(name, dtype):
+    """
+    Returns the dtype requested for one column by the dtype read option (None for the inferred type).
+    """
+    if isinstance(dtype, dict):
+        return dtype.get(name)
+    return dtype
+
+def is_text_dtype(dtype):
+    """
+    Checks whether a requested dtype keeps the values as text (str, object or a string dtype).
+    """
+    return dtype in (str, object) or pd.api.types.is_string_dtype(dtype)
+
+def max_cache_bytes():
+    """
+    Returns the size limit of one cache directory in bytes.
+    """
+    try:
+        return int(float(os.environ.get(MAX_SIZE_VARIABLE, DEFAULT_MAX_SIZE_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_MAX_SIZE_MB * 1024 * 1024
+
+def write_entry(entry_dir, df, types):
+    """
+    Stores every column of a DataFrame read as text as NumPy files.
+
+    Every column is stored as integer codes (in the smallest integer type,
+    the type of categorical codes) plus a UTF-8 blob with the sorted distinct
+    values. Columns that are numbers in the whole file (see
+    csv_dialect.ColumnTypes) are also stored as plain arrays of the inferred type.
+
+    Args:
+        entry_dir (str): The directory of the entry.
+        df (pandas.DataFrame): The whole file read with dtype=str.
+        types (csv_dialect.ColumnTypes): The kinds of the whole columns.
+
+    Returns:
+        bool: True when the entry was written.
+    """
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        return False
+
+    temp_dir = entry_dir + '.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+
+    meta = {'rows': len(df), 'types': types.state(), 'columns': []}
+    for position, (name, values) in enumerate(df.items()):
+        stem = f"col_{position}"
+        # Sorted categories keep the order of groupby and sort_index the same as for text
+        codes, uniques = pd.factorize(values, sort=True)
+        encoded = [value.encode('utf-8', 'surrogatepass') for value in uniques]
+        offsets = np.cumsum([0] + [len(value) for value in encoded], dtype=np.int64)
+        np.save(os.path.join(temp_dir, stem + '.npy'), codes.astype(code_dtype(len(uniques))))
+        np.save(os.path.join(temp_dir, stem + '_offsets.npy'), offsets)
+        with open(os.path.join(temp_dir, stem + '_values.bin'), 'wb') as file:
+            file.write(b''.join(encoded))
+        if types.kind(name) in ('int', 'float'):
+            numbers = types.apply(values.to_frame())[name]
+            np.save(os.path.join(temp_dir, stem + '_numbers.npy'), numbers.to_numpy())
+        categorical = len(uniques) <= compact_dtypes.CATEGORY_MAX_SHARE * len(values)
+        meta['columns'].append({'name': name, 'file': stem, 'categorical': categorical})
+
+    with open(os.path.join(temp_dir, META_FILENAME), 'w', encoding='utf-8') as file:
+        json.dump(meta, file)
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(temp_dir, entry_dir)
+    return True
+
+def code_dtype(category_count):
+    """
+    Returns the integer type pandas uses for the codes of a categorical with the given number of categories.
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if category_count < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def load_entry(entry_dir, columns=None, dtype=None):
+    """
+    Loads columns from a cache entry, numeric arrays and text codes are memory-mapped.
+
+    Args:
+        entry_dir (str): The directory of the entry.
+        columns (list, optional): Columns to return (all when None).
+        dtype (optional): The dtype read option, a type or a dictionary by column.
+
+    Returns:
+        pandas.DataFrame: The loaded columns, numbers with the inferred types unless
+        another dtype is requested.
+    """
+    meta_path = os.path.join(entry_dir, META_FILENAME)
+    with open(meta_path, encoding='utf-8') as file:
+        meta = json.load(file)
+    # Marks the entry as recently used for the LRU eviction
+    os.utime(meta_path)
+
+    types = csv_dialect.ColumnTypes.from_state(meta['types'])
+    string_dtype = compact_dtypes.arrow_string_dtype()
+    data = {}
+    for column in meta['columns']:
+        name = column['name']
+        if columns is not None and name not in columns:
+            continue
+        stem = os.path.join(entry_dir, column['file'])
+        requested = requested_dtype(name, dtype)
+        if requested is None and types.kind(name) in ('int', 'float'):
+            data[name] = np.load(stem + '_numbers.npy', mmap_mode='r')
+            continue
+        values = load_text_column(stem, column['categorical'], string_dtype)
+        if requested is not None and not is_text_dtype(requested):
+            values = pd.Series(values).astype(requested)
+        data[name] = values
+
+    df = pd.DataFrame(data, copy=False)
+    if not data:
+        df = pd.DataFrame(index=pd.RangeIndex(meta['rows']))
+    return df
+
+def load_text_column(stem, categorical, string_dtype):
+    """
+    Loads a text column from its codes and distinct values.
+
+    Columns with few distinct values become categorical over the
+    memory-mapped codes, the others Arrow strings taken from the blob (Python
+    strings only without pyarrow). Code -1 is a missing value.
+    """
+    codes = np.load(stem + '.npy', mmap_mode='r')
+    offsets = np.load(stem + '_offsets.npy')
+    with open(stem + '_values.bin', 'rb') as file:
+        blob = file.read()
+
+    if string_dtype is not None:
+        import pyarrow as pa
+
+        uniques = pa.LargeStringArray.from_buffers(len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(blob))
+        if categorical:
+            categories = pd.Index(pd.array(uniques, dtype=string_dtype))
+            return pd.Categorical.from_codes(codes, categories=categories, validate=False)
+        return pd.array(uniques.take(pa.array(codes, mask=np.asarray(codes) < 0)), dtype=string_dtype)
+
+    uniques = np.array([blob[start:end].decode('utf-8', 'surrogatepass')
+                        for start, end in zip(offsets[:-1], offsets[1:])], dtype=object)
+    if categorical:
+        return pd.Categorical.from_codes(codes, categories=pd.Index(uniques, dtype=object), validate=False)
+    # Code -1 (a missing value) takes the NaN at the end
+    return np.append(uniques, np.nan)[codes]
+
+def evict_old_entries(cache_root, max_bytes, keep=None):
+    """
+    Deletes the least recently used cache entries until the directory fits into max_bytes.
+    """
+    entries = []
+    for name in os.listdir(cache_root):
+        entry_dir = os.path.join(cache_root, name)
+        meta_path = os.path.join(entry_dir, META_FILENAME)
+        if not os.path.exists(meta_path):
+            continue
+        size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+        entries.append((os.path.getmtime(meta_path), size, entry_dir))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry_dir in sorted(entries):
+        if total <= max_bytes:
+            break
+        if entry_dir == keep:
+            continue
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
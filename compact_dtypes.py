@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import stage_timer
+
+# Environment variable that turns the compact dtypes on (e.g. CSV_TOOLKIT_COMPACT=1)
+ENABLE_VARIABLE = 'CSV_TOOLKIT_COMPACT'
+# Text columns with at most this share of distinct values are stored as categories
+CATEGORY_MAX_SHARE = 0.5
+
+def is_enabled():
+    """
+    Checks whether the compact dtypes are turned on by the environment variable.
+    """
+    return os.environ.get(ENABLE_VARIABLE, '').strip().lower() not in ('', '0', 'no', 'false')
+
+def arrow_string_dtype():
+    """
+    Returns the Arrow-backed string dtype with NaN as the missing value, or None without pyarrow.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except TypeError:
+        # pandas 2.1 and 2.2 name the same dtype differently
+        try:
+            return pd.StringDtype('pyarrow_numpy')
+        except (TypeError, ValueError):
+            return None
+
+def compact(df, verbose=True):
+    """
+    Converts the columns of a DataFrame to compact dtypes.
+
+    Text columns with few distinct values (group keys, categories) become
+    categorical, so every distinct value is stored once and the rows keep
+    only small integer codes. Other text columns become Arrow-backed strings
+    (one buffer per column instead of a Python object per value). Integer
+    columns are downcast to the smallest integer type that holds their values.
+    Float columns are kept, a float32 value would be written differently.
+
+    Args:
+        df (pandas.DataFrame): The loaded data.
+        verbose (bool): Whether to print the memory before and after.
+
+    Returns:
+        pandas.DataFrame: The data with compact columns (the values are the same).
+    """
+    with stage_timer.stage('compact dtypes', len(df)):
+        before = int(df.memory_usage(deep=True).sum())
+        string_dtype = arrow_string_dtype()
+        converted = {'categories': [], 'Arrow strings': [], 'downcast': []}
+        columns = {}
+        for name, values in df.items():
+            kind, values = compact_column(values, string_dtype)
+            if kind is not None:
+                converted[kind].append(str(name))
+            columns[name] = values
+        result = pd.DataFrame(columns, index=df.index, copy=False)
+        result.columns = df.columns
+        after = int(result.memory_usage(deep=True).sum())
+
+    if verbose:
+        details = '; '.join(f"{kind}: {', '.join(names)}" for kind, names in converted.items() if names)
+        print(f"Compact dtypes: {before / 1024 ** 2:.1f} MB -> {after / 1024 ** 2:.1f} MB"
+              + (f" ({details})" if details else ""))
+    return result
+
+def compact_column(values, string_dtype):
+    """
+    Converts one column to a compact dtype.
+
+    Returns:
+        tuple: (kind of the conversion or None, the converted column).
+    """
+    if pd.api.types.is_integer_dtype(values.dtype) and not pd.api.types.is_extension_array_dtype(values.dtype):
+        downcast = pd.to_numeric(values, downcast='integer')
+        return ('downcast' if downcast.dtype != values.dtype else None), downcast
+    if not pd.api.types.is_string_dtype(values.dtype):
+        return None, values
+    if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        return None, values
+
+    if len(values) and values.nunique(dropna=True) <= CATEGORY_MAX_SHARE * len(values):
+        return 'categories', values.astype('category')
+    if string_dtype is not None and values.dtype != string_dtype:
+        return 'Arrow strings', values.astype(string_dtype)
+    return None, values
+
+def compact_if_enabled(df):
+    """
+    Converts a loaded DataFrame to compact dtypes when they are turned on by the environment variable.
+    """
+    return compact(df) if is_enabled() else df
@@ -0,0 +1,209 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+
+import pandas as pd
+
+# Compressed formats, recognized by the file extension
+OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+# Extensions of the files listed by the tools (plain and compressed CSV files)
+CSV_EXTENSIONS = ('.csv',) + tuple('.csv' + extension for extension in OPENERS)
+# Size of the decompressed blocks passed from the decompression thread to the parser
+BLOCK_SIZE = 1024 * 1024
+# Number of decompressed blocks kept ahead of the parser
+QUEUE_BLOCKS = 8
+# Environment variable that turns on compressed outputs (gz, bz2 or xz)
+COMPRESS_VARIABLE = 'CSV_TOOLKIT_COMPRESS'
+# Compression level of gzip outputs (the level of the gzip command, pandas uses the slower level 9)
+GZIP_LEVEL = 6
+# Typical size of a decompressed CSV file compared to the compressed one
+ESTIMATED_RATIO = 5
+
+def is_csv_file(filename):
+    """
+    Checks whether a file name is a plain or compressed CSV file (.csv, .csv.gz, .csv.bz2, .csv.xz).
+    """
+    return filename.lower().endswith(CSV_EXTENSIONS)
+
+def compression(filename):
+    """
+    Returns the compression extension of a file name ('.gz', '.bz2', '.xz'), or None for plain files.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return extension if extension in OPENERS else None
+
+def is_compressed(filename):
+    """
+    Checks whether a file is compressed (judged by its extension).
+    """
+    return compression(filename) is not None
+
+def strip_extension(filename):
+    """
+    Returns the file name without its compression and .csv extensions ('data.csv.gz' -> 'data').
+    """
+    if is_compressed(filename):
+        filename = os.path.splitext(filename)[0]
+    stem, extension = os.path.splitext(filename)
+    return stem if extension.lower() == '.csv' else filename
+
+def open_binary(filename):
+    """
+    Opens a plain or compressed file for reading decompressed bytes.
+    """
+    extension = compression(filename)
+    if extension is None:
+        return open(filename, 'rb')
+    return OPENERS[extension](filename, 'rb')
+
+def estimated_size(filename):
+    """
+    Estimates the decompressed size of a file in bytes (the real size of plain files).
+    """
+    size = os.path.getsize(filename)
+    return size * ESTIMATED_RATIO if is_compressed(filename) else size
+
+class DecompressingReader(io.RawIOBase):
+    """
+    Reads a compressed file that is decompressed ahead in a background thread.
+
+    The zlib, bz2 and lzma modules release the GIL while decompressing, so the
+    next blocks are decompressed while pandas parses the previous ones. At most
+    QUEUE_BLOCKS blocks wait in memory. The thread ends at the end of the file
+    and closing (or dropping) the reader earlier stops it.
+    """
+
+    def __init__(self, filename, block_size=BLOCK_SIZE, queue_blocks=QUEUE_BLOCKS):
+        super().__init__()
+        # Opened here, so a missing file raises the error in the caller
+        source = open_binary(filename)
+        self.blocks = queue.Queue(maxsize=queue_blocks)
+        self.stop = threading.Event()
+        self.block = memoryview(b'')
+        self.position = 0
+        self.finished = False
+        # The thread does not hold the reader, so a dropped reader is closed by the garbage collector
+        self.thread = threading.Thread(target=decompress_blocks, args=(source, self.blocks, self.stop, block_size),
+                                       name=f"decompress {os.path.basename(filename)}", daemon=True)
+        self.thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.position >= len(self.block):
+            if self.finished:
+                return 0
+            block = self.blocks.get()
+            if isinstance(block, BaseException):
+                self.finished = True
+                raise block
+            if block is None:
+                self.finished = True
+                return 0
+            self.block, self.position = memoryview(block), 0
+        size = min(len(buffer), len(self.block) - self.position)
+        buffer[:size] = self.block[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.stop.set()
+        super().close()
+
+def decompress_blocks(source, blocks, stop, block_size):
+    """
+    Decompresses a file into a queue of blocks (runs in the background thread).
+
+    None marks the end of the file, an error is passed to the reader.
+    """
+    try:
+        with source:
+            while True:
+                block = source.read(block_size)
+                if not put_block(blocks, block or None, stop) or not block:
+                    return
+    except Exception as error:
+        put_block(blocks, error, stop)
+
+def put_block(blocks, item, stop):
+    """
+    Waits for free space in the queue, returns False when the reader was closed.
+    """
+    while not stop.is_set():
+        try:
+            blocks.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def open_input(filename):
+    """
+    Returns the source for pandas.read_csv: the file name of a plain file, or
+    a buffered DecompressingReader of a compressed one.
+    """
+    if not is_compressed(filename):
+        return filename
+    return io.BufferedReader(DecompressingReader(filename), buffer_size=BLOCK_SIZE)
+
+def read_csv(filename, **kwargs):
+    """
+    Reads a plain or compressed CSV file with pandas.read_csv.
+
+    Compressed files are decompressed in a background thread (see
+    DecompressingReader). The decompression of a chunked reader ends with the file.
+
+    Args:
+        filename (str): The CSV file name.
+        **kwargs: Options for pandas.read_csv.
+
+    Returns:
+        pandas.DataFrame: The loaded data (or a reader when chunksize or iterator is given).
+    """
+    source = open_input(filename)
+    if source is filename or kwargs.get('chunksize') or kwargs.get('iterator'):
+        return pd.read_csv(source, **kwargs)
+    with source:
+        return pd.read_csv(source, **kwargs)
+
+def output_compression():
+    """
+    Returns the compression extension requested for outputs by the environment variable, or None.
+    """
+    value = os.environ.get(COMPRESS_VARIABLE, '').strip().lower().lstrip('.')
+    value = {'gzip': 'gz', 'bzip2': 'bz2', 'lzma': 'xz'}.get(value, value)
+    return f'.{value}' if f'.{value}' in OPENERS else None
+
+def output_filename(filename):
+    """
+    Returns the name of an output file with the requested compression extension.
+
+    A compression extension taken over from the input name (e.g. cleaned_data.csv.gz)
+    is replaced, so outputs are compressed only when CSV_TOOLKIT_COMPRESS asks for it.
+    """
+    if is_compressed(filename):
+        filename = os.path.splitext(filename)[0]
+    return filename + (output_compression() or '')
+
+def open_output(filename):
+    """
+    Opens an output file for writing text, compressed according to its extension.
+    """
+    extension = compression(filename)
+    if extension is None:
+        return open(filename, 'w', encoding='utf-8', newline='')
+    options = {'compresslevel': GZIP_LEVEL} if extension == '.gz' else {}
+    return OPENERS[extension](filename, 'wt', encoding='utf-8', newline='', **options)
+
+def to_csv(df, filename, **kwargs):
+    """
+    Saves a DataFrame to a plain or compressed CSV file (compressed according to its extension).
+    """
+    with open_output(filename) as output:
+        df.to_csv(output, **kwargs)
@@ -0,0 +1,275 @@
+import argparse
+import contextlib
+import csv
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import compressed_csv
+import csv_pipeline
+
+# Share of the available memory that the running files may use together
+MEMORY_FRACTION = 0.7
+# Memory of one worker process with pandas loaded
+BASE_TASK_MEMORY = 200 * 1024 * 1024
+# Memory of parsed data compared to its size in the file
+PARSED_EXPANSION = 8
+# Number of bytes sampled to estimate the average row length
+SAMPLE_SIZE = 64 * 1024
+
+def list_csv_files(directory="."):
+    """
+    Returns the CSV files (also compressed .csv.gz, .csv.bz2 and .csv.xz) in a directory, sorted by name.
+    """
+    return sorted(file for file in os.listdir(directory)
+                  if compressed_csv.is_csv_file(file) and os.path.isfile(os.path.join(directory, file)))
+
+def available_memory():
+    """
+    Returns the memory available for new processes in bytes (None when it cannot be detected).
+    """
+    try:
+        with open('/proc/meminfo', encoding='ascii') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def estimate_task_memory(path, chunksize, dedupe=False):
+    """
+    Roughly estimates the peak memory of processing one file.
+
+    One parsed chunk is counted PARSED_EXPANSION times its size in the file.
+    Removing duplicates also keeps the seen keys, which grow with the file,
+    so half of the file size is added for it. Compressed files are measured
+    by their estimated decompressed size.
+    """
+    size = compressed_csv.estimated_size(path)
+    with compressed_csv.open_binary(path) as file:
+        sample = file.read(SAMPLE_SIZE)
+    row_bytes = len(sample) / max(sample.count(b'\n'), 1)
+    chunk_bytes = min(size, int(chunksize * row_bytes))
+    estimate = BASE_TASK_MEMORY + PARSED_EXPANSION * chunk_bytes
+    if dedupe:
+        estimate += size // 2
+    return estimate
+
+def output_dir_names(paths):
+    """
+    Returns a distinct output directory name for every file.
+
+    A file gets its name without the extensions ('data.csv.gz' -> 'data').
+    When the name is already taken (data.csv and data.csv.gz), the whole file
+    name with the compression suffix is used, and a counter is added to a name
+    that is still taken. Names that differ only in letter case are taken too,
+    as they are the same directory on some file systems.
+    """
+    names = {}
+    taken = set()
+    for path in paths:
+        file = os.path.basename(path)
+        name = compressed_csv.strip_extension(file)
+        if name.lower() in taken:
+            name = file
+        candidate = name
+        counter = 1
+        while candidate.lower() in taken:
+            counter += 1
+            candidate = f"{name}_{counter}"
+        taken.add(candidate.lower())
+        names[path] = candidate
+    return names
+
+def failed_result(path, error, seconds):
+    """
+    Returns the statistics of a file whose worker process failed.
+    """
+    return {'file': os.path.basename(path), 'status': f"error: {error}", 'rows': 0, 'seconds': round(seconds, 3)}
+
+def process_file(path, options, output_dir):
+    """
+    Runs the requested operations on one file (in a worker process).
+
+    The output of the operations is written to log.txt in the output directory of the file.
+
+    Returns:
+        dict: The statistics of the file ('status' is 'ok' or the error message).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    args = argparse.Namespace(file=path, output_dir=output_dir, merge=None, **options)
+    result = {'file': os.path.basename(path), 'status': 'ok', 'rows': 0}
+    start_time = time.perf_counter()
+    with open(os.path.join(output_dir, 'log.txt'), 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log):
+        try:
+            with tempfile.TemporaryDirectory(prefix="batch_") as temp_dir:
+                result['rows'], summary = csv_pipeline.run_pipeline(args, temp_dir)
+            result.update(summary)
+        except Exception as e:
+            result['status'] = f"error: {e}"
+            print(f"Error: {e}")
+    result['seconds'] = round(time.perf_counter() - start_time, 3)
+    return result
+
+def run_batch(directory, options, output_root, workers, memory_budget):
+    """
+    Processes all CSV files of a directory on a process pool.
+
+    Files are started from the largest one. A file is started only when the
+    estimated memory of all running files stays within the budget (one file
+    always runs, even if its estimate alone is larger). When a worker process
+    dies (e.g. it is killed when the memory runs out), the pool is started
+    again and the files that were running in it are tried once more, each
+    alone. A file that fails again is recorded as failed and the others go on.
+
+    Args:
+        directory (str): The directory with the CSV files.
+        options (dict): The operation options for csv_pipeline (dedupe, missing, count, sum, chunksize).
+        output_root (str): Every file gets its own output directory here.
+        workers (int): The largest number of files processed at once.
+        memory_budget (int): Memory the running files may use together (None for no limit).
+
+    Returns:
+        list: The statistics of every file, in the order of the file names.
+    """
+    paths = [os.path.join(directory, file) for file in list_csv_files(directory)]
+    pending = sorted(paths, key=compressed_csv.estimated_size, reverse=True)
+    estimates = {path: estimate_task_memory(path, options['chunksize'], bool(options['dedupe'])) for path in paths}
+    output_dirs = output_dir_names(paths)
+    results = {}
+    running = {}
+    start_times = {}
+    retried = set()  # Files running alone after their pool broke
+    broken = False
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while pending or running:
+            used = sum(estimates[path] for path in running.values())
+            while pending and len(running) < workers and not broken and not retried.intersection(running.values()):
+                path = next((path for path in pending
+                             if not running or (path not in retried and
+                                                (memory_budget is None or used + estimates[path] <= memory_budget))),
+                            None)
+                if path is None:
+                    break
+                pending.remove(path)
+                output_dir = os.path.join(output_root, output_dirs[path])
+                start_times[path] = time.perf_counter()
+                running[executor.submit(process_file, path, options, output_dir)] = path
+                used += estimates[path]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = running.pop(future)
+                try:
+                    results[path] = future.result()
+                except BrokenProcessPool as e:
+                    # A broken pool fails all files that were running in it, not only the one that died
+                    broken = True
+                    if path not in retried:
+                        retried.add(path)
+                        pending.insert(0, path)
+                        print(f"{os.path.basename(path)}: the worker process failed, "
+                              "the file will be tried again alone")
+                        continue
+                    results[path] = failed_result(path, e, time.perf_counter() - start_times[path])
+                except Exception as e:
+                    results[path] = failed_result(path, e, time.perf_counter() - start_times[path])
+                print(f"[{len(results)}/{len(paths)}] {results[path]['file']}: {results[path]['status']} "
+                      f"({results[path]['rows']} rows, {results[path]['seconds']:.2f} s)")
+
+            if broken and not running:
+                # No new file can be started in a broken pool, the next files get a new one
+                executor.shutdown(wait=True)
+                executor = ProcessPoolExecutor(max_workers=workers)
+                broken = False
+    finally:
+        executor.shutdown(wait=True)
+
+    return [results[path] for path in paths]
+
+def print_summary(results, elapsed):
+    """
+    Prints the combined statistics of all files.
+    """
+    succeeded = [result for result in results if result['status'] == 'ok']
+    total_rows = sum(result['rows'] for result in succeeded)
+    print("\nBatch statistics:")
+    print(f"Files processed: {len(succeeded)} of {len(results)}")
+    print(f"Rows processed: {total_rows}")
+    print(f"Time: {elapsed:.2f} s ({total_rows / elapsed if elapsed > 0 else 0:,.0f} rows/s)")
+
+    # Totals of the statistics of the operations (e.g. duplicates removed, missing values)
+    keys = [key for key in succeeded[0] if key not in ('file', 'status', 'rows', 'seconds')] if succeeded else []
+    for key in keys:
+        print(f"Total {key}: {sum(result.get(key, 0) for result in succeeded)}")
+
+    for result in results:
+        if result['status'] != 'ok':
+            print(f"Failed: {result['file']} ({result['status']})")
+
+def save_summary(results, filename):
+    """
+    Saves the statistics of every file to a CSV file.
+    """
+    fieldnames = []
+    for result in results:
+        fieldnames.extend(key for key in result if key not in fieldnames)
+    with open(filename, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(results)
+
+def parse_arguments(argv=None):
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Runs toolkit operations on every CSV file in a directory at once.",
+        epilog="Example: python csv_batch.py --dedupe id --missing --directory drops/")
+    csv_pipeline.add_operation_arguments(parser)
+    parser.add_argument('--directory', default='.', help="directory with the CSV files (current by default)")
+    parser.add_argument('--output-dir', default='batch_output',
+                        help="every file gets its own directory with the outputs here (batch_output by default)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="largest number of files processed at once (number of CPUs by default)")
+    parser.add_argument('--chunksize', type=int, default=csv_pipeline.CHUNK_SIZE, help="number of rows read at once")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    if not (args.dedupe or args.missing or args.count or args.sum):
+        print("Error: No operation was requested.", file=sys.stderr)
+        return 1
+    if not list_csv_files(args.directory):
+        print("There are no CSV files in the directory.")
+        return 0
+
+    memory = available_memory()
+    memory_budget = int(memory * MEMORY_FRACTION) if memory else None
+    if memory_budget:
+        print(f"Available memory: {memory / 1024 ** 3:.1f} GB, "
+              f"{MEMORY_FRACTION:.0%} is used for up to {args.workers} files at once.")
+
+    options = {'dedupe': args.dedupe, 'missing': args.missing, 'count': args.count, 'sum': args.sum,
+               'chunksize': args.chunksize}
+    start_time = time.perf_counter()
+    results = run_batch(args.directory, options, args.output_dir, max(args.workers, 1), memory_budget)
+    print_summary(results, time.perf_counter() - start_time)
+
+    summary_file = os.path.join(args.output_dir, 'batch_summary.csv')
+    save_summary(results, summary_file)
+    print(f"\nStatistics of every file have been saved to '{summary_file}'.")
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+import codecs
+import csv
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import compressed_csv
+import stage_timer
+
+# Number of bytes read from the beginning of a file to detect its dialect
+SAMPLE_SIZE = 64 * 1024
+# Delimiters that are recognized
+CANDIDATE_DELIMITERS = [',', ';', '\t', '|']
+# Encodings tried when the file is not valid UTF-8
+FALLBACK_ENCODINGS = ['cp1250', 'latin-1']
+# File with detected dialects, stored in the directory of the CSV files
+CACHE_FILENAME = '.csv_dialect_cache.json'
+# Values read as missing by pandas.read_csv with its default settings
+DEFAULT_NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+def detect_dialect(filename, use_cache=True):
+    """
+    Detects the delimiter, quote character, encoding and header of a CSV file.
+
+    Only the first SAMPLE_SIZE bytes are read. The result is cached per file
+    (keyed on its size and modification time), so later runs skip the detection.
+
+    Args:
+        filename (str): The CSV file name.
+        use_cache (bool): Whether to use and update the dialect cache.
+
+    Returns:
+        dict: Keys 'delimiter', 'quotechar', 'encoding' and 'has_header'.
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    cache_path = os.path.join(os.path.dirname(path), CACHE_FILENAME)
+
+    cache = load_cache(cache_path) if use_cache else {}
+    entry = cache.get(path)
+    if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+        return entry['dialect']
+
+    with stage_timer.stage('detect dialect'):
+        return detect_and_cache(path, stat, cache, cache_path, use_cache)
+
+def detect_and_cache(path, stat, cache, cache_path, use_cache):
+    """
+    Detects the dialect from the beginning of the file and stores it in the cache.
+    """
+    # Compressed files are sniffed on their decompressed beginning
+    with compressed_csv.open_binary(path) as file:
+        sample = file.read(SAMPLE_SIZE)
+    encoding = detect_encoding(sample)
+    # A character cut at the end of the sample is ignored
+    text = sample.decode(encoding, errors='ignore')
+    if len(sample) == SAMPLE_SIZE:
+        # Drops the last line, it is probably cut in the middle
+        text = text[:text.rfind('\n') + 1] or text
+
+    delimiter = detect_delimiter(text)
+    quotechar = detect_quotechar(text, delimiter)
+    records = list(csv.reader(io.StringIO(text), delimiter=delimiter, quotechar=quotechar))
+    dialect = {
+        'delimiter': delimiter,
+        'quotechar': quotechar,
+        'encoding': encoding,
+        'has_header': looks_like_header(records),
+    }
+
+    if use_cache:
+        cache[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'dialect': dialect}
+        save_cache(cache_path, cache)
+    return dialect
+
+def detect_encoding(sample):
+    """
+    Detects the encoding from a byte order mark or by trying to decode the sample.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith(codecs.BOM_UTF16_LE) or sample.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as error:
+        # A multi-byte character cut at the end of the sample is not an error
+        if error.start >= len(sample) - 3 and error.reason == 'unexpected end of data':
+            return 'utf-8'
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            sample.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+def detect_delimiter(text):
+    """
+    Picks the candidate delimiter that splits the sample into the most consistent number of fields.
+    """
+    best_delimiter = ','
+    best_score = (0.0, 1)
+    for delimiter in CANDIDATE_DELIMITERS:
+        field_counts = [len(record) for record in csv.reader(io.StringIO(text), delimiter=delimiter) if record]
+        if not field_counts:
+            continue
+        most_common = max(set(field_counts), key=field_counts.count)
+        if most_common < 2:
+            continue
+        score = (field_counts.count(most_common) / len(field_counts), most_common)
+        if score > best_score:
+            best_delimiter, best_score = delimiter, score
+    return best_delimiter
+
+def detect_quotechar(text, delimiter):
+    """
+    Detects the quote character, double quotes are used when the sample has no quotes.
+    """
+    try:
+        quotechar = csv.Sniffer().sniff(text, delimiters=delimiter).quotechar
+    except csv.Error:
+        return '"'
+    return quotechar if quotechar in ('"', "'") else '"'
+
+def looks_like_header(records):
+    """
+    Decides whether the first record is a header.
+
+    The first record is considered data only when it contains numbers and the
+    second record has numbers in the same positions.
+    """
+    records = [record for record in records if record]
+    if len(records) < 2:
+        return True
+    first_numeric = [is_number(field) for field in records[0]]
+    second_numeric = [is_number(field) for field in records[1]]
+    if not any(first_numeric):
+        return True
+    return first_numeric != second_numeric
+
+def is_number(text):
+    """
+    Checks whether a field contains a number (a decimal comma is accepted).
+    """
+    try:
+        float(text.replace(' ', '').replace(',', '.'))
+        return True
+    except ValueError:
+        return False
+
+def load_cache(cache_path):
+    """
+    Loads the dialect cache, an unreadable cache is treated as empty.
+    """
+    try:
+        with open(cache_path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache_path, cache):
+    """
+    Saves the dialect cache, errors (e.g. a read-only directory) are ignored.
+    """
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as file:
+            json.dump(cache, file, indent=2)
+    except OSError:
+        pass
+
+def read_options(dialect):
+    """
+    Converts a detected dialect to options for pandas.read_csv.
+    """
+    return {
+        'delimiter': dialect['delimiter'],
+        'quotechar': dialect['quotechar'],
+        'encoding': dialect['encoding'],
+        'header': 0 if dialect['has_header'] else None,
+    }
+
+def read_header(filename):
+    """
+    Reads only the column names of a CSV file (numbers when it has no header).
+
+    Args:
+        filename (str): The CSV file name.
+
+    Returns:
+        list: The column names.
+    """
+    return list(read_csv(filename, nrows=0).columns)
+
+def read_csv(filename, **kwargs):
+    """
+    Reads a plain or compressed CSV file with pandas.read_csv using its detected dialect.
+
+    Args:
+        filename (str): The CSV file name.
+        **kwargs: Additional options for pandas.read_csv.
+
+    Returns:
+        pandas.DataFrame: The loaded data (or a reader when chunksize is given).
+    """
+    options = read_options(detect_dialect(filename))
+    options.update(kwargs)
+    return compressed_csv.read_csv(filename, **options)
+
+def typed_keys(partial):
+    """
+    Converts the text group keys of merged partial results to the type pandas infers for a whole column.
+
+    The chunked and parallel aggregations read their group columns as text
+    (dtype=str), so a value has the same key in every chunk and byte range,
+    and they keep the groups of missing keys (dropna=False). Once all parts
+    are merged, every key level is converted the way pandas.read_csv converts
+    a whole column: to integers when all values are integers (to floats when
+    the column also has missing values), to floats when all values are
+    numbers, otherwise the keys stay text. Groups with a missing key are
+    dropped, like in groupby.
+
+    Args:
+        partial (pandas.Series or pandas.DataFrame): Partial results indexed by the text keys.
+
+    Returns:
+        pandas.Series or pandas.DataFrame: The partial results with the typed keys. Keys that
+        became equal (e.g. '007' and '7') are not combined yet, the caller combines them.
+    """
+    index = partial.index
+    levels = [index.get_level_values(level) for level in range(index.nlevels)]
+    present = np.logical_and.reduce([level.notna() for level in levels]) if len(index) else np.ones(0, dtype=bool)
+    converted = [convert_key_level(level[present], missing=bool(level.isna().any())) for level in levels]
+    partial = partial.iloc[np.flatnonzero(present)]
+    if index.nlevels == 1:
+        partial.index = converted[0].rename(index.name)
+    else:
+        partial.index = pd.MultiIndex.from_arrays(converted, names=index.names)
+    return partial
+
+def convert_key_level(values, missing):
+    """
+    Converts one level of text keys to numbers when all of them are numbers.
+    """
+    if not len(values):
+        return values
+    try:
+        numbers = pd.to_numeric(values)
+    except (ValueError, TypeError):
+        return values
+    if missing and pd.api.types.is_integer_dtype(numbers.dtype):
+        numbers = numbers.astype('float64')
+    return numbers
+
+class ColumnTypes:
+    """
+    Infers the types pandas.read_csv gives whole columns from chunks read as text.
+
+    A file processed in parts (chunks or partitions) is read as text
+    (dtype=str), so no part guesses its own types. Every chunk passed to
+    update() narrows the kind of each column: integers, floats or text, with
+    the same rule as typed_keys. apply() then converts text data to the types
+    of the whole columns, so the values are written like after loading the
+    whole file at once.
+    """
+
+    def __init__(self):
+        self.kinds = {}
+        self.missing = {}
+
+    def update(self, chunk):
+        """
+        Narrows the kinds of the columns by the values of one chunk read as text.
+        """
+        for column in chunk.columns:
+            values = chunk[column]
+            self.missing[column] = self.missing.get(column, False) or bool(values.isna().any())
+            kind = self.kinds.get(column, 'int')
+            present = values.dropna()
+            if kind != 'text' and len(present):
+                try:
+                    numbers = pd.to_numeric(present)
+                except (ValueError, TypeError):
+                    kind = 'text'
+                else:
+                    if not pd.api.types.is_integer_dtype(numbers.dtype):
+                        kind = 'float'
+            self.kinds[column] = kind
+
+    def kind(self, column):
+        """
+        Returns the type of a whole column: 'int', 'float' or 'text' (None for an unknown column).
+
+        Integers with missing values are read as floats.
+        """
+        kind = self.kinds.get(column)
+        if kind == 'int' and self.missing[column]:
+            return 'float'
+        return kind
+
+    def state(self):
+        """
+        Returns the inferred kinds as a list that can be stored as JSON.
+
+        Every column is an entry [name, kind, missing], so numeric names of
+        files without a header are kept (JSON object keys are always text).
+        """
+        return [[column, kind, self.missing[column]] for column, kind in self.kinds.items()]
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Restores the kinds returned by state().
+        """
+        types = cls()
+        for column, kind, missing in state:
+            types.kinds[column] = kind
+            types.missing[column] = missing
+        return types
+
+    def apply(self, df, skip=()):
+        """
+        Converts the text columns of a DataFrame to the inferred types (in place).
+
+        Args:
+            df (pandas.DataFrame): Data read as text.
+            skip (iterable): Columns kept as text (e.g. join keys).
+
+        Returns:
+            pandas.DataFrame: The same DataFrame.
+        """
+        for column in df.columns:
+            kind = self.kind(column)
+            if column in skip or kind in (None, 'text'):
+                continue
+            numbers = pd.to_numeric(df[column])
+            df[column] = numbers.astype('float64') if kind == 'float' else numbers
+        return df
@@ -0,0 +1,428 @@
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import aggregate_csv_sum
+import chunk_pipeline
+import compressed_csv
+import csv_dialect
+import find_missing_values
+import merge_two_csvs_by_column
+import remove_duplicates
+import stage_timer
+
+# Number of rows read at once and passed through every stage
+CHUNK_SIZE = 100_000
+
+class DedupeStage:
+    """
+    Removes duplicate rows by one column (like remove_duplicates.py in streaming mode).
+
+    The rows are written back exactly as they are in the file. When there are
+    too many distinct keys, the stage stops and the partitioned variant of
+    remove_duplicates.py runs over the file after the shared pass.
+    """
+    name = 'remove duplicates'
+    needs_raw = True
+
+    def __init__(self, file_path, column, output_file, read_options, chunksize):
+        self.file_path = file_path
+        self.output_file = output_file
+        self.read_options = read_options
+        self.chunksize = chunksize
+        self.deduplicator = remove_duplicates.StreamingDeduplicator(column, remove_duplicates.MAX_KEYS_IN_MEMORY)
+        self.finished = False
+        self.writer = chunk_pipeline.ChunkWriter(output_file)
+
+    def process(self, chunk):
+        kept_rows = self.deduplicator.process(chunk)
+        if kept_rows is not None:
+            self.writer.write(kept_rows)
+
+    def finish(self):
+        self.writer.close()
+        deduplicator = self.deduplicator
+        if deduplicator.overflow:
+            initial_row_count, final_row_count = deduplicator.restart_partitioned(
+                self.file_path, self.output_file, self.read_options, self.chunksize)
+        else:
+            initial_row_count, final_row_count = deduplicator.initial_row_count, deduplicator.final_row_count
+            remove_duplicates.show_stats(initial_row_count, final_row_count)
+        self.summary = {'duplicates removed': initial_row_count - final_row_count}
+        print(f"The cleaned file has been saved as '{self.output_file}'")
+        self.finished = True
+
+    def abort(self):
+        """
+        Stops the writer and removes the unfinished output file (when the pipeline fails).
+        """
+        self.writer.close(abort=True)
+        remove_unfinished(self.output_file, self.finished)
+
+class MissingValuesStage:
+    """
+    Counts missing and empty values per column (like find_missing_values.py).
+    """
+    name = 'scan missing values'
+    needs_raw = False
+
+    def __init__(self, report_filename, temp_dir):
+        self.report_filename = report_filename
+        self.spill_path = os.path.join(temp_dir, "issues.bin")
+        self.counts = {}
+        self.finished = False
+        self.spill_file = open(self.spill_path, 'wb')
+
+    def process(self, chunk):
+        find_missing_values.scan_chunk(chunk, self.counts, self.spill_file)
+
+    def finish(self):
+        self.spill_file.close()
+        report = find_missing_values.summarize_counts(self.counts)
+        if report:
+            find_missing_values.join_issue_files(report, list(self.counts), self.spill_path, self.report_filename)
+        self.summary = {
+            'missing values': sum(counts['missing'] for counts in report.values()),
+            'empty values': sum(counts['empty_after_strip'] for counts in report.values()),
+        }
+
+        self.finished = True
+        if not report:
+            print("Everything is okay. No missing or empty values were found.")
+            return
+        print("Issues were found in the data:")
+        for column, counts in report.items():
+            print(f"Column '{column}':")
+            print(f"  Missing values: {counts['missing']}")
+            print(f"  Empty values after stripping: {counts['empty_after_strip']}")
+            print(f"  Total issues: {counts['total']}\n")
+        print(f"Detailed report saved to '{self.report_filename}'.")
+
+    def abort(self):
+        """
+        Closes the spill file and removes the unfinished report (when the pipeline fails).
+        """
+        self.spill_file.close()
+        remove_unfinished(self.report_filename, self.finished)
+
+class CountStage:
+    """
+    Counts rows per group (like aggregate_csv_by_column.py).
+
+    The keys stay text in every chunk and get their type once in finish()
+    (see csv_dialect.typed_keys), so a key is never split by the types
+    guessed for different chunks.
+    """
+    name = 'group count'
+    needs_raw = False
+
+    def __init__(self, column, output_file):
+        self.column = column
+        self.output_file = output_file
+        self.counts = pd.Series(dtype='int64')
+
+    def process(self, chunk):
+        self.counts = self.counts.add(chunk[self.column].value_counts(sort=False, dropna=False), fill_value=0)
+
+    def finish(self):
+        counts = csv_dialect.typed_keys(self.counts).groupby(level=0).sum().astype('int64').sort_index()
+        counts.index.name = self.column
+        compressed_csv.to_csv(counts.reset_index(name='Row Count'), self.output_file, index=False)
+        self.summary = {'groups': len(counts)}
+        print(f"Aggregated data has been saved to '{self.output_file}'.")
+
+class SumStage:
+    """
+    Cleans numeric values and sums them per group (like aggregate_csv_sum.py).
+
+    Only the summed values are converted per chunk, the keys stay text until
+    finish() types them once, like in CountStage.
+    """
+    name = 'group sum'
+    needs_raw = False
+
+    def __init__(self, group_column, numeric_column, output_file):
+        self.group_column = group_column
+        self.numeric_column = numeric_column
+        self.output_file = output_file
+        self.sums = []
+        self.total_valid = 0
+        self.invalid_entries = []
+
+    def process(self, chunk):
+        values = to_numeric_if_possible(chunk[self.numeric_column])
+        cleaned_values, invalid_mask = aggregate_csv_sum.clean_numeric_column(values)
+        self.sums.append(cleaned_values.groupby(chunk[self.group_column], dropna=False).sum())
+        self.total_valid += int((~invalid_mask).sum())
+        self.invalid_entries.extend((idx + 1, value) for idx, value in values[invalid_mask].items())
+
+    def finish(self):
+        if self.sums:
+            sums = csv_dialect.typed_keys(pd.concat(self.sums)).groupby(level=0).sum().sort_index()
+        else:
+            sums = pd.Series(dtype='float64')
+        sums.index.name = self.group_column
+        compressed_csv.to_csv(sums.reset_index(name='Suma'), self.output_file, index=False)
+        print(f"The aggregated data was saved to '{self.output_file}'.")
+        self.summary = {'sum groups': len(sums), 'valid numbers': self.total_valid,
+                        'invalid values': len(self.invalid_entries)}
+
+        print("\nStatistics of valid and non-valid values:")
+        print(f"Valid numbers: {self.total_valid}")
+        print(f"Numbers of invalid values: {len(self.invalid_entries)}")
+        if self.invalid_entries:
+            print("\nInvalid values:")
+            for row, val in self.invalid_entries:
+                print(f"Row {row}: {val}")
+
+class MergeStage:
+    """
+    Left-joins the file with a second CSV file (like merge_two_csvs_by_column.py in streaming mode).
+
+    The chunks of the shared pass are spilled as text to a temporary file
+    while the types of the whole columns are inferred (see
+    csv_dialect.ColumnTypes). finish() converts the spilled chunks to these
+    types and joins them with the deduplicated second file indexed in memory,
+    so the result is the same as from merge_files. When the second file is
+    larger than MAX_RIGHT_SIDE_BYTES, the partitioned join runs over both
+    files after the shared pass. With use_store, the persistent lookup store
+    of the second file is probed instead.
+    """
+    name = 'merge'
+    needs_raw = False
+
+    def __init__(self, file_path, file2, column, output_file, chunksize, temp_dir, use_store=False):
+        self.file_path = file_path
+        self.file2 = file2
+        self.column = column
+        self.output_file = output_file
+        self.chunksize = chunksize
+        self.stats = merge_two_csvs_by_column.new_merge_stats()
+        self.row_count = 0
+        self.use_store = use_store
+        self.partitioned = (not use_store and
+                            compressed_csv.estimated_size(file2) > merge_two_csvs_by_column.MAX_RIGHT_SIDE_BYTES)
+        if column not in csv_dialect.read_header(file2):
+            raise ValueError(f"Column '{column}' does not exist in '{file2}'.")
+        self.columns = None
+        self.left_types = csv_dialect.ColumnTypes()
+        self.spill_path = os.path.join(temp_dir, "merge_left.csv")
+        self.finished = False
+        self.spill = None if self.partitioned else chunk_pipeline.ChunkWriter(self.spill_path)
+
+    def process(self, chunk):
+        if self.partitioned:
+            return
+        self.columns = list(chunk.columns)
+        self.left_types.update(chunk)
+        self.spill.write(chunk)
+
+    def finish(self):
+        if self.partitioned:
+            self.row_count = merge_two_csvs_by_column.merge_files_partitioned(
+                self.file_path, self.file2, self.column, self.output_file, self.chunksize, stats=self.stats)
+        else:
+            self.spill.close()
+            if self.use_store:
+                store = merge_two_csvs_by_column.open_lookup_store(self.file2, self.column, self.stats)
+                try:
+                    merge_two_csvs_by_column.check_key_types(self.left_types, store.types, self.column)
+                    self.join_spilled_chunks(store=store)
+                finally:
+                    store.close()
+            else:
+                df2, right_types = merge_two_csvs_by_column.load_typed(self.file2)
+                merge_two_csvs_by_column.check_key_types(self.left_types, right_types, self.column)
+                self.join_spilled_chunks(right=merge_two_csvs_by_column.build_join_index(df2, self.column,
+                                                                                         self.stats))
+        print(f"Files have been successfully merged. The result is saved in '{self.output_file}'.")
+        merge_two_csvs_by_column.print_merge_stats(self.row_count, self.stats)
+        self.summary = {'merged rows': self.row_count}
+        self.finished = True
+
+    def abort(self):
+        """
+        Stops the spill writer and removes the unfinished output file (when the pipeline fails).
+        """
+        if self.spill is not None:
+            self.spill.close(abort=True)
+        remove_unfinished(self.output_file, self.finished)
+
+    def join_spilled_chunks(self, right=None, store=None):
+        """
+        Reads the spilled chunks back, converts them to the inferred types and joins them.
+        """
+        with chunk_pipeline.ChunkWriter(self.output_file) as writer:
+            if self.columns is not None:
+                reader = pd.read_csv(self.spill_path, dtype=str, chunksize=self.chunksize)
+                for left in chunk_pipeline.read_ahead(reader):
+                    # The spill file has a text header, the original names may be numbers
+                    left.columns = self.columns
+                    self.left_types.apply(left)
+                    if store is not None:
+                        merged_chunk = merge_two_csvs_by_column.join_store_chunk(left, store, self.column,
+                                                                                 self.stats)
+                    else:
+                        merged_chunk = merge_two_csvs_by_column.join_chunk(left, right, self.column, self.stats)
+                    writer.write(merged_chunk)
+        self.row_count = writer.rows
+
+def remove_unfinished(filename, finished):
+    """
+    Removes an output file of a stage that did not finish.
+    """
+    if not finished and os.path.exists(filename):
+        os.remove(filename)
+
+def to_numeric_if_possible(values):
+    """
+    Converts a text column of one chunk to numbers when every value is a number,
+    like the type inference of pandas.read_csv in the individual scripts.
+    """
+    try:
+        return pd.to_numeric(values)
+    except (ValueError, TypeError):
+        return values
+
+def resolve_column(name, columns):
+    """
+    Finds a column by its name (or by its number when the file has no header).
+    """
+    if name in columns:
+        return name
+    if name.isdigit() and int(name) in columns:
+        return int(name)
+    raise ValueError(f"Column '{name}' does not exist, available columns: {', '.join(map(str, columns))}")
+
+def build_stages(args, columns, read_options, temp_dir, stack):
+    """
+    Creates the requested stages in the order remove duplicates, missing values, count, sum and merge.
+
+    Stages that start writer threads or open files are registered in the
+    ExitStack as soon as they are created, so when a later stage (or the
+    pipeline) fails, they are aborted and their unfinished outputs removed.
+    The output files are compressed when CSV_TOOLKIT_COMPRESS asks for it.
+    """
+    def output_path(filename):
+        return os.path.join(args.output_dir, compressed_csv.output_filename(filename))
+
+    stages = []
+
+    def add(stage):
+        stages.append(stage)
+        if hasattr(stage, 'abort'):
+            stack.push(lambda exc_type, exc_value, traceback: stage.abort() if exc_type is not None else None)
+
+    if args.dedupe:
+        output_file = output_path(f"cleaned_{os.path.basename(args.file)}")
+        add(DedupeStage(args.file, resolve_column(args.dedupe, columns), output_file, read_options,
+                        args.chunksize))
+    if args.missing:
+        add(MissingValuesStage(os.path.join(args.output_dir, "detailed_report.txt"), temp_dir))
+    if args.count:
+        add(CountStage(resolve_column(args.count, columns), output_path("export.csv")))
+    if args.sum:
+        add(SumStage(resolve_column(args.sum[0], columns), resolve_column(args.sum[1], columns),
+                     output_path("export_suma.csv")))
+    if args.merge:
+        file2, column = args.merge
+        add(MergeStage(args.file, file2, resolve_column(column, columns),
+                       output_path("merged_output.csv"), args.chunksize, temp_dir, args.lookup_store))
+    return stages
+
+def run_pipeline(args, temp_dir):
+    """
+    Reads the file once in chunks and passes every chunk through all requested stages.
+
+    Values are read as text. Stages that write rows back (remove duplicates)
+    get them unchanged, the other stages get missing values (pandas defaults
+    such as '', 'NA' or 'null') as NaN, like the individual scripts.
+
+    Returns:
+        tuple: Number of processed rows and a dictionary with the statistics of all stages.
+    """
+    read_options = csv_dialect.read_options(csv_dialect.detect_dialect(args.file))
+    columns = list(compressed_csv.read_csv(args.file, nrows=0, **read_options).columns)
+    # Stages with writer threads and open files are aborted when anything below fails
+    with contextlib.ExitStack() as stack:
+        stages = build_stages(args, columns, read_options, temp_dir, stack)
+        if not stages:
+            raise ValueError("No operation was requested.")
+
+        needs_missing = any(not stage.needs_raw for stage in stages)
+        na_values = list(csv_dialect.DEFAULT_NA_VALUES)
+        row_count = 0
+        start_time = time.perf_counter()
+        try:
+            reader = compressed_csv.read_csv(args.file, dtype=str, keep_default_na=False,
+                                             chunksize=args.chunksize, **read_options)
+            # The next chunks are parsed in a background thread while the stages process the previous one
+            for chunk in chunk_pipeline.read_ahead(reader):
+                row_count += len(chunk)
+                with_missing = chunk.mask(chunk.isin(na_values)) if needs_missing else None
+                for stage in stages:
+                    with stage_timer.stage(stage.name, len(chunk)):
+                        stage.process(chunk if stage.needs_raw else with_missing)
+        except (pd.errors.ParserError, UnicodeDecodeError) as e:
+            raise ValueError(f"Failed to load the file: {e}")
+
+        elapsed = time.perf_counter() - start_time
+        rows_per_second = row_count / elapsed if elapsed > 0 else 0
+        print(f"Processed {row_count} rows in {elapsed:.2f} s ({rows_per_second:,.0f} rows/s).")
+
+        summary = {}
+        for stage in stages:
+            print(f"\n[{stage.name}]")
+            with stage_timer.stage(f"{stage.name} (finish)"):
+                stage.finish()
+            summary.update(stage.summary)
+    return row_count, summary
+
+def add_operation_arguments(parser):
+    """
+    Adds the options of the operations that work on a single file.
+    """
+    parser.add_argument('--dedupe', metavar='COLUMN', help="remove duplicate rows by COLUMN (cleaned_<file>)")
+    parser.add_argument('--missing', action='store_true', help="scan for missing values (detailed_report.txt)")
+    parser.add_argument('--count', metavar='COLUMN', help="count rows per group of COLUMN (export.csv)")
+    parser.add_argument('--sum', nargs=2, metavar=('GROUP', 'NUMERIC'),
+                        help="sum NUMERIC per group of GROUP (export_suma.csv)")
+
+def parse_arguments(argv=None):
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Runs several toolkit operations on one CSV file in a single pass.",
+        epilog="Example: python csv_pipeline.py data.csv --dedupe id --missing --sum category amount")
+    parser.add_argument('file', help="the CSV file to process (also .csv.gz, .csv.bz2 or .csv.xz)")
+    add_operation_arguments(parser)
+    parser.add_argument('--merge', nargs=2, metavar=('FILE2', 'COLUMN'),
+                        help="left-join FILE2 on COLUMN (merged_output.csv)")
+    parser.add_argument('--lookup-store', action='store_true',
+                        help="merge through a persistent lookup store of FILE2, reused while FILE2 is unchanged")
+    parser.add_argument('--output-dir', default='.', help="directory of the output files (current by default)")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="number of rows read at once")
+    parser.add_argument('--profile', action='store_true', help="print the time and memory of every stage")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    if args.profile:
+        stage_timer.enable()
+    os.makedirs(args.output_dir, exist_ok=True)
+    try:
+        with tempfile.TemporaryDirectory(prefix="pipeline_") as temp_dir:
+            run_pipeline(args, temp_dir)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,23 @@
 # Test version 1.0
 import os
+import tempfile
+import numpy as np
 import pandas as pd
+import byte_scanner
+import column_cache
+import compressed_csv
+import csv_dialect
+import stage_timer
+
+CHUNK_SIZE = 100_000  # Number of rows scanned at once.
+# One issue in the spill file of the chunked and byte scans: column position, row number and label (index into ISSUE_LABELS).
+ISSUE_RECORD = byte_scanner.ISSUE_RECORD
+ISSUE_LABELS = np.array(['Missing value', 'Empty value after stripping'])
 
 # Step 1: Display all CSV files in the current directory and create a list
 def list_csv_files(directory="."):
-    # Lists all CSV files in the specified directory.
-    csv_files = [file for file in os.listdir(directory) if file.lower().endswith(".csv")]
+    # Lists all CSV files (also compressed .csv.gz, .csv.bz2 and .csv.xz) in the specified directory.
+    csv_files = [file for file in os.listdir(directory) if compressed_csv.is_csv_file(file)]
     for idx, file in enumerate(csv_files):
         print(f"{idx + 1}: {file}")  # Prints each CSV file with a number.
     return csv_files  # Returns the list of CSV files.
@@ -26,25 +38,24 @@ def select_csv_file(csv_files):
 
 # Step 3: Load the file with support for multiple delimiters
 def load_csv_with_varied_delimiters(file_path):
-    # Loads a CSV file with support for multiple delimiters (comma and semicolon).
-    delimiters = [',', ';']  # List of possible delimiters.
-    for delimiter in delimiters:
-        try:
-            df = pd.read_csv(file_path, delimiter=delimiter, dtype=str)  # Reads CSV with current delimiter.
-            print(f"File loaded with delimiter '{delimiter}'")  # Notifies which delimiter was used.
-            return df  # Returns the loaded DataFrame.
-        except pd.errors.ParserError:
-            continue  # Tries the next delimiter if parsing fails.
-    raise ValueError("Failed to load the file with supported delimiters.")  # Raises error if all delimiters fail.
+    # Loads a CSV file with the delimiter detected from the beginning of the file (comma, semicolon, tab or pipe).
+    dialect = csv_dialect.detect_dialect(file_path)  # Reads only the first few KB (cached per file).
+    try:
+        df = column_cache.read_csv(file_path, dtype=str)  # Reads CSV with the detected dialect (cached when turned on).
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise ValueError(f"Failed to load the file: {e}")  # Raises error if the file cannot be parsed.
+    print(f"File loaded with delimiter '{dialect['delimiter']}'")  # Notifies which delimiter was used.
+    return df  # Returns the loaded DataFrame.
 
 # Step 4: Scan the dataset for missing or null values
 def scan_missing_values(df):
     report = {}  # Initializes a dictionary to store summary of issues.
     detailed_issues = {}  # Initializes a dictionary to store detailed issues.
     for column in df.columns:
-        missing_count = df[column].isna().sum()  # Counts missing (NaN) values in the column.
-        empty_after_strip = df[column].astype(str).str.strip().eq('').sum()  # Counts empty values after stripping whitespace.
-        
+        missing, empty = find_issue_masks(df[column])  # Vectorized masks of missing and empty values.
+        missing_count = int(missing.sum())  # Counts missing (NaN) values in the column.
+        empty_after_strip = int(empty.sum())  # Counts empty values after stripping whitespace.
+
         total_issues = missing_count + empty_after_strip  # Calculates total issues in the column.
         if total_issues > 0:
             report[column] = {
@@ -52,17 +63,116 @@ def scan_missing_values(df):
                 'empty_after_strip': empty_after_strip,  # Stores count of empty values after stripping.
                 'total': total_issues  # Stores total count of issues.
             }
-            
-            # Identifies rows with issues.
-            issues = []
-            for idx, value in df[column].items():  # Changed iteritems() to items()
-                if pd.isna(value):
-                    issues.append((idx + 2, 'Missing value'))  # Appends row number and issue type for missing values.
-                elif isinstance(value, str) and value.strip() == '':
-                    issues.append((idx + 2, 'Empty value after stripping'))  # Appends row number and issue type for empty values.
-            detailed_issues[column] = issues  # Stores detailed issues for the column.
+            detailed_issues[column] = list_issues(df.index, missing, empty)  # Stores detailed issues for the column.
     return report, detailed_issues  # Returns the summary and detailed issues.
 
+def find_issue_masks(values):
+    # Returns boolean masks of missing values and of values that are empty after stripping whitespace.
+    missing = values.isna().to_numpy()
+    empty = values.astype(str).str.strip().eq('').fillna(False).to_numpy(dtype=bool) & ~missing
+    return missing, empty
+
+def list_issues(index, missing, empty):
+    # Lists (row number, issue) pairs in row order, the header is row 1.
+    positions = np.flatnonzero(missing | empty)  # Positions of all rows with an issue.
+    row_numbers = (np.asarray(index)[positions] + 2).tolist()
+    labels = np.where(missing[positions], 'Missing value', 'Empty value after stripping').tolist()
+    return list(zip(row_numbers, labels))
+
+# Step 4b: Scan a large file chunk by chunk and stream the detailed report
+def scan_missing_values_in_chunks(file_path, report_filename="detailed_report.txt", chunksize=CHUNK_SIZE):
+    # Scans the file in chunks, so memory stays flat. Issues of all columns are appended to one temporary
+    # spill file as each chunk is processed and grouped by column into the detailed report at the end.
+    dialect = csv_dialect.detect_dialect(file_path)  # Reads only the first few KB (cached per file).
+    counts = {}  # Missing and empty counts per column, in the column order.
+    with tempfile.TemporaryDirectory(prefix="missing_") as temp_dir:
+        spill_path = os.path.join(temp_dir, "issues.bin")
+        with open(spill_path, 'wb') as spill_file:
+            try:
+                reader = compressed_csv.read_csv(file_path, dtype=str, chunksize=chunksize,
+                                                 **csv_dialect.read_options(dialect))
+                for chunk in reader:
+                    with stage_timer.stage('scan', len(chunk)):
+                        scan_chunk(chunk, counts, spill_file)
+            except (pd.errors.ParserError, UnicodeDecodeError) as e:
+                raise ValueError(f"Failed to load the file: {e}")
+        print(f"File loaded with delimiter '{dialect['delimiter']}'")  # Notifies which delimiter was used.
+
+        report = summarize_counts(counts)
+        if report:
+            with stage_timer.stage('write'):
+                join_issue_files(report, list(counts), spill_path, report_filename)
+    return report  # Returns the summary of issues.
+
+def scan_chunk(chunk, counts, spill_file):
+    # Counts the missing and empty values of one chunk and appends its issues to the spill file.
+    if not counts:
+        counts.update({column: [0, 0] for column in chunk.columns})
+    records = []
+    for position, column in enumerate(counts):
+        missing, empty = find_issue_masks(chunk[column])
+        counts[column][0] += int(missing.sum())
+        counts[column][1] += int(empty.sum())
+        rows = np.flatnonzero(missing | empty)  # Positions of all rows with an issue, in row order.
+        if len(rows):
+            column_records = np.empty(len(rows), dtype=ISSUE_RECORD)
+            column_records['column'] = position
+            column_records['row'] = np.asarray(chunk.index)[rows] + 2  # The header is row 1.
+            column_records['label'] = empty[rows]  # 0 for missing, 1 for empty after stripping.
+            records.append(column_records)
+    if records:
+        spill_file.write(np.concatenate(records).tobytes())
+
+def summarize_counts(counts):
+    # Builds the summary report from the counts of all chunks (only columns with issues).
+    report = {}
+    for column, (missing_count, empty_after_strip) in counts.items():
+        if missing_count + empty_after_strip > 0:
+            report[column] = {
+                'missing': missing_count,
+                'empty_after_strip': empty_after_strip,
+                'total': missing_count + empty_after_strip
+            }
+    return report
+
+def join_issue_files(report, columns, spill_path, report_filename, chunksize=CHUNK_SIZE):
+    # Groups the issues of the spill file by column into the detailed report (in the same format as
+    # generate_report). The records are mapped from disk, only their column positions and order are in memory.
+    records = np.memmap(spill_path, dtype=ISSUE_RECORD, mode='r')
+    order = np.argsort(records['column'], kind='stable')  # Stable, so the rows of every column stay in order.
+    sorted_columns = records['column'][order]
+    with open(report_filename, 'w', encoding='utf-8') as file:
+        for column in report:
+            file.write(f"Column: {column}\n")
+            position = columns.index(column)
+            start, end = np.searchsorted(sorted_columns, [position, position + 1])
+            for block_start in range(start, end, chunksize):
+                block = records[order[block_start:min(block_start + chunksize, end)]]
+                labels = ISSUE_LABELS[block['label']]
+                file.write(''.join(f"  Row {row_num}: {issue}\n" for row_num, issue in zip(block['row'].tolist(), labels)))
+            file.write("\n")
+    del records  # Unmaps the spill file, so the temporary directory can be removed.
+
+# Step 4c: Scan the raw bytes of a plain file without loading it into a DataFrame
+def scan_missing_values_in_bytes(file_path, report_filename="detailed_report.txt", block_size=byte_scanner.BLOCK_SIZE):
+    # Scans the memory-mapped file with the byte scanner, only values that can be empty or missing are decoded.
+    # The issues are spilled to a temporary file and grouped into the detailed report like in the chunked scan.
+    # Returns None when the file has to be read by pandas (compressed, UTF-16, unusual quoting, long rows).
+    with tempfile.TemporaryDirectory(prefix="missing_") as temp_dir:
+        spill_path = os.path.join(temp_dir, "issues.bin")
+        with open(spill_path, 'wb') as spill_file:
+            counts = byte_scanner.scan_missing_values(file_path, spill_file, block_size)
+        if counts is None:
+            return None
+        dialect = csv_dialect.detect_dialect(file_path)  # Already cached by the scanner.
+        print(f"File scanned with delimiter '{dialect['delimiter']}'")  # Notifies which delimiter was used.
+
+        report = summarize_counts(counts)
+        if report:
+            with stage_timer.stage('write'):
+                join_issue_files(report, list(counts), spill_path, report_filename)
+    return report  # Returns the summary of issues (or None).
+
 # Step 5: Generate and save the detailed report
 def generate_report(report, detailed_issues, report_filename="detailed_report.txt"):
     with open(report_filename, 'w', encoding='utf-8') as file:
@@ -87,16 +197,26 @@ def main():
     selected_file = select_csv_file(csv_files)  # Prompts user to select a file.
     print(f"\nOpened file: {selected_file}")  # Notifies which file was opened.
 
-    # 3. Load the file with support for multiple delimiters.
+    # 3.-4. Load the file and scan it for missing or null values.
+    report_filename = "detailed_report.txt"
+    detailed_issues = None
     try:
-        df = load_csv_with_varied_delimiters(selected_file)  # Attempts to load the selected CSV file.
+        if column_cache.is_enabled():
+            with stage_timer.stage('load') as load_stage:
+                df = load_csv_with_varied_delimiters(selected_file)  # Loads the file through the columnar cache.
+                load_stage.rows = len(df)
+            with stage_timer.stage('scan', len(df)):
+                report, detailed_issues = scan_missing_values(df)  # Scans for missing and empty values.
+        else:
+            with stage_timer.stage('scan bytes and write'):
+                report = scan_missing_values_in_bytes(selected_file, report_filename)  # Fast path for plain files, no DataFrame is built.
+            if report is None:
+                with stage_timer.stage('load, scan and write'):
+                    report = scan_missing_values_in_chunks(selected_file, report_filename)  # Scans in chunks, streams the report.
     except ValueError as e:
         print(e)  # Prints error message if loading fails.
         return  # Exits the script.
 
-    # 4. Scan the dataset for missing or null values.
-    report, detailed_issues = scan_missing_values(df)  # Scans for missing and empty values.
-
     if not report:
         print("Everything is okay. No missing or empty values were found.")  # Notifies if no issues are found.
     else:
@@ -107,8 +227,12 @@ def main():
             print(f"  Empty values after stripping: {counts['empty_after_strip']}")  # Prints count of empty values after stripping.
             print(f"  Total issues: {counts['total']}\n")  # Prints total count of issues.
 
-        # 5. Generate and save the detailed report.
-        generate_report(report, detailed_issues)  # Creates and saves the detailed report.
+        # 5. Generate and save the detailed report (already written when scanning in chunks or bytes).
+        if detailed_issues is not None:
+            with stage_timer.stage('write'):
+                generate_report(report, detailed_issues, report_filename)  # Creates and saves the detailed report.
+        else:
+            print(f"Detailed report saved to '{report_filename}'.")  # Notifies user of report creation.
 
 if __name__ == "__main__":
     main()  # Executes the main function when the script is run.
\ No newline at end of file
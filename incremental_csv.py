@@ -0,0 +1,214 @@
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+
+import compressed_csv
+import csv_dialect
+import parallel_csv
+
+# Directory with checkpoints, created next to the source CSV file
+CHECKPOINT_DIRNAME = '.csv_checkpoints'
+# Number of bytes at the beginning of the file and before the checkpoint offset that are hashed
+FINGERPRINT_SIZE = 64 * 1024
+# Version of the checkpoint format, older checkpoints are ignored
+# (version 2 stores the group keys as text, see save_keys)
+CHECKPOINT_VERSION = 2
+# Number of new rows parsed at once
+CHUNK_SIZE = 1_000_000
+
+class Checkpoint:
+    """
+    Remembers how far an append-only CSV file was aggregated.
+
+    The checkpoint stores the byte offset after the last processed record, a
+    fingerprint of the file (hashes of its beginning and of the bytes before
+    the offset), the read options and the partial state of the aggregation.
+    When the file was truncated or rewritten, the checkpoint is not used and
+    the file is processed from the beginning.
+
+    Usage:
+        checkpoint = Checkpoint(filename, 'count', [column])
+        state = checkpoint.load()              # None means a full recompute
+        for chunk in checkpoint.new_chunks([column], dtype={column: str}):
+            ...                                # update the state
+        checkpoint.save(new_state)
+        tail = checkpoint.read_tail([column], dtype={column: str})  # unterminated last line, not saved
+    """
+
+    def __init__(self, filename, operation, columns):
+        self.filename = filename
+        if compressed_csv.is_compressed(filename):
+            raise ValueError("Compressed files cannot be aggregated incrementally.")
+        self.read_options = csv_dialect.read_options(csv_dialect.detect_dialect(filename))
+        if str(self.read_options['encoding']).lower().startswith('utf-16'):
+            raise ValueError("Files encoded in UTF-16 cannot be aggregated incrementally.")
+        self.has_header = self.read_options.pop('header') is not None
+
+        path = os.path.abspath(filename)
+        identity = json.dumps([path, operation, list(map(str, columns))])
+        name = hashlib.sha1(identity.encode('utf-8')).hexdigest() + '.json'
+        self.path = os.path.join(os.path.dirname(path), CHECKPOINT_DIRNAME, name)
+
+        self.header_end = self.find_header_end()
+        if self.has_header:
+            with open(filename, 'rb') as file:
+                self.columns = parallel_csv.read_header(file.read(self.header_end), **self.read_options)
+        else:
+            self.columns = list(pd.read_csv(filename, header=None, nrows=1, **self.read_options).columns)
+        self.offset = self.header_end
+        self.rows = 0
+        self.new_rows = 0
+        self.end = None
+
+    def load(self):
+        """
+        Loads the checkpoint when it still matches the file.
+
+        Returns:
+            dict: The saved state, or None when the file has to be processed from the beginning.
+        """
+        self.offset = self.header_end
+        self.rows = 0
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                checkpoint = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        reason = self.check(checkpoint)
+        if reason:
+            print(f"The checkpoint cannot be used ({reason}), the whole file is processed again.")
+            return None
+        self.offset = checkpoint['offset']
+        self.rows = checkpoint['rows']
+        print(f"Continuing from the checkpoint after row {self.rows}.")
+        return checkpoint['state']
+
+    def check(self, checkpoint):
+        """
+        Returns the reason why a checkpoint does not match the file (None when it matches).
+        """
+        if checkpoint.get('version') != CHECKPOINT_VERSION:
+            return "old format"
+        if checkpoint.get('read_options') != self.read_options or checkpoint.get('columns') != self.columns:
+            return "the dialect or the header changed"
+        offset = checkpoint['offset']
+        if os.path.getsize(self.filename) < offset:
+            return "the file is shorter than before"
+        if checkpoint.get('fingerprint') != self.fingerprint(offset):
+            return "the file was rewritten"
+        return None
+
+    def fingerprint(self, offset):
+        """
+        Hashes the beginning of the file and the bytes before the offset.
+        """
+        with open(self.filename, 'rb') as file:
+            head = file.read(min(FINGERPRINT_SIZE, offset))
+            tail_start = max(0, offset - FINGERPRINT_SIZE)
+            file.seek(tail_start)
+            tail = file.read(offset - tail_start)
+        return [hashlib.sha1(head).hexdigest(), hashlib.sha1(tail).hexdigest()]
+
+    def find_header_end(self):
+        """
+        Returns the byte offset of the first data record.
+        """
+        if not self.has_header:
+            return 0
+        return parallel_csv.find_record_starts(self.filename, [0], self.read_options['quotechar'])[0]
+
+    def new_chunks(self, usecols, chunksize=CHUNK_SIZE, dtype=None):
+        """
+        Parses the complete records added after the checkpoint in chunks.
+
+        The index of the chunks continues from the rows processed before.
+        Pass the type of the group columns (dtype={column: str}), so the keys
+        of the new rows have the same type as the saved ones.
+
+        Args:
+            usecols (list): Columns to parse.
+            chunksize (int): Number of rows parsed at once.
+            dtype (dict, optional): Types of the parsed columns.
+
+        Yields:
+            pandas.DataFrame: The new rows.
+        """
+        self.end = parallel_csv.find_last_record_end(self.filename, self.offset, self.read_options['quotechar'])
+        self.new_rows = 0
+        if self.end <= self.offset:
+            return
+
+        with io.BufferedReader(parallel_csv.ByteRangeFile(self.filename, self.offset, self.end)) as data:
+            reader = pd.read_csv(data, header=None, names=self.columns, usecols=usecols, chunksize=chunksize,
+                                 dtype=dtype, **self.read_options)
+            for chunk in reader:
+                chunk.index += self.rows + self.new_rows
+                self.new_rows += len(chunk)
+                yield chunk
+
+    def save(self, state):
+        """
+        Saves the state after the records returned by new_chunks.
+
+        Args:
+            state (dict): JSON-serializable state of the aggregation.
+        """
+        end = self.end if self.end is not None else self.offset
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'file': os.path.abspath(self.filename),
+            'offset': end,
+            'rows': self.rows + self.new_rows,
+            'fingerprint': self.fingerprint(end),
+            'read_options': self.read_options,
+            'columns': self.columns,
+            'state': state,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(checkpoint, file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            # The aggregation itself is finished, only the next run will not be incremental
+            print(f"The checkpoint could not be saved: {e}")
+
+    def read_tail(self, usecols, dtype=None):
+        """
+        Parses the last line when it does not end with a line break.
+
+        The line belongs to the current result, but it is not saved in the
+        checkpoint, so a line that is still being written is read again next time.
+
+        Returns:
+            pandas.DataFrame: The rows of the tail (None when there is none).
+        """
+        size = os.path.getsize(self.filename)
+        if self.end is None or self.end >= size:
+            return None
+        with open(self.filename, 'rb') as file:
+            file.seek(self.end)
+            data = file.read(size - self.end)
+        if not data.strip():
+            return None
+        tail = pd.read_csv(io.BytesIO(data), header=None, names=self.columns, usecols=usecols, dtype=dtype,
+                           **self.read_options)
+        tail.index += self.rows + self.new_rows
+        return tail
+
+def save_keys(index):
+    """
+    Returns text group keys as a JSON list (missing keys become null).
+    """
+    return [None if pd.isna(key) else key for key in index.tolist()]
+
+def load_keys(keys):
+    """
+    Restores group keys saved by save_keys as a text index (null becomes a missing key).
+    """
+    return pd.Index(keys, dtype=str)
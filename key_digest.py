@@ -0,0 +1,257 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Environment variable with the width of the key digests in bits (64 or 128)
+BITS_VARIABLE = 'CSV_TOOLKIT_DIGEST_BITS'
+DEFAULT_BITS = 64
+# Key of the second hash of a 128-bit digest (16 characters, the first hash uses the pandas default)
+SECOND_HASH_KEY = 'csv-toolkit-keys'
+# Slots of the digest table that may be used before it grows
+MAX_LOAD = 0.5
+INITIAL_CAPACITY = 1 << 16
+# Row number of an unused slot
+EMPTY = -1
+
+def digest_bits():
+    """
+    Returns the digest width requested by the environment variable (64 or 128 bits).
+    """
+    value = os.environ.get(BITS_VARIABLE, '').strip()
+    return 128 if value == '128' else DEFAULT_BITS
+
+def digest_keys(df, columns=None, bits=DEFAULT_BITS):
+    """
+    Reduces the key of every row to a fixed-width digest.
+
+    Every key column is hashed by pandas in a vectorized way and the column
+    hashes are combined, so a key of any number and length of values takes
+    8 bytes (16 bytes for 128 bits, two independent hashes).
+
+    Args:
+        df (pandas.DataFrame): The rows.
+        columns (list, optional): The key columns (whole rows when None).
+        bits (int): The digest width, 64 or 128.
+
+    Returns:
+        tuple: (high, low) uint64 arrays, low is None for 64-bit digests.
+    """
+    keys = df if columns is None else df[list(columns)]
+    # Factorizing the values first (categorize) only pays off for few distinct values, the hashes are the same
+    high = pd.util.hash_pandas_object(keys, index=False, categorize=False).to_numpy()
+    if bits != 128:
+        return high, None
+    low = pd.util.hash_pandas_object(keys, index=False, hash_key=SECOND_HASH_KEY, categorize=False).to_numpy()
+    return high, low
+
+def key_tuples(df, columns=None):
+    """
+    Returns the exact keys of the rows as tuples (missing values become None, so they are equal).
+    """
+    keys = df if columns is None else df[list(columns)]
+    keys = keys.astype(object)
+    return keys.where(keys.notna(), None).itertuples(index=False, name=None)
+
+class DigestTable:
+    """
+    Hash table of key digests stored in NumPy arrays (open addressing, linear probing).
+
+    Every used slot holds the digest and the row numbers of the first and the
+    last row with that digest, 24 bytes per slot for 64-bit digests and 32
+    bytes for 128-bit digests. The table grows to twice its size when more
+    than half of the slots are used. Whole chunks are inserted and looked up
+    at once, only the rows that still probe are processed in every step.
+    """
+
+    def __init__(self, bits=DEFAULT_BITS, capacity=INITIAL_CAPACITY):
+        self.bits = bits
+        self.size = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """
+        Creates empty slots (the capacity is a power of two).
+        """
+        self.mask = np.uint64(capacity - 1)
+        self.high = np.zeros(capacity, dtype=np.uint64)
+        self.low = np.zeros(capacity, dtype=np.uint64) if self.bits == 128 else None
+        self.first = np.full(capacity, EMPTY, dtype=np.int64)
+        self.last = np.full(capacity, EMPTY, dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the slots in bytes.
+        """
+        arrays = [self.high, self.low, self.first, self.last]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def add(self, high, low, rows):
+        """
+        Inserts the digests of a chunk of rows.
+
+        Args:
+            high (numpy.ndarray): The digests (the high 64 bits of 128-bit digests).
+            low (numpy.ndarray): The low 64 bits of 128-bit digests, or None.
+            rows (numpy.ndarray): The increasing row numbers of the digests.
+
+        Returns:
+            tuple: (slots, is_new) arrays, is_new marks the first row of every digest.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if (self.size + len(rows)) > MAX_LOAD * len(self.first):
+            self.grow(self.size + len(rows))
+        slots, is_new = self.probe(high, low, rows)
+        self.size += int(is_new.sum())
+        # Digests seen again in this chunk get their last row (the rows are increasing)
+        np.maximum.at(self.last, slots, rows)
+        return slots, is_new
+
+    def find(self, high, low):
+        """
+        Looks up the slots of digests, -1 for digests that are not in the table.
+        """
+        return self.probe(high, low, None)[0]
+
+    def probe(self, high, low, rows):
+        """
+        Finds the slot of every digest, the free slots are claimed when rows are given.
+
+        When several digests reach the same free slot, the one of the earliest
+        row claims it and the others compare their digest with it in the next step.
+        """
+        slots = np.full(len(high), EMPTY, dtype=np.int64)
+        is_new = np.zeros(len(high), dtype=bool)
+        pending = np.arange(len(high))
+        position = (high & self.mask).astype(np.int64)
+        while len(pending):
+            targets = position[pending]
+            used = self.first[targets] != EMPTY
+            found = used & (self.high[targets] == high[pending])
+            if low is not None:
+                found &= self.low[targets] == low[pending]
+            slots[pending[found]] = targets[found]
+
+            free = ~used
+            if rows is None:
+                # A free slot ends the probing of a missing digest
+                keep_probing = used & ~found
+            else:
+                free_targets, first_claims = np.unique(targets[free], return_index=True)
+                winners = pending[free][first_claims]
+                self.high[free_targets] = high[winners]
+                if low is not None:
+                    self.low[free_targets] = low[winners]
+                self.first[free_targets] = rows[winners]
+                self.last[free_targets] = rows[winners]
+                slots[winners] = free_targets
+                is_new[winners] = True
+                keep_probing = ~found
+                keep_probing[np.flatnonzero(free)[first_claims]] = False
+
+            # Digests in a used slot move to the next one, the losers of a claim check the same slot again
+            advance = keep_probing & used
+            position[pending[advance]] = (targets[advance] + 1) & int(self.mask)
+            pending = pending[keep_probing]
+        return slots, is_new
+
+    def grow(self, needed):
+        """
+        Moves the digests into a table with room for the needed number of digests.
+        """
+        capacity = len(self.first)
+        while needed > MAX_LOAD * capacity:
+            capacity *= 2
+        used = np.flatnonzero(self.first != EMPTY)
+        high = self.high[used]
+        low = self.low[used] if self.low is not None else None
+        first, last = self.first[used], self.last[used]
+        self.allocate(capacity)
+        order = np.argsort(first, kind='stable')
+        slots, _ = self.probe(high[order], low[order] if low is not None else None, first[order])
+        self.last[slots] = last[order]
+
+class DigestVerifier:
+    """
+    Compares the exact keys of the rows that share a digest.
+
+    The rows must be checked in their order. The key of the first row of every
+    digest with more rows is kept in memory, the later rows are compared with
+    it. When a row has a different key (a digest collision), the rows of that
+    digest are deduplicated by their exact keys. Only the keys of duplicated
+    rows are kept, one per distinct key.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.references = {}  # Slot -> [key of the first row, last row with that key]
+        self.collided = {}  # Slot -> {exact key: [first row, last row]}
+
+    def check(self, slots, rows, keys):
+        """
+        Checks a chunk of rows.
+
+        Args:
+            slots (numpy.ndarray): The slots of the rows (see DigestTable.find).
+            rows (numpy.ndarray): The row numbers.
+            keys (iterable): The exact keys of the rows (see key_tuples).
+        """
+        table = self.table
+        shared = table.first[slots] != table.last[slots]
+        positions = np.flatnonzero(shared)
+        if not len(positions):
+            return
+        keys = list(keys)
+        for position in positions.tolist():
+            slot, row, key = int(slots[position]), int(rows[position]), keys[position]
+            collided = self.collided.get(slot)
+            if collided is not None:
+                collided.setdefault(key, [row, row])[1] = row
+                continue
+            reference = self.references.get(slot)
+            if reference is None:
+                self.references[slot] = [key, row]
+            elif key == reference[0]:
+                reference[1] = row
+            else:
+                self.collided[slot] = {reference[0]: [int(table.first[slot]), reference[1]], key: [row, row]}
+
+    @property
+    def collisions(self):
+        """
+        Number of digests shared by different keys.
+        """
+        return len(self.collided)
+
+    def kept_rows(self, keep):
+        """
+        Returns the sorted rows kept for the collided digests (one per exact key).
+        """
+        index = 0 if keep == 'first' else 1
+        rows = [pair[index] for keys in self.collided.values() for pair in keys.values()]
+        return np.sort(np.array(rows, dtype=np.int64))
+
+def keep_mask(table, slots, rows, keep='first', verifier=None):
+    """
+    Marks the rows kept by the deduplication (the first or the last row of every key).
+
+    Args:
+        table (DigestTable): The table with the digests of all rows.
+        slots (numpy.ndarray): The slots of the rows.
+        rows (numpy.ndarray): The row numbers.
+        keep (str): 'first' or 'last'.
+        verifier (DigestVerifier, optional): The checked keys, the rows of collided digests are kept by their exact keys.
+
+    Returns:
+        numpy.ndarray: Boolean mask of the kept rows.
+    """
+    kept = (table.first if keep == 'first' else table.last)[slots] == rows
+    if verifier is not None and verifier.collided:
+        collided_slots = np.fromiter(verifier.collided, dtype=np.int64, count=len(verifier.collided))
+        in_collided = np.isin(slots, collided_slots)
+        kept[in_collided] = np.isin(rows[in_collided], verifier.kept_rows(keep))
+    return kept
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+import csv_dialect
+
+# Directory with lookup stores, created next to the source CSV file
+STORE_DIRNAME = '.csv_lookup'
+# Version of the store format, older stores are rebuilt
+STORE_VERSION = 2
+# Number of rows of the source file read at once while building the store
+CHUNK_SIZE = 100_000
+# Page cache of SQLite while building a store in KB (keys are inserted in random order)
+BUILD_CACHE_KB = 256 * 1024
+# Number of keys looked up by one query (SQLite allows at most 999 parameters in older versions)
+PROBE_BATCH = 900
+
+class LookupStore:
+    """
+    Persistent index of a CSV file by one column, stored in SQLite.
+
+    The store keeps the first row of every key (missing keys are left out),
+    with the values converted to the types of the whole columns (see
+    csv_dialect.ColumnTypes), so looked-up rows have the same types as when
+    the file is read with pandas.read_csv. Numeric keys are stored as numbers
+    and matched by their value, like in pandas.merge. The store is rebuilt
+    when the size, modification time or dialect of the source file changes.
+
+    Usage:
+        store = LookupStore(filename, column)
+        if not store.is_current():
+            store.build(csv_dialect.read_csv(filename, dtype=str, chunksize=CHUNK_SIZE), types, prepare)
+        rows = store.lookup(keys)  # DataFrame indexed by the column
+        store.close()
+    """
+
+    def __init__(self, filename, column):
+        self.filename = filename
+        self.column = column
+        path = os.path.abspath(filename)
+        identity = json.dumps([path, str(column)])
+        name = hashlib.sha1(identity.encode('utf-8')).hexdigest() + '.sqlite'
+        self.path = os.path.join(os.path.dirname(path), STORE_DIRNAME, name)
+        self.connection = None
+        self.meta = None
+        self.types = None
+
+    def source_info(self):
+        """
+        Returns what the store depends on: the format version, the source file and its dialect.
+        """
+        stat = os.stat(self.filename)
+        return {
+            'version': STORE_VERSION,
+            'column': str(self.column),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'read_options': csv_dialect.read_options(csv_dialect.detect_dialect(self.filename)),
+        }
+
+    def is_current(self):
+        """
+        Opens the store when it exists and still matches the source file.
+
+        Returns:
+            bool: False when the store has to be (re)built.
+        """
+        self.close()
+        if not os.path.exists(self.path):
+            return False
+        connection = sqlite3.connect(self.path)
+        try:
+            meta = json.loads(connection.execute("SELECT value FROM meta WHERE name = 'meta'").fetchone()[0])
+        except (sqlite3.Error, TypeError, ValueError):
+            connection.close()
+            print("The lookup store is damaged, it is built again.")
+            return False
+        info = self.source_info()
+        if any(meta.get(key) != value for key, value in info.items()):
+            connection.close()
+            print("The second file changed since the lookup store was built, it is built again.")
+            return False
+        self.connection, self.meta = connection, meta
+        self.types = csv_dialect.ColumnTypes.from_state(meta['types'])
+        return True
+
+    def build(self, chunks, types, prepare=None):
+        """
+        Builds the store from chunks of the source file read as text.
+
+        The store is written to a temporary file first, so an interrupted build
+        never leaves a half-written store behind.
+
+        Args:
+            chunks (iterable): DataFrames with all columns of the file (dtype=str).
+            types (csv_dialect.ColumnTypes): The kinds of the whole columns of the file.
+            prepare (callable, optional): Called on every deduplicated chunk before it
+                is stored (e.g. to decode HTML entities in place).
+        """
+        self.close()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        start_time = time.perf_counter()
+        info = self.source_info()
+
+        connection = sqlite3.connect(temp_path)
+        # The temporary file is replaced only after a complete build, so it needs no journal
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.execute(f"PRAGMA cache_size = -{BUILD_CACHE_KB}")
+        try:
+            columns = None
+            row_count = 0
+            for chunk in chunks:
+                if columns is None:
+                    columns = [name for name in chunk.columns if name != self.column]
+                    fields = ''.join(f', c{position}' for position in range(len(columns)))
+                    # Rows are appended to a staging table in the file order first, inserting
+                    # them into the index sorted by key is much faster than in random order.
+                    # The columns have no type, so numbers and text are stored as they are.
+                    connection.execute(f"CREATE TEMP TABLE staging (key{fields})")
+                    insert = f"INSERT INTO staging VALUES ({', '.join('?' * (len(columns) + 1))})"
+                row_count += len(chunk)
+
+                # First row of every typed key in the chunk (keys equal only after decoding are removed later)
+                chunk = types.apply(chunk).dropna(subset=[self.column]).drop_duplicates(subset=self.column)
+                if prepare is not None:
+                    chunk = chunk.copy()
+                    prepare(chunk)
+                values = chunk[[self.column] + columns].astype(object)
+                rows = values.where(values.notna(), None).itertuples(index=False, name=None)
+                connection.executemany(insert, (tuple(map(to_sql_value, row)) for row in rows))
+            if columns is None:
+                raise ValueError(f"The file '{self.filename}' has no columns.")
+
+            # The first row of every key is kept, later rows with the same key are ignored
+            # (SQLite compares integers and floats by their value, so 7 and 7.0 are one key)
+            connection.execute(f"CREATE TABLE rows (key PRIMARY KEY{fields}) WITHOUT ROWID")
+            connection.execute("INSERT OR IGNORE INTO rows SELECT * FROM staging ORDER BY key, rowid")
+            connection.execute("DROP TABLE staging")
+            key_count = connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+            meta = dict(info, columns=columns, types=types.state(), rows=row_count, keys=key_count)
+            connection.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("INSERT INTO meta VALUES ('meta', ?)", (json.dumps(meta),))
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(temp_path, self.path)
+
+        self.connection, self.meta, self.types = sqlite3.connect(self.path), meta, types
+        print(f"Lookup store built from {row_count} rows ({key_count} keys) "
+              f"in {time.perf_counter() - start_time:.2f} s.")
+
+    def lookup(self, keys):
+        """
+        Finds the rows of the given keys, the keys are queried in batches.
+
+        Args:
+            keys (pandas.Series): Keys to look up (duplicates and missing keys are allowed), numbers
+                when the stored keys are numbers.
+
+        Returns:
+            pandas.DataFrame: The stored row of every found key, indexed by the column.
+        """
+        unique_keys = [to_sql_value(key) for key in pd.unique(keys.dropna())]
+        columns = self.meta['columns']
+        select = "SELECT * FROM rows WHERE key IN "
+        rows = []
+        for start in range(0, len(unique_keys), PROBE_BATCH):
+            batch = unique_keys[start:start + PROBE_BATCH]
+            rows.extend(self.connection.execute(select + f"({', '.join('?' * len(batch))})", batch))
+
+        found = pd.DataFrame.from_records(rows, columns=[self.column] + columns)
+        return self.types.apply(found).set_index(self.column)
+
+    def close(self):
+        """
+        Closes the connection to the store.
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+def to_sql_value(value):
+    """
+    Converts a NumPy number to the Python number SQLite accepts.
+    """
+    return value.item() if isinstance(value, np.generic) else value
@@ -1,15 +1,33 @@
 import os
+import csv
+import time
+import heapq
+import tempfile
+import functools
+import numpy as np
 import pandas as pd
 import html
+import chunk_pipeline
+import column_cache
+import compressed_csv
+import csv_dialect
+import lookup_store
+import stage_timer
+
+# Settings for the streaming merge (used for files that do not fit into memory)
+CHUNK_SIZE = 100_000  # Number of rows of the first file joined at once.
+MAX_RIGHT_SIDE_BYTES = 512 * 1024 * 1024  # Larger second files are joined through disk partitions.
+JOIN_PARTITIONS = 32  # Number of on-disk partitions of the partitioned join.
+HTML_CACHE_SIZE = 100_000  # Number of decoded strings remembered by the HTML decoder.
 
 def list_csv_files():
     """
-    Retrieves and lists all .csv files in the current directory.
+    Retrieves and lists all .csv files (also compressed .csv.gz, .csv.bz2 and .csv.xz) in the current directory.
     
     Returns:
         list: A list of CSV file names.
     """
-    csv_files = [f for f in os.listdir('.') if f.lower().endswith('.csv')]
+    csv_files = [f for f in os.listdir('.') if compressed_csv.is_csv_file(f)]
     for i, file in enumerate(csv_files, 1):
         print(f"{i}. {file}")
     return csv_files
@@ -35,17 +53,21 @@ def select_file(prompt, files):
         except ValueError:
             print("Please enter a valid number.")
 
-def list_columns(file):
+def list_columns(file, nrows=None):
     """
     Lists all columns in the given CSV file.
     
     Args:
         file (str): The file name of the CSV to read.
+        nrows (int, optional): Number of rows to read (0 reads only the header).
         
     Returns:
         pandas.DataFrame: The DataFrame containing the CSV data.
     """
-    df = pd.read_csv(file)
+    if nrows is None:
+        df = column_cache.read_csv(file)
+    else:
+        df = csv_dialect.read_csv(file, nrows=nrows)
     for i, col in enumerate(df.columns, 1):
         print(f"{i}. {col}")
     return df
@@ -71,7 +93,7 @@ def select_column(prompt, columns):
         except ValueError:
             print("Please enter a valid number.")
 
-def merge_files(file1, file2, column):
+def merge_files(file1, file2, column, df1=None, stats=None):
     """
     Merges two CSV files based on a common column.
     
@@ -79,12 +101,17 @@ def merge_files(file1, file2, column):
         file1 (str): The first CSV file name.
         file2 (str): The second CSV file name.
         column (str): The column name to merge on.
+        df1 (pandas.DataFrame, optional): Already loaded data of the first file.
+        stats (dict, optional): Collects HTML decoding statistics (see new_merge_stats).
         
     Returns:
         pandas.DataFrame: The merged DataFrame.
     """
-    df1 = pd.read_csv(file1)
-    df2 = pd.read_csv(file2)
+    with stage_timer.stage('load') as load_stage:
+        if df1 is None:
+            df1 = column_cache.read_csv(file1)
+        df2 = column_cache.read_csv(file2)
+        load_stage.rows = len(df1) + len(df2)
 
     # Check if the selected column exists in both files
     if column not in df1.columns:
@@ -95,23 +122,443 @@ def merge_files(file1, file2, column):
         return None
 
     # Remove duplicates in the second file
-    df2_grouped = df2.groupby(column).agg(lambda x: x.iloc[0]).reset_index()
+    with stage_timer.stage('remove duplicates', len(df2)):
+        df2_grouped = df2.groupby(column, observed=True).agg(lambda x: x.iloc[0]).reset_index()
 
-    # Decode HTML entities in the join column (only for text data)
-    if df1[column].dtype == 'object':
-        df1[column] = df1[column].apply(html.unescape)
-    if df2_grouped[column].dtype == 'object':
-        df2_grouped[column] = df2_grouped[column].apply(html.unescape)
+    # Decode HTML entities in all text columns (each column once, before the merge)
+    with stage_timer.stage('decode html', len(df1) + len(df2_grouped)):
+        decode_html_columns(df1, stats)
+        decode_html_columns(df2_grouped, stats)
 
     # Merge the files
-    merged_df = pd.merge(df1, df2_grouped, on=column, how='left')
-
-    # Decode HTML entities in all text columns
-    for col in merged_df.select_dtypes(include='object').columns:
-        merged_df[col] = merged_df[col].apply(lambda x: html.unescape(str(x)) if pd.notnull(x) else x)
+    with stage_timer.stage('merge', len(df1)):
+        merged_df = pd.merge(df1, df2_grouped, on=column, how='left')
 
     return merged_df
 
+@functools.lru_cache(maxsize=HTML_CACHE_SIZE)
+def unescape_cached(value):
+    """
+    Decodes HTML entities in one string, remembering recent results.
+    """
+    return html.unescape(value)
+
+def new_merge_stats():
+    """
+    Creates an empty dictionary for the HTML decoding statistics of a merge.
+    """
+    return {'checked': 0, 'with_entities': 0, 'cache_hits': 0, 'cache_misses': 0, 'seconds': 0.0}
+
+def decode_html_column(values, stats=None):
+    """
+    Decodes HTML entities in a text column.
+
+    Values without '&' are skipped by a vectorized check, every distinct value
+    with an entity is decoded once and the results are memoized across columns
+    and chunks.
+
+    Args:
+        values (pandas.Series): The column to decode.
+        stats (dict, optional): Collects the decoding statistics.
+
+    Returns:
+        pandas.Series: The decoded column (unchanged for non-text columns).
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Compact columns (see compact_dtypes.py): every category is decoded once
+        categories = values.cat.categories
+        return values.map(decode_html_column(pd.Series(categories, index=categories), stats))
+    if not pd.api.types.is_string_dtype(values.dtype):
+        return values
+
+    start_time = time.perf_counter()
+    cache_before = unescape_cached.cache_info()
+    try:
+        has_entity = values.str.contains('&', regex=False, na=False).astype(bool)
+    except AttributeError:
+        # Mixed values that are not all strings
+        has_entity = values.notna() & values.astype(str).str.contains('&', regex=False)
+
+    if has_entity.any():
+        values = values.copy()
+        with_entities = values[has_entity]
+        decoded = {value: unescape_cached(str(value)) for value in with_entities.unique()}
+        values[has_entity] = with_entities.map(decoded)
+
+    if stats is not None:
+        cache_after = unescape_cached.cache_info()
+        stats['checked'] += len(values)
+        stats['with_entities'] += int(has_entity.sum())
+        stats['cache_hits'] += cache_after.hits - cache_before.hits
+        stats['cache_misses'] += cache_after.misses - cache_before.misses
+        stats['seconds'] += time.perf_counter() - start_time
+    return values
+
+def decode_html_columns(df, stats=None):
+    """
+    Decodes HTML entities in all text columns of a DataFrame in place.
+    """
+    for col in df.columns:
+        df[col] = decode_html_column(df[col], stats)
+
+def print_merge_stats(row_count, stats):
+    """
+    Prints the statistics of a finished merge.
+
+    Args:
+        row_count (int): Number of rows in the merged file.
+        stats (dict): The HTML decoding statistics.
+    """
+    lookups = stats['cache_hits'] + stats['cache_misses']
+    hit_rate = stats['cache_hits'] / lookups * 100 if lookups else 0.0
+    print("\nMerge statistics:")
+    print(f"Rows in the merged file: {row_count}")
+    print(f"Values checked for HTML entities: {stats['checked']}")
+    print(f"Values with HTML entities: {stats['with_entities']}")
+    print(f"Decoding cache hit rate: {hit_rate:.1f}% ({stats['cache_hits']} hits, {stats['cache_misses']} misses)")
+    print(f"Time spent decoding HTML entities: {stats['seconds']:.2f} s")
+
+def merge_files_streaming(file1, file2, column, output_file, chunksize=CHUNK_SIZE,
+                          max_right_bytes=MAX_RIGHT_SIDE_BYTES, stats=None):
+    """
+    Left-joins two CSV files without loading the first one into memory.
+
+    A hash index is built over the deduplicated second file, the first file is
+    streamed through it in chunks and the joined rows are appended to the output.
+    The first file is read twice: the first pass infers the types of its whole
+    columns (see csv_dialect.ColumnTypes), so every chunk is converted to them
+    and the output is the same as from merge_files. When the second file is
+    larger than max_right_bytes, a partitioned join on local disk is used instead.
+
+    Args:
+        file1 (str): The first CSV file name.
+        file2 (str): The second CSV file name.
+        column (str): The column name to merge on.
+        output_file (str): The file name of the merged CSV.
+        chunksize (int): Number of rows of the first file joined at once.
+        max_right_bytes (int): The largest second file joined in memory.
+        stats (dict, optional): Collects HTML decoding statistics (see new_merge_stats).
+
+    Returns:
+        int: Number of written rows, or None when the column is missing.
+    """
+    if not check_join_column(file1, file2, column):
+        return None
+    if compressed_csv.estimated_size(file2) > max_right_bytes:
+        return merge_files_partitioned(file1, file2, column, output_file, chunksize, stats=stats)
+
+    with stage_timer.stage('infer types'):
+        left_types = scan_column_types(file1, chunksize)
+    # Hash index over the deduplicated second file, keyed on the typed join column
+    with stage_timer.stage('load second file') as load_stage:
+        df2, right_types = load_typed(file2)
+        load_stage.rows = len(df2)
+    check_key_types(left_types, right_types, column)
+    with stage_timer.stage('index second file', len(df2)):
+        right = build_join_index(df2, column, stats)
+
+    # The next chunks are parsed and the merged rows written by background threads (see chunk_pipeline.py)
+    with chunk_pipeline.ChunkWriter(output_file) as writer:
+        reader = csv_dialect.read_csv(file1, dtype=str, chunksize=chunksize)
+        for chunk in chunk_pipeline.read_ahead(reader):
+            with stage_timer.stage('merge', len(chunk)):
+                merged_chunk = join_chunk(left_types.apply(chunk), right, column, stats)
+            with stage_timer.stage('write', len(merged_chunk)):
+                writer.write(merged_chunk)
+    return writer.rows
+
+def merge_files_partitioned(file1, file2, column, output_file, chunksize=CHUNK_SIZE,
+                            partitions=JOIN_PARTITIONS, stats=None):
+    """
+    Left-joins two CSV files through hash partitions stored on local disk.
+
+    Both files are split by the hash of the decoded join column (numbers by
+    their value, see partition_hashes), so matching rows end up in the same
+    partition, and every pair of partitions is joined in memory. The row order of the first file is restored by merging the
+    partition results by their original row number.
+
+    Args:
+        file1 (str): The first CSV file name.
+        file2 (str): The second CSV file name.
+        column (str): The column name to merge on.
+        output_file (str): The file name of the merged CSV.
+        chunksize (int): Number of rows read at once.
+        partitions (int): Number of partitions.
+        stats (dict, optional): Collects HTML decoding statistics (see new_merge_stats).
+
+    Returns:
+        int: Number of written rows, or None when the column is missing.
+    """
+    if not check_join_column(file1, file2, column):
+        return None
+
+    with tempfile.TemporaryDirectory(prefix="merge_") as temp_dir:
+        left_paths = [os.path.join(temp_dir, f"left_{i}.csv") for i in range(partitions)]
+        right_paths = [os.path.join(temp_dir, f"right_{i}.csv") for i in range(partitions)]
+        joined_paths = [os.path.join(temp_dir, f"joined_{i}.csv") for i in range(partitions)]
+
+        # 1. Split both files into partitions by the hash of the decoded join column.
+        # The values are kept as text, the types of the whole columns are inferred on the way.
+        left_types = csv_dialect.ColumnTypes()
+        right_types = csv_dialect.ColumnTypes()
+        with stage_timer.stage('partition'):
+            for chunk in csv_dialect.read_csv(file2, dtype=str, chunksize=chunksize):
+                right_types.update(chunk)
+                write_partitions(chunk, column, right_paths)
+            for chunk in csv_dialect.read_csv(file1, dtype=str, chunksize=chunksize):
+                left_types.update(chunk)
+                chunk.insert(0, '__row', chunk.index)
+                write_partitions(chunk, column, left_paths)
+
+        # 2. Join every pair of partitions in memory, the columns (the join column too) get the types
+        # of the whole files
+        check_key_types(left_types, right_types, column)
+        right_columns = list(csv_dialect.read_csv(file2, nrows=0).columns)
+        for left_path, right_path, joined_path in zip(left_paths, right_paths, joined_paths):
+            if not os.path.exists(left_path):
+                continue
+            if os.path.exists(right_path):
+                right_part = pd.read_csv(right_path, dtype=str)
+            else:
+                right_part = pd.DataFrame(columns=right_columns, dtype=str)
+            right_types.apply(right_part)
+            left_part = pd.read_csv(left_path, dtype=str)
+            left_part['__row'] = left_part['__row'].astype('int64')
+            left_types.apply(left_part, skip=['__row'])
+            with stage_timer.stage('merge', len(left_part)):
+                right = build_join_index(right_part, column, stats)
+                joined_part = join_chunk(left_part, right, column, stats)
+            joined_part.to_csv(joined_path, index=False)
+
+        # 3. Merge the sorted partition results back into the original row order
+        row_count = 0
+        readers = []
+        files = [open(path, encoding='utf-8', newline='') for path in joined_paths if os.path.exists(path)]
+        write_stage = stage_timer.stage('write')
+        try:
+            for file in files:
+                reader = csv.reader(file)
+                header = next(reader)
+                readers.append(reader)
+            with write_stage, compressed_csv.open_output(output_file) as output:
+                writer = csv.writer(output, lineterminator=os.linesep)
+                if readers:
+                    writer.writerow(header[1:])
+                for row in heapq.merge(*readers, key=lambda row: int(row[0])):
+                    writer.writerow(row[1:])
+                    row_count += 1
+                write_stage.rows = row_count
+        finally:
+            for file in files:
+                file.close()
+    return row_count
+
+def merge_files_with_store(file1, file2, column, output_file, chunksize=CHUNK_SIZE, stats=None):
+    """
+    Left-joins the first file with a persistent lookup store of the second file.
+
+    The deduplicated second file with decoded HTML entities is stored in a
+    SQLite file next to it (see lookup_store.py) on the first merge and reused
+    by later merges until the second file changes. The types of the whole
+    columns of the first file are inferred by a first pass, then the file is
+    streamed in chunks converted to them and the keys of every chunk are
+    looked up in batches, so the output is the same as from merge_files.
+
+    Args:
+        file1 (str): The first CSV file name.
+        file2 (str): The second CSV file name.
+        column (str): The column name to merge on.
+        output_file (str): The file name of the merged CSV.
+        chunksize (int): Number of rows of the first file joined at once.
+        stats (dict, optional): Collects HTML decoding statistics (see new_merge_stats).
+
+    Returns:
+        int: Number of written rows, or None when the column is missing.
+    """
+    if not check_join_column(file1, file2, column):
+        return None
+
+    with stage_timer.stage('infer types'):
+        left_types = scan_column_types(file1, chunksize)
+    store = open_lookup_store(file2, column, stats)
+    try:
+        check_key_types(left_types, store.types, column)
+        with chunk_pipeline.ChunkWriter(output_file) as writer:
+            reader = csv_dialect.read_csv(file1, dtype=str, chunksize=chunksize)
+            for chunk in chunk_pipeline.read_ahead(reader):
+                with stage_timer.stage('merge', len(chunk)):
+                    merged_chunk = join_store_chunk(left_types.apply(chunk), store, column, stats)
+                with stage_timer.stage('write', len(merged_chunk)):
+                    writer.write(merged_chunk)
+    finally:
+        store.close()
+    return writer.rows
+
+def open_lookup_store(file2, column, stats=None):
+    """
+    Opens the lookup store of the second file, it is built first when it is missing or outdated.
+
+    Returns:
+        lookup_store.LookupStore: The opened store.
+    """
+    store = lookup_store.LookupStore(file2, column)
+    if store.is_current():
+        print(f"Using the lookup store of '{os.path.basename(file2)}' ({store.meta['keys']} keys).")
+    else:
+        with stage_timer.stage('build lookup store') as build_stage:
+            types = scan_column_types(file2, lookup_store.CHUNK_SIZE)
+            chunks = csv_dialect.read_csv(file2, dtype=str, chunksize=lookup_store.CHUNK_SIZE)
+            store.build(chunks, types, prepare=lambda chunk: decode_html_columns(chunk, stats))
+            build_stage.rows = store.meta['rows']
+    return store
+
+def scan_column_types(filename, chunksize=CHUNK_SIZE):
+    """
+    Infers the types of the whole columns of a file read in chunks as text.
+
+    Returns:
+        csv_dialect.ColumnTypes: The kinds of all columns.
+    """
+    types = csv_dialect.ColumnTypes()
+    for chunk in chunk_pipeline.read_ahead(csv_dialect.read_csv(filename, dtype=str, chunksize=chunksize)):
+        types.update(chunk)
+    return types
+
+def load_typed(filename):
+    """
+    Loads a whole file as text and converts its columns to the inferred types.
+
+    Returns:
+        tuple: The loaded pandas.DataFrame and its csv_dialect.ColumnTypes.
+    """
+    df = csv_dialect.read_csv(filename, dtype=str)
+    types = csv_dialect.ColumnTypes()
+    types.update(df)
+    return types.apply(df), types
+
+def check_key_types(left_types, right_types, column):
+    """
+    Checks that the join column is numeric in both files or text in both files.
+
+    The keys are compared like in merge_files (pandas.merge): numbers by their
+    value, so '007' matches '7', and text as decoded text. pandas.merge refuses
+    to join a numeric column with a text one, so the other modes do too.
+
+    Raises:
+        ValueError: When one join column is numeric and the other is text.
+    """
+    left_kind = left_types.kind(column)
+    right_kind = right_types.kind(column)
+    if (left_kind == 'text') != (right_kind == 'text'):
+        raise ValueError(f"The column '{column}' is {left_kind} in the first file and {right_kind} "
+                         "in the second file, numbers cannot be joined with text.")
+
+def join_store_chunk(chunk, store, column, stats=None):
+    """
+    Left-joins one chunk of the first file with the rows looked up in the store.
+
+    Args:
+        chunk (pandas.DataFrame): Rows of the first file with the types of its whole columns.
+        store (lookup_store.LookupStore): The opened store of the second file (already decoded).
+        column (str): The column name to merge on.
+        stats (dict, optional): Collects HTML decoding statistics.
+
+    Returns:
+        pandas.DataFrame: The merged rows with decoded HTML entities.
+    """
+    decode_html_columns(chunk, stats)
+    right = store.lookup(chunk[column])
+    return chunk.join(right, on=column, how='left', lsuffix='_x', rsuffix='_y')
+
+def check_join_column(file1, file2, column):
+    """
+    Checks if the join column exists in the headers of both files.
+    """
+    if column not in csv_dialect.read_csv(file1, nrows=0).columns:
+        print(f"Error: Column '{column}' does not exist in '{file1}'.")
+        return False
+    if column not in csv_dialect.read_csv(file2, nrows=0).columns:
+        print(f"Error: Column '{column}' does not exist in '{file2}'.")
+        return False
+    return True
+
+def build_join_index(df2, column, stats=None):
+    """
+    Deduplicates the second file and indexes it by the decoded join column.
+
+    Args:
+        df2 (pandas.DataFrame): Data of the second file with the types of its whole columns.
+        column (str): The column name to merge on.
+        stats (dict, optional): Collects HTML decoding statistics.
+
+    Returns:
+        pandas.DataFrame: The first row of every key, indexed by the join column.
+    """
+    # Remove duplicates in the second file (first row of every key, like groupby().agg(iloc[0]))
+    df2_grouped = df2.drop_duplicates(subset=column).dropna(subset=[column])
+    decode_html_columns(df2_grouped, stats)
+    return df2_grouped.set_index(column)
+
+def join_chunk(chunk, right, column, stats=None):
+    """
+    Left-joins one chunk of the first file with the indexed second file.
+
+    Args:
+        chunk (pandas.DataFrame): Rows of the first file with the types of its whole columns.
+        right (pandas.DataFrame): The result of build_join_index (already decoded).
+        column (str): The column name to merge on.
+        stats (dict, optional): Collects HTML decoding statistics.
+
+    Returns:
+        pandas.DataFrame: The merged rows with decoded HTML entities.
+    """
+    decode_html_columns(chunk, stats)
+    return chunk.join(right, on=column, how='left', lsuffix='_x', rsuffix='_y')
+
+def write_partitions(chunk, column, paths):
+    """
+    Appends the rows of a chunk to partition files by the hash of the decoded join column.
+    """
+    partition_ids = partition_hashes(chunk[column]) % len(paths)
+    for partition_id, part in chunk.groupby(partition_ids):
+        path = paths[partition_id]
+        part.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+def partition_hashes(keys):
+    """
+    Hashes join keys read as text, so keys that can match end up in the same partition.
+
+    The partitions are written before the types of the whole columns are
+    known, so keys that are numbers are hashed by their value ('007', '7' and
+    '7.0' are equal numbers) and the others by their decoded text.
+    """
+    keys = decode_html_column(keys)
+    # Adding zero turns -0.0 into 0.0, both are equal keys
+    numbers = pd.to_numeric(keys, errors='coerce').astype('float64') + 0.0
+    number_hashes = pd.util.hash_pandas_object(numbers, index=False).to_numpy()
+    text_hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    return np.where(numbers.notna().to_numpy(), number_hashes, text_hashes)
+
+def ask_streaming_mode():
+    """
+    Asks the user whether the files should be merged in streaming mode.
+
+    Returns:
+        bool: True for the streaming mode.
+    """
+    answer = input("Merge in streaming mode (for files larger than memory)? [y/N]: ")
+    return answer.strip().lower() in ('y', 'yes')
+
+def ask_lookup_store_mode():
+    """
+    Asks the user whether the second file should be merged through a persistent lookup store.
+
+    Returns:
+        bool: True for the lookup store.
+    """
+    answer = input("Keep an indexed lookup store of the second file for repeated merges? [y/N]: ")
+    return answer.strip().lower() in ('y', 'yes')
+
 def main():
     # The main function orchestrates the CSV merging process.
     # List all CSV files in the current directory
@@ -129,20 +576,51 @@ def main():
     file1_path = os.path.join(os.getcwd(), file1_name)
     file2_path = os.path.join(os.getcwd(), file2_name)
 
-    # List columns from the first file
+    output_file = os.path.join(os.getcwd(), compressed_csv.output_filename('merged_output.csv'))
+    use_store = ask_lookup_store_mode()
+    streaming = not use_store and ask_streaming_mode()
+
+    # List columns from the first file (only the header is read)
     print(f"\nColumns in file '{file1_name}':")
-    df1 = list_columns(file1_path)
+    with stage_timer.stage('load header'):
+        df1 = list_columns(file1_path, nrows=0)
 
     # Select the column to merge on
     column_choice = select_column("Select the number of the column to join the files by: ", df1.columns)
 
+    stats = new_merge_stats()
+    if use_store:
+        # Probe the persistent lookup store of the second file with every chunk of the first file
+        with stage_timer.stage('lookup store total') as total_stage:
+            row_count = total_stage.rows = merge_files_with_store(file1_path, file2_path, column_choice,
+                                                                  output_file, stats=stats)
+        if row_count is not None:
+            print(f"\nFiles have been successfully merged. The result is saved in '{output_file}'.")
+            print_merge_stats(row_count, stats)
+        else:
+            print("\nMerging was unsuccessful due to missing columns.")
+        return
+
+    if streaming:
+        # Stream the first file through the indexed second file
+        with stage_timer.stage('streaming total') as total_stage:
+            row_count = total_stage.rows = merge_files_streaming(file1_path, file2_path, column_choice,
+                                                                 output_file, stats=stats)
+        if row_count is not None:
+            print(f"\nFiles have been successfully merged. The result is saved in '{output_file}'.")
+            print_merge_stats(row_count, stats)
+        else:
+            print("\nMerging was unsuccessful due to missing columns.")
+        return
+
     # Merge the files
-    merged_df = merge_files(file1_path, file2_path, column_choice)
+    merged_df = merge_files(file1_path, file2_path, column_choice, stats=stats)
 
     if merged_df is not None:
-        output_file = os.path.join(os.getcwd(), 'merged_output.csv')
-        merged_df.to_csv(output_file, index=False)
+        with stage_timer.stage('write', len(merged_df)):
+            chunk_pipeline.write_csv(merged_df, output_file)
         print(f"\nFiles have been successfully merged. The result is saved in '{output_file}'.")
+        print_merge_stats(len(merged_df), stats)
     else:
         print("\nMerging was unsuccessful due to missing columns.")
 
@@ -0,0 +1,233 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import compressed_csv
+
+# Size of the blocks read while looking for record boundaries
+BLOCK_SIZE = 16 * 1024 * 1024
+# Number of rows of a byte range parsed at once
+CHUNK_SIZE = 1_000_000
+
+def find_record_starts(filename, targets, quotechar='"'):
+    """
+    Finds the start of the first record at or after each target byte offset.
+
+    A record starts after a line break that is not inside a quoted field. The
+    quote parity is tracked from the beginning of the file, so line breaks
+    inside quoted values are never used as boundaries.
+
+    Args:
+        filename (str): The CSV file name.
+        targets (list): Increasing byte offsets.
+        quotechar (str): The quote character used in the file.
+
+    Returns:
+        list: Byte offsets of record starts (the file size if there is none).
+    """
+    quote = quotechar.encode()
+    size = os.path.getsize(filename)
+    starts = []
+    pending = list(targets)
+    inside_quotes = False
+    position = 0
+
+    with open(filename, 'rb') as file:
+        while pending:
+            block = file.read(BLOCK_SIZE)
+            if not block:
+                break
+            block_end = position + len(block)
+
+            while pending and pending[0] < block_end:
+                local = max(pending[0], position) - position
+                counted_to = 0
+                quotes_before = 0
+                newline = block.find(b'\n', local)
+                while newline != -1:
+                    quotes_before += block.count(quote, counted_to, newline)
+                    counted_to = newline
+                    if inside_quotes == (quotes_before % 2 == 1):
+                        # Even number of quotes before this line break, a new record follows
+                        break
+                    newline = block.find(b'\n', newline + 1)
+                if newline == -1:
+                    # Continues the search in the next block
+                    pending[0] = block_end
+                    break
+                start = position + newline + 1
+                starts.append(start)
+                pending.pop(0)
+                # Later targets that fall before this record start use the next one
+                while pending and pending[0] < start:
+                    pending[0] = start
+
+            inside_quotes ^= block.count(quote) % 2 == 1
+            position = block_end
+
+    return starts + [size] * len(pending)
+
+def split_into_byte_ranges(filename, parts, quotechar='"', has_header=True):
+    """
+    Splits a CSV file into byte ranges that start and end on record boundaries.
+
+    Args:
+        filename (str): The CSV file name.
+        parts (int): The requested number of ranges.
+        quotechar (str): The quote character used in the file.
+        has_header (bool): Whether the first record is a header.
+
+    Returns:
+        tuple: The header bytes and a list of (start, end) byte ranges.
+    """
+    size = os.path.getsize(filename)
+    header_end = find_record_starts(filename, [0], quotechar)[0] if has_header else 0
+    targets = [header_end + (size - header_end) * i // parts for i in range(1, parts)]
+    boundaries = [header_end] + find_record_starts(filename, targets, quotechar) + [size]
+
+    with open(filename, 'rb') as file:
+        header = file.read(header_end)
+
+    ranges = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+    return header, ranges
+
+def read_byte_range(filename, start, end, columns, usecols=None, chunksize=CHUNK_SIZE, **read_options):
+    """
+    Parses one byte range of a CSV file chunk by chunk.
+
+    The range is read through ByteRangeFile, so only one chunk of the range is
+    in memory at a time. Pass the type of the group columns (e.g. dtype={column:
+    str}), otherwise pandas guesses it separately for every chunk and range.
+
+    Args:
+        filename (str): The CSV file name.
+        start (int): The first byte of the range.
+        end (int): The byte after the range.
+        columns (list): Column names from the header of the file.
+        usecols (list): Columns to parse (all when None).
+        chunksize (int): Number of rows parsed at once.
+        **read_options: Additional options for pandas.read_csv (delimiter, quotechar, dtype, ...).
+
+    Yields:
+        pandas.DataFrame: The rows of the range (the index starts at 0 and continues across the chunks).
+    """
+    with io.BufferedReader(ByteRangeFile(filename, start, end)) as data:
+        yield from pd.read_csv(data, header=None, names=columns, usecols=usecols, chunksize=chunksize,
+                               **read_options)
+
+def read_header(header, **read_options):
+    """
+    Returns the column names parsed from the header bytes.
+    """
+    return list(pd.read_csv(io.BytesIO(header), nrows=0, **read_options).columns)
+
+def run_on_byte_ranges(worker, filename, workers, *args, **read_options):
+    """
+    Runs a worker function on byte ranges of one CSV file in a process pool.
+
+    The worker is called as worker(filename, start, end, columns, *args, read_options)
+    and must be a module-level function so it can be sent to other processes.
+    The 'header' option is handled here and is not passed to the worker.
+
+    Args:
+        worker (callable): The function processing one range.
+        filename (str): The CSV file name.
+        workers (int): Number of worker processes.
+        *args: Additional arguments for the worker.
+        **read_options: Additional options for pandas.read_csv.
+
+    Returns:
+        list: Results of the worker in the order of the ranges.
+    """
+    if compressed_csv.is_compressed(filename):
+        raise ValueError("Compressed files cannot be split into byte ranges.")
+    read_options = dict(read_options)
+    has_header = read_options.pop('header', 0) is not None
+    if str(read_options.get('encoding', '')).lower().startswith('utf-16'):
+        raise ValueError("Files encoded in UTF-16 cannot be split into byte ranges.")
+
+    quotechar = read_options.get('quotechar', '"')
+    header, ranges = split_into_byte_ranges(filename, workers, quotechar, has_header)
+    if has_header:
+        columns = read_header(header, **read_options)
+    else:
+        columns = list(pd.read_csv(filename, header=None, nrows=1, **read_options).columns)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(worker, filename, start, end, columns, *args, read_options)
+                   for start, end in ranges]
+        return [future.result() for future in futures]
+
+def find_last_record_end(filename, start=0, quotechar='"'):
+    """
+    Finds the end of the last complete record at or after a record start.
+
+    A record is complete when it ends with a line break outside quoted
+    values. A last line without a line break (e.g. one that is still being
+    appended) is not complete.
+
+    Args:
+        filename (str): The CSV file name.
+        start (int): Byte offset of a record start (outside quotes).
+        quotechar (str): The quote character used in the file.
+
+    Returns:
+        int: Byte offset after the last complete record (start when there is none).
+    """
+    quote = quotechar.encode()
+    last_end = start
+    inside_quotes = False
+    position = start
+
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        while True:
+            block = file.read(BLOCK_SIZE)
+            if not block:
+                break
+            inside_at_end = inside_quotes ^ (block.count(quote) % 2 == 1)
+
+            # Walks back over the line breaks of the block until one is outside quotes
+            quotes_after = 0
+            search_end = len(block)
+            newline = block.rfind(b'\n')
+            while newline != -1:
+                quotes_after += block.count(quote, newline, search_end)
+                search_end = newline
+                if not inside_at_end ^ (quotes_after % 2 == 1):
+                    last_end = position + newline + 1
+                    break
+                newline = block.rfind(b'\n', 0, newline)
+
+            inside_quotes = inside_at_end
+            position += len(block)
+
+    return last_end
+
+class ByteRangeFile(io.RawIOBase):
+    """
+    Read-only binary file limited to one byte range, so pandas can read the range in chunks.
+    """
+
+    def __init__(self, filename, start, end):
+        super().__init__()
+        self.file = open(filename, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        count = self.file.readinto(memoryview(buffer)[:size])
+        self.remaining -= count
+        return count
+
+    def close(self):
+        self.file.close()
+        super().close()
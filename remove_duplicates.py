@@ -1,10 +1,23 @@
 import os
+import tempfile
+import numpy as np
 import pandas as pd
+import chunk_pipeline
+import column_cache
+import compressed_csv
+import csv_dialect
+import key_digest
+import stage_timer
+
+# Settings for the streaming mode (used for files that do not fit into memory)
+CHUNK_SIZE = 100_000  # Number of rows read from the file at once.
+MAX_KEYS_IN_MEMORY = 5_000_000  # Distinct keys kept in memory before spilling to disk.
+SPILL_PARTITIONS = 64  # Number of on-disk partitions used after spilling.
 
 # Step 1: Display all CSV files in the current directory and create a list
 def list_csv_files(directory="."):
-    # Displays all CSV files in the specified directory.
-    csv_files = [file for file in os.listdir(directory) if file.lower().endswith(".csv")]
+    # Displays all CSV files (also compressed .csv.gz, .csv.bz2 and .csv.xz) in the specified directory.
+    csv_files = [file for file in os.listdir(directory) if compressed_csv.is_csv_file(file)]
     for idx, file in enumerate(csv_files):
         print(f"{idx + 1}: {file}")
     return csv_files
@@ -25,40 +38,100 @@ def select_csv_file(csv_files):
 
 # Step 3: Load the file with support for multiple delimiters
 def load_csv_with_varied_delimiters(file_path):
-    # Loads a CSV file with support for multiple delimiters (comma and semicolon).
-    delimiters = [',', ';']
-    for delimiter in delimiters:
-        try:
-            df = pd.read_csv(file_path, delimiter=delimiter)
-            print(f"File loaded with delimiter '{delimiter}'")
-            return df
-        except pd.errors.ParserError:
-            continue
-    raise ValueError("Failed to load the file with supported delimiters.")
-
-# Step 4: Display the list of columns and select a column
-def select_column(df):
-    # Displays column names and allows the user to select one.
+    # Loads a CSV file with the delimiter detected from the beginning of the file (comma, semicolon, tab or pipe).
+    dialect = csv_dialect.detect_dialect(file_path)
+    try:
+        df = column_cache.read_csv(file_path)  # Uses the columnar cache when it is turned on.
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise ValueError(f"Failed to load the file: {e}")
+    print(f"File loaded with delimiter '{dialect['delimiter']}'")
+    return df
+
+# Step 3b: Load only the beginning of the file (streaming mode)
+def peek_csv_with_varied_delimiters(file_path, nrows=0):
+    # Loads the header (or the first rows) of a CSV file and returns it together with the options for pandas.read_csv.
+    dialect = csv_dialect.detect_dialect(file_path)
+    read_options = csv_dialect.read_options(dialect)
+    try:
+        df = compressed_csv.read_csv(file_path, nrows=nrows, **read_options)
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise ValueError(f"Failed to load the file: {e}")
+    print(f"File loaded with delimiter '{dialect['delimiter']}'")
+    return df, read_options
+
+# Step 4: Display the list of columns and select the key columns
+def select_key_columns(df):
+    # Displays column names and allows the user to select one or more key columns, or whole rows (returns None).
     print("Available columns:")
     for idx, column in enumerate(df.columns):
         print(f"{idx + 1}: {column}")
+    answer = input("Enter the numbers of the columns to remove duplicates by (e.g. 2 or 1,3), "
+                   "or 'all' to compare whole rows: ").strip()
+    if answer.lower() == 'all':
+        return None
     try:
-        choice = int(input("Enter the number of the column to remove duplicates by: ")) - 1
-        if 0 <= choice < len(df.columns):
-            return df.columns[choice]
+        choices = [int(part) - 1 for part in answer.split(',')]
+        if all(0 <= choice < len(df.columns) for choice in choices):
+            return list(dict.fromkeys(df.columns[choice] for choice in choices))
         else:
             print("Invalid choice. Please try again.")
-            return select_column(df)
+            return select_key_columns(df)
     except ValueError:
-        print("Invalid input. Please enter a number.")
-        return select_column(df)
+        print("Invalid input. Please enter numbers separated by commas.")
+        return select_key_columns(df)
+
+def describe_key(key_columns):
+    # Describes the selected key for the messages.
+    return "whole rows" if key_columns is None else ", ".join(str(column) for column in key_columns)
+
+def uses_digests(key_columns):
+    # Several columns and whole rows are compared by digests of their values, a single column directly.
+    return key_columns is None or len(key_columns) > 1
+
+def ask_keep():
+    # Asks the user which occurrence of duplicate rows is kept.
+    answer = input("Keep the first or the last occurrence of duplicate rows? [F/l]: ")
+    return 'last' if answer.strip().lower() in ('l', 'last') else 'first'
+
+def ask_verify():
+    # Asks the user whether rows with the same digest are compared by their exact values.
+    answer = input("Verify rows with the same digest by their exact values (slower)? [y/N]: ")
+    return answer.strip().lower() in ('y', 'yes')
 
-# Step 5: Remove duplicates based on the selected column and display statistics
-def remove_duplicates_and_show_stats(df, column_name):
+# Step 5: Remove duplicates based on the selected columns and display statistics
+def remove_duplicates_and_show_stats(df, column_name, keep='first', verify=False):
     # Removes duplicate rows based on the selected column and displays statistics.
+    # column_name can also be a list of columns, or None to compare whole rows (see drop_duplicates_by_digest).
     initial_row_count = len(df)
-    df = df.drop_duplicates(subset=column_name)
+    if isinstance(column_name, list) and len(column_name) == 1:
+        column_name = column_name[0]
+    if column_name is None or isinstance(column_name, list):
+        df = drop_duplicates_by_digest(df, column_name, keep, verify)
+    else:
+        df = df.drop_duplicates(subset=column_name, keep=keep)
     final_row_count = len(df)
+    show_stats(initial_row_count, final_row_count)
+
+    return df
+
+def drop_duplicates_by_digest(df, columns=None, keep='first', verify=False):
+    # Removes duplicate rows by several columns or whole rows. The key of every row is reduced to a 64-bit
+    # (or 128-bit) digest, so only the digests are hashed and stored instead of wide tuples of strings.
+    # With verify, rows with the same digest are compared by their exact values as well.
+    table = key_digest.DigestTable(key_digest.digest_bits())
+    rows = np.arange(len(df))
+    high, low = key_digest.digest_keys(df, columns, table.bits)
+    slots, _ = table.add(high, low, rows)
+    verifier = None
+    if verify:
+        verifier = key_digest.DigestVerifier(table)
+        verifier.check(slots, rows, key_digest.key_tuples(df, columns))
+    kept = key_digest.keep_mask(table, slots, rows, keep, verifier)
+    show_digest_stats(table, verifier)
+    return df.iloc[np.flatnonzero(kept)]
+
+def show_stats(initial_row_count, final_row_count):
+    # Displays the number of rows before and after removing duplicates.
     removed_count = initial_row_count - final_row_count
 
     print(f"\nStatistics:")
@@ -66,7 +139,203 @@ def remove_duplicates_and_show_stats(df, column_name):
     print(f"Number of rows after removing duplicates: {final_row_count}")
     print(f"Number of duplicate rows removed: {removed_count}")
 
-    return df
+def show_digest_stats(table, verifier=None):
+    # Displays the size of the digest table and the result of the verification.
+    print(f"\nKey digests: {len(table)} distinct {table.bits}-bit digests in {table.nbytes / 1024 ** 2:.1f} MB")
+    if verifier is not None:
+        print(f"Digests shared by different values (kept by their exact values): {verifier.collisions}")
+
+# Step 5b: Remove duplicates while streaming the file in chunks (streaming mode)
+def read_csv_chunks(file_path, read_options, chunksize=CHUNK_SIZE, usecols=None):
+    # Reads the file in chunks; values are kept as text so rows are written back unchanged.
+    return compressed_csv.read_csv(file_path, dtype=str, keep_default_na=False, chunksize=chunksize,
+                                   usecols=usecols, **read_options)
+
+class StreamingDeduplicator:
+    """
+    Keeps the first row of every key chunk by chunk, only the already seen keys stay in memory.
+
+    Shared by remove_duplicates_streaming and the dedupe stage of csv_pipeline.py.
+    When more than max_keys distinct keys are seen, overflow is set, the later
+    chunks are ignored and the file has to be processed again with on-disk
+    partitions (see restart_partitioned).
+    """
+
+    def __init__(self, column_name, max_keys=MAX_KEYS_IN_MEMORY):
+        self.column_name = column_name
+        self.max_keys = max_keys
+        self.seen_keys = set()
+        self.initial_row_count = 0
+        self.final_row_count = 0
+        self.overflow = False
+
+    def process(self, chunk):
+        """
+        Returns the rows of a chunk whose keys were not seen before (None after an overflow).
+        """
+        if self.overflow:
+            return None
+        self.initial_row_count += len(chunk)
+
+        # First occurrence of each key inside the chunk, then drop keys seen in earlier chunks
+        keys = chunk[self.column_name]
+        unique_keys = keys[~keys.duplicated()]
+        is_new = np.fromiter((key not in self.seen_keys for key in unique_keys), dtype=bool,
+                             count=len(unique_keys))
+        new_keys = unique_keys[is_new]
+        self.seen_keys.update(new_keys)
+        if len(self.seen_keys) > self.max_keys:
+            # Too many distinct keys to keep in memory
+            self.overflow = True
+            self.seen_keys.clear()
+            return None
+
+        kept_rows = chunk.loc[new_keys.index]
+        self.final_row_count += len(kept_rows)
+        return kept_rows
+
+    def restart_partitioned(self, file_path, output_file, read_options=None, chunksize=CHUNK_SIZE):
+        """
+        Warns that the rows written so far are discarded and removes the duplicates of the
+        whole file again with on-disk partitions (after an overflow).
+
+        Returns:
+            tuple: Number of rows before and after removing the duplicates.
+        """
+        print(f"\nWarning: more than {self.max_keys} distinct keys found after {self.initial_row_count} rows. "
+              f"The {self.final_row_count} rows written so far are discarded and the whole file is processed "
+              "again with on-disk partitions.")
+        return remove_duplicates_partitioned(file_path, self.column_name, output_file, read_options, chunksize)
+
+def remove_duplicates_streaming(file_path, column_name, output_file, read_options=None,
+                                chunksize=CHUNK_SIZE, max_keys=MAX_KEYS_IN_MEMORY):
+    # Removes duplicate rows chunk by chunk and writes the kept rows straight to the output file.
+    # Only the set of already seen keys is kept in memory. When it grows above max_keys,
+    # the work is handed over to the partitioned (spill-to-disk) variant, which reads the file
+    # again and overwrites the rows written so far (a warning says so).
+    read_options = read_options or {}
+    deduplicator = StreamingDeduplicator(column_name, max_keys)
+
+    # The next chunks are parsed and the kept rows written by background threads (see chunk_pipeline.py)
+    with chunk_pipeline.ChunkWriter(output_file) as writer:
+        for chunk in chunk_pipeline.read_ahead(read_csv_chunks(file_path, read_options, chunksize)):
+            with stage_timer.stage('remove duplicates', len(chunk)):
+                kept_rows = deduplicator.process(chunk)
+            if kept_rows is None:
+                break
+            with stage_timer.stage('write', len(kept_rows)):
+                writer.write(kept_rows)
+        else:
+            show_stats(deduplicator.initial_row_count, deduplicator.final_row_count)
+            return deduplicator.initial_row_count, deduplicator.final_row_count
+
+    return deduplicator.restart_partitioned(file_path, output_file, read_options, chunksize)
+
+def remove_duplicates_partitioned(file_path, column_name, output_file, read_options=None,
+                                  chunksize=CHUNK_SIZE, partitions=SPILL_PARTITIONS):
+    # Removes duplicate rows using hash partitions of the key column stored on disk.
+    # Memory depends on the size of one partition and on the number of distinct keys.
+    read_options = read_options or {}
+    with tempfile.TemporaryDirectory(prefix="dedupe_") as temp_dir:
+        partition_files = [os.path.join(temp_dir, f"part_{i}.csv") for i in range(partitions)]
+
+        # Pass 1: split (row number, key) pairs into partitions by the hash of the key
+        initial_row_count = 0
+        with stage_timer.stage('partition keys') as partition_stage:
+            for chunk in read_csv_chunks(file_path, read_options, chunksize, usecols=[column_name]):
+                initial_row_count += len(chunk)
+                keys = chunk[column_name]
+                partition_ids = pd.util.hash_pandas_object(keys, index=False).to_numpy() % partitions
+                pairs = pd.DataFrame({'row': chunk.index, 'key': keys.to_numpy()})
+                for partition_id, part in pairs.groupby(partition_ids):
+                    path = partition_files[partition_id]
+                    part.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+            partition_stage.rows = initial_row_count
+
+        # Pass 2: all rows of one key are in the same partition, find its first occurrence
+        with stage_timer.stage('remove duplicates', initial_row_count):
+            kept_row_parts = []
+            for path in partition_files:
+                if not os.path.exists(path):
+                    continue
+                part = pd.read_csv(path, dtype={'row': np.int64, 'key': str}, keep_default_na=False)
+                kept_row_parts.append(part.loc[~part['key'].duplicated(), 'row'].to_numpy())
+            kept_rows = np.sort(np.concatenate(kept_row_parts)) if kept_row_parts else np.empty(0, dtype=np.int64)
+
+    # Pass 3: stream the file again and write only the kept rows
+    with stage_timer.stage('write', len(kept_rows)):
+        with chunk_pipeline.ChunkWriter(output_file) as writer:
+            for chunk in chunk_pipeline.read_ahead(read_csv_chunks(file_path, read_options, chunksize)):
+                start = chunk.index[0] if len(chunk) else 0
+                low, high = np.searchsorted(kept_rows, [start, start + len(chunk)])
+                writer.write(chunk.iloc[kept_rows[low:high] - start])
+
+    final_row_count = len(kept_rows)
+    show_stats(initial_row_count, final_row_count)
+    return initial_row_count, final_row_count
+
+def remove_duplicates_by_digest_streaming(file_path, columns, output_file, read_options=None, keep='first',
+                                          verify=False, chunksize=CHUNK_SIZE):
+    # Removes duplicate rows by several columns or whole rows (columns=None) while streaming the file in chunks.
+    # Only the digests of the keys are kept in memory (see key_digest.py). Keeping the first rows without
+    # verification needs one pass; otherwise the keys are digested (and verified) first and the file
+    # is read again to write the kept rows.
+    read_options = read_options or {}
+    table = key_digest.DigestTable(key_digest.digest_bits())
+    verifier = None
+    initial_row_count = 0
+    final_row_count = 0
+
+    if keep == 'first' and not verify:
+        with chunk_pipeline.ChunkWriter(output_file) as writer:
+            for chunk in chunk_pipeline.read_ahead(read_csv_chunks(file_path, read_options, chunksize)):
+                initial_row_count += len(chunk)
+                with stage_timer.stage('remove duplicates', len(chunk)):
+                    high, low = key_digest.digest_keys(chunk, columns, table.bits)
+                    _, is_new = table.add(high, low, chunk.index.to_numpy())
+                    kept_rows = chunk[is_new]
+                with stage_timer.stage('write', len(kept_rows)):
+                    writer.write(kept_rows)
+                final_row_count += len(kept_rows)
+        show_digest_stats(table)
+        show_stats(initial_row_count, final_row_count)
+        return initial_row_count, final_row_count
+
+    # Pass 1: the first and the last row of every digest
+    with stage_timer.stage('digest keys') as digest_stage:
+        for chunk in read_csv_chunks(file_path, read_options, chunksize, usecols=columns):
+            initial_row_count += len(chunk)
+            high, low = key_digest.digest_keys(chunk, columns, table.bits)
+            table.add(high, low, chunk.index.to_numpy())
+        digest_stage.rows = initial_row_count
+
+    # Pass 2: compare the exact keys of the rows that share a digest
+    if verify:
+        verifier = key_digest.DigestVerifier(table)
+        with stage_timer.stage('verify keys', initial_row_count):
+            for chunk in read_csv_chunks(file_path, read_options, chunksize, usecols=columns):
+                high, low = key_digest.digest_keys(chunk, columns, table.bits)
+                verifier.check(table.find(high, low), chunk.index.to_numpy(), key_digest.key_tuples(chunk, columns))
+
+    # Pass 3: stream the file again and write only the kept rows
+    with chunk_pipeline.ChunkWriter(output_file) as writer:
+        for chunk in chunk_pipeline.read_ahead(read_csv_chunks(file_path, read_options, chunksize)):
+            with stage_timer.stage('remove duplicates', len(chunk)):
+                high, low = key_digest.digest_keys(chunk, columns, table.bits)
+                kept = key_digest.keep_mask(table, table.find(high, low), chunk.index.to_numpy(), keep, verifier)
+                kept_rows = chunk[kept]
+            with stage_timer.stage('write', len(kept_rows)):
+                writer.write(kept_rows)
+            final_row_count += len(kept_rows)
+
+    show_digest_stats(table, verifier)
+    show_stats(initial_row_count, final_row_count)
+    return initial_row_count, final_row_count
+
+def ask_streaming_mode():
+    # Asks the user whether the file should be processed in streaming mode.
+    answer = input("Process the file in streaming mode (for files larger than memory)? [y/N]: ")
+    return answer.strip().lower() in ('y', 'yes')
 
 # Main part of the script
 def main():
@@ -82,23 +351,57 @@ def main():
     selected_file = select_csv_file(csv_files)
     print(f"\nOpened file: {selected_file}")
 
+    # Compressed when CSV_TOOLKIT_COMPRESS asks for it (e.g. cleaned_data.csv.gz)
+    output_file = compressed_csv.output_filename(f"cleaned_{selected_file}")
+
+    # Very large files can be processed in chunks without loading them whole
+    if ask_streaming_mode():
+        try:
+            with stage_timer.stage('load header'):
+                sample, read_options = peek_csv_with_varied_delimiters(selected_file)
+        except ValueError as e:
+            print(e)
+            return
+
+        key_columns = select_key_columns(sample)
+        keep = ask_keep()
+        # One column is deduplicated by its exact values when the first rows are kept, otherwise by digests
+        by_digest = uses_digests(key_columns) or keep == 'last'
+        verify = ask_verify() if by_digest else False
+        print(f"\nSelected key for removing duplicates: {describe_key(key_columns)} (keeping the {keep} rows)")
+
+        with stage_timer.stage('streaming total') as total_stage:
+            if by_digest:
+                total_stage.rows, _ = remove_duplicates_by_digest_streaming(selected_file, key_columns, output_file,
+                                                                            read_options, keep, verify)
+            else:
+                total_stage.rows, _ = remove_duplicates_streaming(selected_file, key_columns[0], output_file,
+                                                                  read_options)
+        print(f"\nThe cleaned file has been saved as '{output_file}'")
+        return
+
     # 3. Load the file with support for multiple delimiters
     try:
-        df = load_csv_with_varied_delimiters(selected_file)
+        with stage_timer.stage('load') as load_stage:
+            df = load_csv_with_varied_delimiters(selected_file)
+            load_stage.rows = len(df)
     except ValueError as e:
         print(e)
         return
 
-    # 4. Display the list of columns and select a column
-    selected_column = select_column(df)
-    print(f"\nSelected column for removing duplicates: {selected_column}")
+    # 4. Display the list of columns and select the key columns
+    key_columns = select_key_columns(df)
+    keep = ask_keep()
+    verify = ask_verify() if uses_digests(key_columns) else False
+    print(f"\nSelected key for removing duplicates: {describe_key(key_columns)} (keeping the {keep} rows)")
 
     # 5. Remove duplicates and display statistics
-    df = remove_duplicates_and_show_stats(df, selected_column)
+    with stage_timer.stage('remove duplicates', len(df)):
+        df = remove_duplicates_and_show_stats(df, key_columns, keep, verify)
 
     # 6. Save the cleaned DataFrame to a new file
-    output_file = f"cleaned_{selected_file}"
-    df.to_csv(output_file, index=False)
+    with stage_timer.stage('write', len(df)):
+        chunk_pipeline.write_csv(df, output_file)
     print(f"\nThe cleaned file has been saved as '{output_file}'")
 
 if __name__ == "__main__":
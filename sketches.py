@@ -0,0 +1,157 @@
+import heapq
+import math
+
+import numpy as np
+import pandas as pd
+
+def hash_values(values):
+    """
+    Returns 64-bit hashes of values (the same value always gets the same hash).
+
+    Args:
+        values (pandas.Series or pandas.Index): The values to hash.
+
+    Returns:
+        numpy.ndarray: The hashes as uint64.
+    """
+    return np.asarray(pd.util.hash_pandas_object(values, index=False), dtype=np.uint64)
+
+def bit_length(values):
+    """
+    Returns the number of significant bits of every uint64 value (0 for zero).
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # Values below 2**32 are exact in float64, so log2 does not round up to the next bit
+    with np.errstate(divide='ignore'):
+        high_bits = np.where(high > 0, np.floor(np.log2(high)) + 33, 0)
+        low_bits = np.where(low > 0, np.floor(np.log2(low)) + 1, 0)
+    return np.where(high_bits > 0, high_bits, low_bits).astype(np.int64)
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values in fixed memory (2 ** precision bytes).
+
+    The relative standard error of the estimate is 1.04 / sqrt(2 ** precision),
+    e.g. 0.81 % for the default precision 14 (16 KB of registers).
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """
+        Adds 64-bit hashes of values (duplicates do not change the estimate).
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        remaining_bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(remaining_bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << remaining_bits) - 1)
+        # Position of the first 1 bit in the remaining bits (remaining_bits + 1 when they are all zero)
+        ranks = (remaining_bits - bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other):
+        """
+        Adds the values of another sketch with the same precision.
+        """
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        """
+        Returns the estimated number of distinct values.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return m * math.log(m / zeros)
+        return raw
+
+    def relative_error(self):
+        """
+        Returns the relative standard error of the estimate.
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+class CountMinSketch:
+    """
+    Estimates how often values occur in fixed memory (width * depth counters).
+
+    An estimate is never lower than the true count. With the probability
+    1 - delta it is higher by at most epsilon * N, where N is the number of
+    added values, epsilon = e / width and delta = exp(-depth).
+    """
+
+    def __init__(self, epsilon=1e-5, delta=0.01):
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    def columns(self, hashes):
+        """
+        Returns the counter of every row for the hashes (double hashing of the two 32-bit halves).
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = hashes >> np.uint64(32)
+        width = np.uint64(self.width)
+        return [((low + np.uint64(row) * high) % width).astype(np.int64) for row in range(self.depth)]
+
+    def add_hashes(self, hashes, counts):
+        """
+        Adds the counts of values given by their hashes.
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        for row, columns in enumerate(self.columns(hashes)):
+            self.table[row] += np.bincount(columns, weights=counts, minlength=self.width).astype(np.int64)
+        self.total += int(counts.sum())
+
+    def estimate_hashes(self, hashes):
+        """
+        Returns the estimated counts of values given by their hashes.
+        """
+        estimates = [self.table[row][columns] for row, columns in enumerate(self.columns(hashes))]
+        return np.min(estimates, axis=0) if estimates else np.zeros(len(hashes), dtype=np.int64)
+
+    def error_bound(self):
+        """
+        Returns the largest overestimate (epsilon * N) and the probability it holds with.
+        """
+        return math.e / self.width * self.total, 1 - math.exp(-self.depth)
+
+class TopK:
+    """
+    Keeps the k values with the highest Count-Min estimates in a heap.
+    """
+
+    def __init__(self, k, sketch):
+        self.k = k
+        self.sketch = sketch
+        self.candidates = {}
+
+    def update(self, values, hashes):
+        """
+        Offers values that were just added to the sketch (each value once).
+        """
+        estimates = self.sketch.estimate_hashes(hashes)
+        if len(self.candidates) >= self.k:
+            # Only values above the smallest kept estimate can enter the heap
+            threshold = min(self.candidates.values())
+            keep = estimates > threshold
+            values, estimates = np.asarray(values, dtype=object)[keep], estimates[keep]
+        for value, estimate in zip(values, estimates.tolist()):
+            self.candidates[value] = estimate
+        # Estimates of kept values that were not offered again have not changed
+        self.candidates = dict(heapq.nlargest(self.k, self.candidates.items(), key=lambda item: item[1]))
+
+    def items(self):
+        """
+        Returns (value, estimated count) pairs, the most frequent first.
+        """
+        return sorted(self.candidates.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,218 @@
+import atexit
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Environment variable that turns the instrumentation on (e.g. CSV_TOOLKIT_PROFILE=1)
+ENABLE_VARIABLE = 'CSV_TOOLKIT_PROFILE'
+# Command line flag that turns the instrumentation on
+ENABLE_FLAG = '--profile'
+# Environment variable with the file name of the JSON trace (no trace when not set)
+TRACE_VARIABLE = 'CSV_TOOLKIT_TRACE'
+# Environment variable that measures the memory allocated by Python and NumPy (tracemalloc)
+# instead of the resident memory of the process; tracing every allocation slows the stages down
+TRACEMALLOC_VARIABLE = 'CSV_TOOLKIT_TRACEMALLOC'
+
+class Stage:
+    """
+    Measures one stage of a script: elapsed time, processed rows and peak memory.
+
+    Used as a context manager, the number of rows can be set inside the block
+    (e.g. stage.rows = len(df)). Stages can be nested. The memory is the
+    resident memory of the process (Linux only, see memory_usage), or the
+    memory traced by tracemalloc when it is turned on.
+    """
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.seconds = 0.0
+        self.start_bytes = 0
+        self.peak_bytes = 0
+
+    def __enter__(self):
+        current, peak = memory_usage()
+        if _open_stages:
+            # Keeps the peak of the enclosing stage before the peak is reset for this one
+            parent = _open_stages[-1]
+            parent.peak_bytes = max(parent.peak_bytes, peak)
+        reset_peak()
+        self.start_bytes = current
+        _open_stages.append(self)
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self._start_time
+        self.peak_bytes = max(self.peak_bytes, memory_usage()[1])
+        _open_stages.pop()
+        if _open_stages:
+            parent = _open_stages[-1]
+            parent.peak_bytes = max(parent.peak_bytes, self.peak_bytes)
+        _finished_stages.append(self)
+        return False
+
+class NullStage:
+    """
+    Stand-in for Stage when the instrumentation is off, it does nothing.
+    """
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_STAGE = NullStage()
+
+_open_stages = []
+_finished_stages = []
+
+def is_enabled():
+    """
+    Checks whether the instrumentation is turned on by the environment variable or the --profile flag.
+
+    Scripts that parse their own arguments call enable() instead.
+    """
+    if ENABLE_FLAG in sys.argv[1:]:
+        return True
+    return is_set(ENABLE_VARIABLE)
+
+def is_set(variable):
+    """
+    Checks whether an environment variable turns an option on.
+    """
+    return os.environ.get(variable, '').strip().lower() not in ('', '0', 'no', 'false')
+
+ENABLED = False
+TRACE_PYTHON_MEMORY = False
+
+def enable():
+    """
+    Turns the instrumentation on (e.g. for a parsed --profile flag), the summary is printed when the script ends.
+    """
+    global ENABLED, TRACE_PYTHON_MEMORY
+    if ENABLED:
+        return
+    ENABLED = True
+    TRACE_PYTHON_MEMORY = is_set(TRACEMALLOC_VARIABLE)
+    if TRACE_PYTHON_MEMORY:
+        tracemalloc.start()
+    atexit.register(report)
+
+def memory_usage():
+    """
+    Returns the current and the peak memory in bytes.
+
+    The resident memory of the process is read from /proc/self/status (VmRSS
+    and VmHWM, zero where it does not exist), or the memory allocated by
+    Python and NumPy when tracemalloc is turned on.
+    """
+    if TRACE_PYTHON_MEMORY:
+        return tracemalloc.get_traced_memory()
+    current = peak = 0
+    try:
+        with open('/proc/self/status', encoding='ascii') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    current = int(line.split()[1]) * 1024
+                elif line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return current, peak
+
+def reset_peak():
+    """
+    Resets the peak memory to the current memory (the start of a stage).
+    """
+    if TRACE_PYTHON_MEMORY:
+        tracemalloc.reset_peak()
+        return
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+def stage(name, rows=None):
+    """
+    Returns a context manager measuring one stage (a shared no-op when the instrumentation is off).
+
+    Args:
+        name (str): Name of the stage, stages with the same name are summed in the summary.
+        rows (int, optional): Number of processed rows, can also be set inside the block.
+
+    Returns:
+        Stage: The measured stage (NULL_STAGE when turned off).
+    """
+    if not ENABLED:
+        return NULL_STAGE
+    return Stage(name, rows)
+
+def summarize(stages):
+    """
+    Sums the stages with the same name, in the order they first finished.
+
+    Returns:
+        list: One dictionary per stage name.
+    """
+    summary = {}
+    for finished in stages:
+        entry = summary.setdefault(finished.name, {'stage': finished.name, 'calls': 0, 'seconds': 0.0,
+                                                   'rows': None, 'peak_mb': 0.0})
+        entry['calls'] += 1
+        entry['seconds'] += finished.seconds
+        if finished.rows is not None:
+            entry['rows'] = (entry['rows'] or 0) + int(finished.rows)
+        entry['peak_mb'] = max(entry['peak_mb'], finished.peak_bytes / (1024 * 1024))
+    return list(summary.values())
+
+def print_summary(stages=None):
+    """
+    Prints a table with the time, rows, throughput and peak memory of every stage.
+    """
+    summary = summarize(_finished_stages if stages is None else stages)
+    if not summary:
+        return
+    print("\nStage timings:")
+    print(f"{'Stage':<28} {'Calls':>6} {'Seconds':>10} {'Rows':>12} {'Rows/s':>14} {'Peak MB':>9}")
+    for entry in summary:
+        rows = f"{entry['rows']:,}" if entry['rows'] is not None else '-'
+        if entry['rows'] is not None and entry['seconds'] > 0:
+            speed = f"{entry['rows'] / entry['seconds']:,.0f}"
+        else:
+            speed = '-'
+        print(f"{entry['stage']:<28} {entry['calls']:>6} {entry['seconds']:>10.3f} {rows:>12} {speed:>14} "
+              f"{entry['peak_mb']:>9.1f}")
+
+def write_trace(filename, stages=None):
+    """
+    Writes every finished stage to a JSON file (in the order they finished).
+    """
+    stages = _finished_stages if stages is None else stages
+    trace = {
+        'script': os.path.basename(sys.argv[0]),
+        'stages': [{'stage': finished.name, 'seconds': finished.seconds, 'rows': finished.rows,
+                    'start_mb': finished.start_bytes / (1024 * 1024),
+                    'peak_mb': finished.peak_bytes / (1024 * 1024)} for finished in stages],
+        'summary': summarize(stages),
+    }
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump(trace, file, indent=2)
+    print(f"Stage trace saved to '{filename}'.")
+
+def report():
+    """
+    Prints the summary and writes the trace when the script ends.
+    """
+    print_summary()
+    trace_file = os.environ.get(TRACE_VARIABLE)
+    if trace_file and _finished_stages:
+        write_trace(trace_file)
+
+if is_enabled():
+    enable()
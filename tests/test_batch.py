@@ -0,0 +1,40 @@
+import gzip
+
+import csv_batch
+
+OPTIONS = {'dedupe': 'id', 'missing': False, 'count': None, 'sum': None, 'chunksize': 1000}
+
+def test_files_differing_in_compression_get_own_output_dirs(tmp_path, capsys):
+    source = tmp_path / 'in'
+    source.mkdir()
+    (source / 'data.csv').write_text('id,v\n1,2\n1,3\n2,4\n')
+    with gzip.open(source / 'data.csv.gz', 'wt') as file:
+        file.write('id,v\n5,6\n')
+    output = tmp_path / 'out'
+
+    results = csv_batch.run_batch(str(source), OPTIONS, str(output), 2, None)
+
+    assert [result['status'] for result in results] == ['ok', 'ok']
+    assert (output / 'data' / 'cleaned_data.csv').read_text() == 'id,v\n1,2\n2,4\n'
+    assert (output / 'data.csv.gz' / 'cleaned_data.csv').read_text() == 'id,v\n5,6\n'
+
+def test_failed_file_does_not_stop_the_batch(tmp_path, capsys):
+    source = tmp_path / 'in'
+    source.mkdir()
+    (source / 'a.csv').write_text('id,v\n1,2\n')
+    (source / 'b.csv').write_text('id,v\n3,4\n')
+    output = tmp_path / 'out'
+    output.mkdir()
+    (output / 'a').write_text('not a directory')  # The worker cannot create the output directory
+
+    results = csv_batch.run_batch(str(source), OPTIONS, str(output), 2, None)
+
+    assert results[0]['file'] == 'a.csv' and results[0]['status'].startswith('error')
+    assert results[1]['status'] == 'ok'
+
+def test_output_dir_names_are_distinct():
+    paths = ['in/x.csv', 'in/X.csv.gz', 'in/x.csv.gz', 'in/x.csv.bz2']
+    names = csv_batch.output_dir_names(paths)
+    # Names that differ only in letter case are the same directory on some file systems
+    assert names == {'in/x.csv': 'x', 'in/X.csv.gz': 'X.csv.gz', 'in/x.csv.gz': 'x.csv.gz_2',
+                     'in/x.csv.bz2': 'x.csv.bz2'}
@@ -0,0 +1,87 @@
+import gzip
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import chunk_pipeline
+
+DATA = pd.DataFrame({'key': [f"k{i % 13}" for i in range(1000)], 'text': [f"a, \"b\" {i}" for i in range(1000)],
+                     'amount': [i / 4 for i in range(1000)]})
+
+def pipeline_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "read ahead" or thread.name.startswith("write ")]
+
+def chunks_of(df, rows, log=None, fail_at=None):
+    # A reader that records how far it got and whether it was closed
+    try:
+        for number, start in enumerate(range(0, len(df), rows)):
+            if number == fail_at:
+                raise ValueError("broken chunk")
+            if log is not None:
+                log.append(number)
+            yield df.iloc[start:start + rows]
+    finally:
+        if log is not None:
+            log.append('closed')
+
+def test_read_ahead_keeps_the_order():
+    chunks = list(chunk_pipeline.read_ahead(chunks_of(DATA, 70), queue_chunks=1))
+    assert len(chunks) == 15
+    pd.testing.assert_frame_equal(pd.concat(chunks), DATA)
+    assert not pipeline_threads()
+
+def test_read_ahead_passes_errors_to_the_consumer():
+    log = []
+    received = []
+    with pytest.raises(ValueError, match="broken chunk"):
+        for chunk in chunk_pipeline.read_ahead(chunks_of(DATA, 100, log, fail_at=4)):
+            received.append(chunk)
+    assert len(received) == 4 and log[-1] == 'closed'
+    assert not pipeline_threads()
+
+def test_leaving_read_ahead_early_closes_the_reader():
+    log = []
+    for chunk in chunk_pipeline.read_ahead(chunks_of(DATA, 10, log), queue_chunks=2):
+        break
+    # Only the queued chunks were read ahead
+    assert log[-1] == 'closed' and len(log) <= 5
+    assert not pipeline_threads()
+
+@pytest.mark.parametrize('filename', ['out.csv', 'out.csv.gz'])
+def test_chunk_writer_writes_the_whole_file(tmp_path, filename):
+    path = str(tmp_path / filename)
+    with chunk_pipeline.ChunkWriter(path, queue_chunks=1, block_size=500) as writer:
+        for chunk in chunks_of(DATA, 90):
+            writer.write(chunk)
+    assert writer.rows == len(DATA)
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(path, 'rt', newline='') as file:
+        assert file.read() == DATA.to_csv(index=False)
+    assert not pipeline_threads()
+
+@pytest.mark.parametrize('df, index', [(DATA, False), (DATA, True), (DATA.iloc[:0], False)],
+                         ids=['rows', 'index', 'empty'])
+def test_write_csv_matches_to_csv(tmp_path, df, index):
+    path = tmp_path / 'out.csv'
+    chunk_pipeline.write_csv(df, str(path), index=index, slice_rows=300)
+    with open(path, newline='') as file:
+        assert file.read() == df.to_csv(index=index)
+
+def test_error_in_the_with_block_stops_the_writer(tmp_path):
+    path = tmp_path / 'out.csv'
+    with pytest.raises(KeyError):
+        with chunk_pipeline.ChunkWriter(str(path)) as writer:
+            writer.write(DATA)
+            raise KeyError('transform failed')
+    assert writer.output.closed
+    assert not pipeline_threads()
+
+@pytest.mark.skipif(not os.path.exists('/dev/full'), reason="needs /dev/full")
+def test_write_error_reaches_the_caller():
+    with pytest.raises(OSError):
+        with chunk_pipeline.ChunkWriter('/dev/full', block_size=100) as writer:
+            for chunk in chunks_of(DATA, 10):
+                writer.write(chunk)
+    assert not pipeline_threads()
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregate_csv_sum
+
+# Numbers, text, decimal commas, spaces, missing values and values the Python pattern treats specially
+MIXED_VALUES = [5, 1.5, -2, True, 1e20, 1e-05, 'a', None, np.nan, '', ' ', '-', '1 000,5', '-3,25', ' - 4', '0,0',
+                '1,000,5', '1.000,5', '+5', '.5', '5.', '1e5', 'inf', 'nan', '12\n3', '5\n', '٣', '٣,5',
+                '1' * 400, '007', 'x1', '1,5 kg']
+
+def expected(values):
+    # The result of clean_numeric value by value
+    return np.array([np.nan if number is None else number
+                     for number, _ in map(aggregate_csv_sum.clean_numeric, values)], dtype=np.float64)
+
+@pytest.mark.parametrize('dtype', [object, 'str', 'float64'], ids=['object', 'arrow', 'float'])
+def test_clean_numeric_column_matches_clean_numeric(dtype):
+    if dtype == 'float64':
+        values = pd.Series([5, 1.5, -2, 1e20, 1e-05, 1e-4, np.nan, 0.1 + 0.2, np.inf], dtype=dtype)
+    else:
+        values = pd.Series(MIXED_VALUES, dtype=dtype)
+    values.index += 10
+    cleaned, invalid_mask = aggregate_csv_sum.clean_numeric_column(values)
+    np.testing.assert_array_equal(cleaned.to_numpy(), expected(values))
+    assert list(cleaned.index) == list(values.index)
+    assert invalid_mask.tolist() == np.isnan(expected(values)).tolist()
+
+def test_clean_numeric_column_many_distinct_values():
+    rng = np.random.default_rng(0)
+    values = pd.Series([f"{whole} {part:03d},{cents:02d}" if whole else f"x{cents}"
+                        for whole, part, cents in zip(rng.integers(0, 1000, 20_000), rng.integers(0, 1000, 20_000),
+                                                      rng.integers(0, 100, 20_000))], dtype=object)
+    cleaned, _ = aggregate_csv_sum.clean_numeric_column(values)
+    np.testing.assert_array_equal(cleaned.to_numpy(), expected(values))
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import column_cache
+import csv_dialect
+
+ROWS = 400
+DATA = pd.DataFrame({
+    'id': [f"{i:05d}" for i in range(ROWS)],
+    'group': [['north', 'south', 'east', ''][i % 4] for i in range(ROWS)],
+    'qty': [str(i % 9) if i % 50 else '' for i in range(ROWS)],
+    'price': [f"{i / 8:.2f}" for i in range(ROWS)],
+})
+
+@pytest.fixture
+def cached_file(tmp_path, monkeypatch):
+    monkeypatch.setenv(column_cache.ENABLE_VARIABLE, '1')
+    path = tmp_path / 'data.csv'
+    DATA.to_csv(path, index=False)
+    return str(path)
+
+def as_values(df):
+    # Compares the values whatever the dtype of the columns is
+    return {name: values.astype(object).where(values.notna(), None).tolist() for name, values in df.items()}
+
+@pytest.mark.parametrize('read_options', [{}, {'dtype': str}], ids=['inferred', 'text'])
+def test_cached_loads_match_direct_reads(cached_file, read_options):
+    expected = as_values(csv_dialect.read_csv(cached_file, **read_options))
+    assert as_values(column_cache.read_csv(cached_file, **read_options)) == expected
+    assert as_values(column_cache.read_csv(cached_file, **read_options)) == expected
+
+def test_text_and_typed_readers_share_one_entry(cached_file):
+    typed = column_cache.read_csv(cached_file)
+    text = column_cache.read_csv(cached_file, dtype=str)
+    assert len(os.listdir(os.path.join(os.path.dirname(cached_file), column_cache.CACHE_DIRNAME))) == 1
+    assert typed['id'].iloc[7] == 7 and text['id'].iloc[7] == '00007'
+    assert typed['qty'].dtype == 'float64'
+    mixed = column_cache.read_csv(cached_file, columns=['id', 'qty'], dtype={'id': str})
+    assert list(mixed.columns) == ['id', 'qty']
+    assert mixed['id'].iloc[7] == '00007' and mixed['qty'].dtype == 'float64'
+
+def test_text_columns_are_not_python_strings(cached_file):
+    column_cache.read_csv(cached_file, dtype=str)
+    text = column_cache.read_csv(cached_file, dtype=str)
+    # Few distinct values: categorical over the memory-mapped codes
+    assert isinstance(text['group'].dtype, pd.CategoricalDtype)
+    assert isinstance(text['group'].array.codes, np.memmap)
+    assert list(text['group'].cat.categories) == ['east', 'north', 'south']
+    # Distinct values: Arrow strings
+    assert text['id'].dtype != object
+    assert text['id'].dtype.storage == 'pyarrow'
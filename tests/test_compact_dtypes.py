@@ -0,0 +1,78 @@
+import io
+import contextlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregate_csv_sum
+import compact_dtypes
+import find_missing_values
+import merge_two_csvs_by_column as merge
+import remove_duplicates
+
+ROWS = 600
+CSV_TEXT = pd.DataFrame({
+    'id': [f"id{i}" for i in range(ROWS)],
+    'group': [['north', 'south', None, ' '][i % 4] for i in range(ROWS)],
+    'qty': [i % 90 for i in range(ROWS)],
+    'price': [f"{i % 70},5" if i % 9 else 'n/a' for i in range(ROWS)],
+    'rate': [i / 8 for i in range(ROWS)],
+}).to_csv(index=False)
+
+@pytest.fixture
+def data():
+    return pd.read_csv(io.StringIO(CSV_TEXT))
+
+def test_compact_keeps_the_values(data, capsys):
+    result = compact_dtypes.compact(data)
+    assert isinstance(result['group'].dtype, pd.CategoricalDtype)
+    assert isinstance(result['price'].dtype, pd.CategoricalDtype)
+    assert result['id'].dtype == compact_dtypes.arrow_string_dtype()
+    assert result['qty'].dtype == np.int8
+    assert result['rate'].dtype == np.float64
+    assert result.to_csv(index=False) == data.to_csv(index=False)
+    assert result.memory_usage(deep=True).sum() < data.memory_usage(deep=True).sum()
+    assert "Compact dtypes:" in capsys.readouterr().out
+
+def test_mixed_and_empty_columns_are_kept():
+    data = pd.DataFrame({'mixed': pd.Series(['a', 1, None] * 4, dtype=object), 'empty': [np.nan] * 12,
+                         'large': [2 ** 40, 0, 1] * 4})
+    result = compact_dtypes.compact(data, verbose=False)
+    assert result['mixed'].dtype == object and result['mixed'].tolist() == data['mixed'].tolist()
+    assert result['empty'].dtype == np.float64
+    assert result['large'].dtype == np.int64
+
+def test_compact_text_frame_gives_the_same_missing_values(data):
+    text = pd.read_csv(io.StringIO(CSV_TEXT), dtype=str)
+    assert (find_missing_values.scan_missing_values(compact_dtypes.compact(text, verbose=False))
+            == find_missing_values.scan_missing_values(text))
+
+def test_compact_frame_gives_the_same_sums(data):
+    compact = compact_dtypes.compact(data, verbose=False)
+    expected, expected_invalid = aggregate_csv_sum.clean_numeric_column(data['price'])
+    cleaned, invalid = aggregate_csv_sum.clean_numeric_column(compact['price'])
+    pd.testing.assert_series_equal(cleaned, expected)
+    pd.testing.assert_series_equal(invalid, expected_invalid)
+    sums = cleaned.groupby(compact['group'], observed=True).sum()
+    pd.testing.assert_series_equal(sums, expected.groupby(data['group']).sum(), check_index_type=False,
+                                   check_categorical=False)
+
+@pytest.mark.parametrize('key', ['group', ['group', 'qty'], None])
+def test_compact_frame_gives_the_same_deduplicated_rows(data, key):
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = remove_duplicates.remove_duplicates_and_show_stats(data, key)
+        result = remove_duplicates.remove_duplicates_and_show_stats(compact_dtypes.compact(data), key)
+    assert result.to_csv(index=False) == expected.to_csv(index=False)
+
+def test_compact_loads_give_the_same_merge(tmp_path, monkeypatch):
+    left = tmp_path / 'left.csv'
+    right = tmp_path / 'right.csv'
+    left.write_text(CSV_TEXT)
+    right.write_text("group,city\nnorth,Prague\nsouth,&amp;Brno\nsouth,Plzen\n")
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        expected = merge.merge_files(str(left), str(right), 'group').to_csv(index=False)
+        monkeypatch.setenv(compact_dtypes.ENABLE_VARIABLE, '1')
+        result = merge.merge_files(str(left), str(right), 'group')
+        assert 'Compact dtypes:' in output.getvalue()
+    assert result.to_csv(index=False) == expected
@@ -0,0 +1,94 @@
+import gzip
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import compressed_csv
+import csv_dialect
+import csv_pipeline
+
+ROWS = 5000
+DATA = pd.DataFrame({
+    'key': [f"k{i % 37}" for i in range(ROWS)],
+    'name': [f"name;{i}" if i % 5 else '' for i in range(ROWS)],
+    'amount': [i * 0.25 for i in range(ROWS)],
+})
+
+@pytest.fixture(params=['.gz', '.bz2', '.xz'])
+def compressed_file(request, tmp_path):
+    # The same semicolon separated data, plain and compressed
+    plain = tmp_path / 'data.csv'
+    DATA.to_csv(plain, sep=';', index=False)
+    compressed = tmp_path / f'data.csv{request.param}'
+    with compressed_csv.OPENERS[request.param](compressed, 'wb') as file:
+        file.write(plain.read_bytes())
+    return str(plain), str(compressed)
+
+def decompress_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('decompress ')]
+
+def wait_for_threads():
+    # The decompression thread notices a closed reader within its put timeout
+    deadline = time.monotonic() + 5
+    while decompress_threads() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return decompress_threads()
+
+def test_file_names():
+    assert compressed_csv.is_csv_file('DATA.CSV.GZ') and not compressed_csv.is_csv_file('data.gz')
+    assert compressed_csv.compression('data.csv.XZ') == '.xz' and compressed_csv.compression('data.csv') is None
+    assert compressed_csv.strip_extension('data.csv.bz2') == 'data'
+    assert compressed_csv.strip_extension('data.txt') == 'data.txt'
+
+def test_compressed_reads_match_plain_reads(compressed_file):
+    plain, compressed = compressed_file
+    assert csv_dialect.detect_dialect(compressed)['delimiter'] == ';'
+    expected = csv_dialect.read_csv(plain)
+    pd.testing.assert_frame_equal(csv_dialect.read_csv(compressed), expected)
+    chunks = list(csv_dialect.read_csv(compressed, chunksize=700))
+    assert len(chunks) == 8
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+    assert not wait_for_threads()
+
+def test_reader_with_small_blocks_and_early_close(compressed_file):
+    plain, compressed = compressed_file
+    with open(plain, 'rb') as file:
+        expected = file.read()
+    with compressed_csv.DecompressingReader(compressed, block_size=1000, queue_blocks=2) as reader:
+        assert reader.read() == expected
+    # Closing the reader before the end of the file stops the decompression
+    reader = compressed_csv.DecompressingReader(compressed, block_size=100, queue_blocks=2)
+    assert reader.read(50) == expected[:50]
+    reader.close()
+    assert not wait_for_threads()
+
+def test_decompression_error_reaches_the_reader(tmp_path):
+    path = tmp_path / 'broken.csv.gz'
+    data = DATA.to_csv(index=False).encode('utf-8')
+    path.write_bytes(gzip.compress(data)[:-100])
+    with pytest.raises(EOFError):
+        compressed_csv.read_csv(str(path))
+
+@pytest.mark.parametrize('value, extension', [('', ''), ('gzip', '.gz'), ('.bz2', '.bz2'), ('XZ', '.xz'), ('zip', '')])
+def test_output_filename_follows_the_environment(monkeypatch, value, extension):
+    monkeypatch.setenv(compressed_csv.COMPRESS_VARIABLE, value)
+    assert compressed_csv.output_filename('export.csv') == 'export.csv' + extension
+    # The compression of the input name is not taken over
+    assert compressed_csv.output_filename('cleaned_data.csv.gz') == 'cleaned_data.csv' + extension
+
+@pytest.mark.parametrize('extension', ['', '.gz', '.bz2', '.xz'])
+def test_compressed_writes_round_trip(tmp_path, extension):
+    path = str(tmp_path / f'out.csv{extension}')
+    compressed_csv.to_csv(DATA, path, index=False)
+    with compressed_csv.open_binary(path) as file:
+        assert file.read() == DATA.to_csv(index=False).encode('utf-8')
+
+def test_pipeline_reads_and_writes_compressed_files(compressed_file, tmp_path, monkeypatch, capsys):
+    plain, compressed = compressed_file
+    assert csv_pipeline.main([plain, '--count', 'key', '--output-dir', str(tmp_path / 'plain')]) == 0
+    monkeypatch.setenv(compressed_csv.COMPRESS_VARIABLE, 'gz')
+    assert csv_pipeline.main([compressed, '--count', 'key', '--output-dir', str(tmp_path / 'compressed')]) == 0
+    with gzip.open(tmp_path / 'compressed' / 'export.csv.gz', 'rb') as file:
+        assert file.read() == (tmp_path / 'plain' / 'export.csv').read_bytes()
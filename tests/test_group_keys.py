@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+
+import aggregate_csv_by_column
+import aggregate_csv_sum
+import csv_pipeline
+
+# Keys that are numbers in the first chunks and text in the later ones, '007' and '7' are the same number
+MIXED_KEYS = [str(i % 50) for i in range(3000)] + [f"x{i % 7}" for i in range(1000)] + ['007', '', '7'] * 10
+# Numbers only, the missing values make pandas read the whole column as floats
+NUMERIC_KEYS = [str(i % 50) for i in range(3000)] + ['007', '', '7'] * 10
+
+@pytest.fixture(params=[MIXED_KEYS, NUMERIC_KEYS], ids=['mixed', 'numeric'])
+def key_file(request, tmp_path):
+    path = tmp_path / 'keys.csv'
+    pd.DataFrame({'key': request.param, 'amount': range(len(request.param))}).to_csv(path, index=False)
+    return str(path)
+
+def expected_counts(path):
+    # The result of loading the whole file at once
+    return pd.read_csv(path).groupby('key').size().reset_index(name='Row Count')
+
+def test_count_groups_keys_spanning_chunks(key_file):
+    result = aggregate_csv_by_column.count_groups_in_chunks(key_file, 'key', chunksize=1000)
+    pd.testing.assert_frame_equal(result, expected_counts(key_file))
+
+def expected_sums(path):
+    # The result of the in-memory mode of aggregate_csv_sum.py
+    data = pd.read_csv(path)
+    cleaned_values, _ = aggregate_csv_sum.clean_numeric_column(data['amount'])
+    return cleaned_values.groupby(data['key']).sum().reset_index(name='Suma')
+
+def test_count_groups_keys_spanning_byte_ranges(key_file):
+    result = aggregate_csv_by_column.count_groups_in_parallel(key_file, 'key', workers=3)
+    pd.testing.assert_frame_equal(result, expected_counts(key_file))
+
+def test_sum_keys_spanning_byte_ranges(key_file):
+    result, total_valid, invalid_entries = aggregate_csv_sum.sum_in_parallel(key_file, 'key', 'amount', workers=3)
+    pd.testing.assert_frame_equal(result, expected_sums(key_file))
+    assert total_valid == len(pd.read_csv(key_file)) and invalid_entries == []
+
+def test_pipeline_keys_spanning_chunks(key_file, tmp_path, capsys):
+    output_dir = tmp_path / 'out'
+    assert csv_pipeline.main([key_file, '--count', 'key', '--sum', 'key', 'amount',
+                              '--output-dir', str(output_dir), '--chunksize', '1000']) == 0
+    assert (output_dir / 'export.csv').read_text() == expected_counts(key_file).to_csv(index=False)
+    assert (output_dir / 'export_suma.csv').read_text() == expected_sums(key_file).to_csv(index=False)
+
+def test_incremental_keys_spanning_runs(key_file, tmp_path, capsys):
+    # The first run sees only numbers, the appended rows add text keys and more rows of the saved keys
+    lines = open(key_file).read().splitlines(keepends=True)
+    growing = tmp_path / 'growing.csv'
+    growing.write_text(''.join(lines[:2000]))
+    aggregate_csv_by_column.count_groups_incremental(str(growing), 'key', chunksize=500)
+    aggregate_csv_sum.sum_incremental(str(growing), 'key', 'amount')
+    with open(growing, 'a') as file:
+        file.write(''.join(lines[2000:]))
+
+    counts = aggregate_csv_by_column.count_groups_incremental(str(growing), 'key', chunksize=500)
+    sums, total_valid, invalid_entries = aggregate_csv_sum.sum_incremental(str(growing), 'key', 'amount')
+    pd.testing.assert_frame_equal(counts, expected_counts(key_file))
+    pd.testing.assert_frame_equal(sums, expected_sums(key_file))
+    assert "Continuing from the checkpoint" in capsys.readouterr().out
+
+def expected_aggregates(path):
+    # The aggregates of the whole file loaded at once
+    data = pd.read_csv(path)
+    cleaned_values, _ = aggregate_csv_sum.clean_numeric_column(data['amount'])
+    grouped = cleaned_values.groupby(data['key'])
+    return pd.DataFrame({'amount_sum': grouped.sum(), 'amount_count': grouped.count(), 'amount_min': grouped.min(),
+                         'amount_max': grouped.max(), 'amount_mean': grouped.mean()}).reset_index()
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_aggregate_columns_keys_spanning_chunks(key_file, workers):
+    result, valid_counts, invalid_entries = aggregate_csv_sum.aggregate_columns(
+        key_file, ['key'], ['amount'], ['sum', 'count', 'min', 'max', 'mean'], workers=workers, chunksize=1000)
+    pd.testing.assert_frame_equal(result, expected_aggregates(key_file))
+    assert valid_counts == {'amount': len(pd.read_csv(key_file))} and invalid_entries == []
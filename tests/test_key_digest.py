@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import key_digest
+
+def first_and_last_rows(digests):
+    rows = {}
+    for row, digest in enumerate(digests):
+        rows.setdefault(digest, [row, row])[1] = row
+    return rows
+
+def test_table_keeps_the_first_and_last_row_of_every_digest():
+    # Few distinct digests that share their lowest bits (so they probe), inserted in chunks, the table grows
+    random = np.random.default_rng(0)
+    digests = (random.integers(0, 3000, size=20_000).astype(np.uint64) << np.uint64(3)) + np.uint64(5)
+    table = key_digest.DigestTable(capacity=16)
+    for start in range(0, len(digests), 1500):
+        chunk = digests[start:start + 1500]
+        _, is_new = table.add(chunk, None, np.arange(start, start + len(chunk)))
+        assert is_new.sum() == len(set(chunk.tolist()) - set(digests[:start].tolist()))
+
+    expected = first_and_last_rows(digests.tolist())
+    assert len(table) == len(expected)
+    slots = table.find(np.array(list(expected), dtype=np.uint64), None)
+    assert table.first[slots].tolist() == [rows[0] for rows in expected.values()]
+    assert table.last[slots].tolist() == [rows[1] for rows in expected.values()]
+    assert table.find(np.array([1, 2, 3 << 30], dtype=np.uint64), None).tolist() == [-1, -1, -1]
+
+def test_128_bit_digests_differ_in_the_low_half():
+    table = key_digest.DigestTable(bits=128, capacity=4)
+    high = np.array([7, 7, 7, 9], dtype=np.uint64)
+    low = np.array([1, 2, 1, 1], dtype=np.uint64)
+    _, is_new = table.add(high, low, np.arange(4))
+    assert is_new.tolist() == [True, True, False, True]
+    assert table.nbytes == 32 * len(table.first)
+
+def test_digests_of_equal_keys_are_equal():
+    df = pd.DataFrame({'a': ['x', 'y', 'x', None, None], 'b': [1, 2, 1, 3, 3], 'c': ['p', 'q', 'r', 's', 's']})
+    high, low = key_digest.digest_keys(df, ['a', 'b'], bits=128)
+    assert high[0] == high[2] and low[0] == low[2] and high[3] == high[4]
+    assert len(set(zip(high.tolist(), low.tolist()))) == 3
+    whole, _ = key_digest.digest_keys(df)
+    assert whole[0] != whole[2] and whole[3] == whole[4]
+
+@pytest.mark.parametrize('keep', ['first', 'last'])
+def test_verifier_separates_collided_keys(keep):
+    # Every key gets one of two digests, so different keys collide
+    keys = [('a',), ('b',), ('a',), ('c',), ('b',), ('d',), ('d',)]
+    digests = np.array([1, 1, 1, 2, 1, 2, 2], dtype=np.uint64)
+    rows = np.arange(len(keys))
+    table = key_digest.DigestTable()
+    slots, _ = table.add(digests, None, rows)
+    verifier = key_digest.DigestVerifier(table)
+    for start in range(0, len(keys), 3):
+        verifier.check(slots[start:start + 3], rows[start:start + 3], keys[start:start + 3])
+    assert verifier.collisions == 2
+
+    kept = key_digest.keep_mask(table, slots, rows, keep, verifier)
+    expected = pd.Series(keys).duplicated(keep=keep).to_numpy()
+    assert kept.tolist() == (~expected).tolist()
@@ -0,0 +1,85 @@
+import io
+import contextlib
+
+import pytest
+
+import chunk_pipeline
+import csv_pipeline
+import merge_two_csvs_by_column as merge
+
+LEFT = "key,name,qty\n007,a,1\n12,b,2\nx9,c,\n,d,4\n5,e,5\n"
+RIGHT = "key,city,zip\n007,Prague,1000\n12,Brno,60200\nx9,&amp;Olomouc,\n5,Plzen,30100\n"
+# The missing quantity is in the last chunk, the earlier chunks still have to write floats
+LATE_MISSING_LEFT = "key,qty\n0,0\n1,1\n2,2\n3,3\n4,4\n9,\n"
+LATE_MISSING_RIGHT = "key,city\n0,Prague\n3,Brno\n3,Plzen\n"
+# Numeric keys are joined by their value and written with the type of the whole column
+PADDED_LEFT = "key,qty\n7,1\n12,2\n,3\n0012,4\n"
+PADDED_RIGHT = "key,city\n007,Prague\n12.0,Brno\n7,Plzen\n"
+MODES = ['streaming', 'partitioned', 'pipeline', 'store', 'pipeline_store']
+
+def write_files(tmp_path, left_text, right_text):
+    left = tmp_path / 'left.csv'
+    right = tmp_path / 'right.csv'
+    left.write_text(left_text)
+    right.write_text(right_text)
+    return str(left), str(right)
+
+@pytest.fixture
+def merge_files(tmp_path):
+    return write_files(tmp_path, LEFT, RIGHT)
+
+def merged_text(tmp_path, mode, left, right, chunksize=2):
+    output = str(tmp_path / f'{mode}.csv')
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'memory':
+            chunk_pipeline.write_csv(merge.merge_files(left, right, 'key'), output)
+        elif mode == 'streaming':
+            merge.merge_files_streaming(left, right, 'key', output, chunksize=chunksize)
+        elif mode == 'partitioned':
+            merge.merge_files_partitioned(left, right, 'key', output, chunksize=chunksize, partitions=3)
+        elif mode.startswith('pipeline'):
+            output_dir = tmp_path / mode
+            options = ['--lookup-store'] if mode == 'pipeline_store' else []
+            assert csv_pipeline.main([left, '--merge', right, 'key', '--output-dir', str(output_dir),
+                                      '--chunksize', str(chunksize)] + options) == 0
+            output = str(output_dir / 'merged_output.csv')
+        else:
+            merge.merge_files_with_store(left, right, 'key', output, chunksize=chunksize)
+    with open(output) as file:
+        return file.read()
+
+@pytest.mark.parametrize('mode', MODES)
+def test_merge_modes_write_the_same_file(tmp_path, merge_files, mode):
+    expected = merged_text(tmp_path, 'memory', *merge_files)
+    assert expected.splitlines()[1] == '007,a,1.0,Prague,1000.0'
+    assert merged_text(tmp_path, mode, *merge_files) == expected
+
+@pytest.mark.parametrize('mode', MODES)
+def test_missing_value_in_a_later_chunk_makes_the_whole_column_float(tmp_path, mode):
+    files = write_files(tmp_path, LATE_MISSING_LEFT, LATE_MISSING_RIGHT)
+    expected = merged_text(tmp_path, 'memory', *files)
+    assert expected.splitlines()[1:5] == ['0,0.0,Prague', '1,1.0,', '2,2.0,', '3,3.0,Brno']
+    assert merged_text(tmp_path, mode, *files, chunksize=3) == expected
+
+@pytest.mark.parametrize('mode', MODES)
+def test_zero_padded_keys_match_by_value(tmp_path, mode):
+    files = write_files(tmp_path, PADDED_LEFT, PADDED_RIGHT)
+    expected = merged_text(tmp_path, 'memory', *files)
+    assert expected.splitlines()[1:] == ['7.0,1,Prague', '12.0,2,Brno', ',3,', '12.0,4,Brno']
+    assert merged_text(tmp_path, mode, *files) == expected
+
+@pytest.mark.parametrize('mode', ['streaming', 'partitioned', 'store'])
+def test_numeric_key_is_not_joined_with_text_key(tmp_path, mode):
+    files = write_files(tmp_path, "key,qty\n7,1\n", "key,city\nx7,Prague\n")
+    with pytest.raises(ValueError):
+        merged_text(tmp_path, 'memory', *files)
+    with pytest.raises(ValueError):
+        merged_text(tmp_path, mode, *files)
+
+def test_store_is_reused_with_the_same_result(tmp_path, merge_files, capsys):
+    first = merged_text(tmp_path, 'store', *merge_files)
+    output = str(tmp_path / 'again.csv')
+    merge.merge_files_with_store(*merge_files, 'key', output, chunksize=2)
+    assert "Using the lookup store" in capsys.readouterr().out
+    with open(output) as file:
+        assert file.read() == first
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+import find_missing_values
+
+@pytest.fixture
+def wide_file(tmp_path):
+    # Many columns with issues, spread over several chunks
+    rows = 250
+    data = {f"c{i}": [None if (row + i) % 7 == 0 else (' ' if (row * i) % 11 == 3 else str(row))
+                      for row in range(rows)]
+            for i in range(300)}
+    path = tmp_path / 'wide.csv'
+    pd.DataFrame(data).to_csv(path, index=False)
+    return str(path)
+
+def test_chunked_report_matches_in_memory_report(tmp_path, wide_file, capsys):
+    expected_path = tmp_path / 'expected.txt'
+    chunked_path = tmp_path / 'chunked.txt'
+    df = pd.read_csv(wide_file, dtype=str)
+    expected_report, detailed_issues = find_missing_values.scan_missing_values(df)
+    find_missing_values.generate_report(expected_report, detailed_issues, expected_path)
+
+    report = find_missing_values.scan_missing_values_in_chunks(wide_file, chunked_path, chunksize=60)
+
+    assert report == expected_report
+    assert chunked_path.read_text() == expected_path.read_text()
+
+@pytest.mark.parametrize('block_size', [64, 1 << 20], ids=['small_blocks', 'one_block'])
+def test_byte_report_matches_in_memory_report(tmp_path, wide_file, block_size, capsys):
+    # Quoted values, missing value markers, a blank line and a short row
+    tricky = tmp_path / 'tricky.csv'
+    tricky.write_text('a,b,c\n1," ",NA\n"x,y",,3\n\n"", ,null\n4,5\n6,"line\nbreak", \n')
+    for path in (wide_file, str(tricky)):
+        expected_path = tmp_path / 'expected.txt'
+        byte_path = tmp_path / 'bytes.txt'
+        df = pd.read_csv(path, dtype=str)
+        expected_report, detailed_issues = find_missing_values.scan_missing_values(df)
+        find_missing_values.generate_report(expected_report, detailed_issues, expected_path)
+
+        report = find_missing_values.scan_missing_values_in_bytes(path, byte_path, block_size)
+
+        assert report == expected_report
+        assert byte_path.read_text() == expected_path.read_text()
+
+def test_byte_scan_falls_back_on_unsupported_files(tmp_path):
+    path = tmp_path / 'long_row.csv'
+    path.write_text("a,b\n1,2\n3,4,5\n")
+    assert find_missing_values.scan_missing_values_in_bytes(str(path), tmp_path / 'report.txt') is None
@@ -0,0 +1,35 @@
+import threading
+
+import pytest
+
+import csv_pipeline
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text("id,name\n" + ''.join(f"{i % 7},name {i}\n" for i in range(50)))
+    return path
+
+def run(tmp_path, *arguments):
+    return csv_pipeline.main([*map(str, arguments), '--output-dir', str(tmp_path / 'out'), '--chunksize', '10'])
+
+def writer_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('write ')]
+
+def test_failing_stage_aborts_the_stages_created_before(tmp_path, data_file, capsys):
+    right = tmp_path / 'right.csv'
+    right.write_text("other,city\n1,Prague\n")
+    assert run(tmp_path, data_file, '--dedupe', 'id', '--missing', '--merge', right, 'id') == 1
+    assert "Column 'id' does not exist" in capsys.readouterr().err
+    assert not writer_threads()
+    assert not (tmp_path / 'out' / 'cleaned_data.csv').exists()
+
+def test_failing_finish_removes_only_unfinished_outputs(tmp_path, data_file, capsys):
+    # The ids are numbers, the keys of the second file are text
+    right = tmp_path / 'right.csv'
+    right.write_text("id,city\nx7,Prague\n")
+    assert run(tmp_path, data_file, '--dedupe', 'id', '--merge', right, 'id') == 1
+    assert "cannot be joined with text" in capsys.readouterr().err
+    assert not writer_threads()
+    assert len((tmp_path / 'out' / 'cleaned_data.csv').read_text().splitlines()) == 8
+    assert not (tmp_path / 'out' / 'merged_output.csv').exists()
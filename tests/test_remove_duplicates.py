@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+import csv_pipeline
+import remove_duplicates
+
+@pytest.fixture
+def duplicated_file(tmp_path):
+    # Keys repeat across chunks, the values are written back exactly as they are in the file
+    path = tmp_path / 'data.csv'
+    lines = ['id,name,amount'] + [f"{i % 37:03d},name {i},{i}.50" for i in range(500)] + ['007,,NA']
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+def expected_rows(path):
+    # The result of the in-memory mode
+    data = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return data.drop_duplicates(subset='id').to_csv(index=False)
+
+def test_streaming_matches_in_memory(tmp_path, duplicated_file, capsys):
+    output = tmp_path / 'cleaned.csv'
+    counts = remove_duplicates.remove_duplicates_streaming(duplicated_file, 'id', str(output), chunksize=50)
+    assert counts == (501, 37)
+    assert output.read_text() == expected_rows(duplicated_file)
+    assert "Warning" not in capsys.readouterr().out
+
+def test_partitioned_matches_in_memory(tmp_path, duplicated_file, capsys):
+    output = tmp_path / 'cleaned.csv'
+    counts = remove_duplicates.remove_duplicates_partitioned(duplicated_file, 'id', str(output), chunksize=50,
+                                                             partitions=4)
+    assert counts == (501, 37)
+    assert output.read_text() == expected_rows(duplicated_file)
+
+def test_streaming_warns_when_falling_back_to_partitions(tmp_path, duplicated_file, capsys):
+    output = tmp_path / 'cleaned.csv'
+    counts = remove_duplicates.remove_duplicates_streaming(duplicated_file, 'id', str(output), chunksize=10,
+                                                           max_keys=20)
+    assert counts == (501, 37)
+    assert output.read_text() == expected_rows(duplicated_file)
+    assert "Warning: more than 20 distinct keys found after 30 rows" in capsys.readouterr().out
+
+@pytest.mark.parametrize('max_keys', [1000, 20], ids=['in memory', 'partitions'])
+def test_pipeline_stage_matches_in_memory(tmp_path, duplicated_file, monkeypatch, capsys, max_keys):
+    monkeypatch.setattr(remove_duplicates, 'MAX_KEYS_IN_MEMORY', max_keys)
+    assert csv_pipeline.main([duplicated_file, '--dedupe', 'id', '--output-dir', str(tmp_path),
+                              '--chunksize', '10']) == 0
+    assert (tmp_path / 'cleaned_data.csv').read_text() == expected_rows(duplicated_file)
+    assert ("Warning: more than 20 distinct keys found after 30 rows" in capsys.readouterr().out) == (max_keys == 20)
+
+def expected_rows_by(path, columns, keep):
+    data = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return data.drop_duplicates(subset=columns, keep=keep).to_csv(index=False)
+
+@pytest.mark.parametrize('keep, verify', [('first', False), ('last', False), ('first', True), ('last', True)])
+@pytest.mark.parametrize('columns', [['id', 'amount'], None], ids=['columns', 'whole rows'])
+def test_digest_streaming_matches_in_memory(tmp_path, duplicated_file, capsys, columns, keep, verify):
+    output = tmp_path / 'cleaned.csv'
+    with open(duplicated_file, 'a') as file:
+        file.write('001,name 1,1.50\n' * 3 + '001,other,1.50\n')
+    counts = remove_duplicates.remove_duplicates_by_digest_streaming(duplicated_file, columns, str(output),
+                                                                     keep=keep, verify=verify, chunksize=40)
+    expected = expected_rows_by(duplicated_file, columns, keep)
+    assert counts == (505, expected.count('\n') - 1)
+    assert output.read_text() == expected
+
+@pytest.mark.parametrize('keep', ['first', 'last'])
+@pytest.mark.parametrize('columns', [['id', 'name'], None], ids=['columns', 'whole rows'])
+def test_digest_in_memory_matches_drop_duplicates(duplicated_file, monkeypatch, capsys, columns, keep):
+    monkeypatch.setenv(remove_duplicates.key_digest.BITS_VARIABLE, '128')
+    data = pd.read_csv(duplicated_file)
+    data = pd.concat([data, data.iloc[::3]], ignore_index=True)
+    result = remove_duplicates.remove_duplicates_and_show_stats(data, columns, keep, verify=True)
+    pd.testing.assert_frame_equal(result, data.drop_duplicates(subset=columns, keep=keep))
+
+@pytest.mark.parametrize('keep', ['first', 'last'])
+def test_digest_collisions_are_found_by_verification(tmp_path, duplicated_file, monkeypatch, capsys, keep):
+    # Digests of only 3 bits make most keys collide
+    digest_keys = remove_duplicates.key_digest.digest_keys
+    monkeypatch.setattr(remove_duplicates.key_digest, 'digest_keys',
+                        lambda *args: (digest_keys(*args)[0] & 7, None))
+    output = tmp_path / 'cleaned.csv'
+    remove_duplicates.remove_duplicates_by_digest_streaming(duplicated_file, ['id', 'amount'], str(output),
+                                                            keep=keep, verify=True, chunksize=40)
+    assert output.read_text() == expected_rows_by(duplicated_file, ['id', 'amount'], keep)
+    assert "shared by different values (kept by their exact values): 8" in capsys.readouterr().out
+
+    remove_duplicates.remove_duplicates_by_digest_streaming(duplicated_file, ['id', 'amount'], str(output),
+                                                            keep=keep, chunksize=40)
+    assert output.read_text().count('\n') == 9
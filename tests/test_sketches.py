@@ -0,0 +1,81 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregate_csv_by_column
+import sketches
+
+def test_bit_length_of_uint64_values():
+    values = [0, 1, 2, 3, 2 ** 31, 2 ** 32 - 1, 2 ** 32, 2 ** 53 + 1, 2 ** 63, 2 ** 64 - 1]
+    random = np.random.default_rng(0).integers(0, 2 ** 63, size=1000, dtype=np.uint64) << np.uint64(1)
+    values = np.concatenate((np.array(values, dtype=np.uint64), random))
+    assert sketches.bit_length(values).tolist() == [int(value).bit_length() for value in values.tolist()]
+
+@pytest.mark.parametrize('distinct_count', [100, 200_000])
+def test_hyperloglog_estimate_is_within_the_error(distinct_count):
+    values = pd.Series(np.arange(distinct_count)).astype(str)
+    sketch = sketches.HyperLogLog()
+    sketch.add_hashes(sketches.hash_values(values))
+    estimate = sketch.estimate()
+    # Duplicates do not change the estimate
+    sketch.add_hashes(sketches.hash_values(values[::3]))
+    assert sketch.estimate() == estimate
+    assert abs(estimate - distinct_count) <= 4 * sketch.relative_error() * distinct_count
+
+def test_hyperloglog_merge_equals_one_sketch():
+    values = pd.Series([f"value {i}" for i in range(5000)])
+    whole, first, second = sketches.HyperLogLog(), sketches.HyperLogLog(), sketches.HyperLogLog()
+    whole.add_hashes(sketches.hash_values(values))
+    first.add_hashes(sketches.hash_values(values[:3000]))
+    second.add_hashes(sketches.hash_values(values[2000:]))
+    first.merge(second)
+    assert np.array_equal(first.registers, whole.registers)
+
+def test_count_min_never_underestimates():
+    random = np.random.default_rng(1)
+    values = pd.Series(random.zipf(1.5, size=50_000) % 5000).astype(str)
+    counts = values.value_counts()
+    sketch = sketches.CountMinSketch(epsilon=1e-3)
+    # Added in two parts, the counts of the same value are summed
+    for part in (values[:20_000], values[20_000:]):
+        part_counts = part.value_counts()
+        sketch.add_hashes(sketches.hash_values(part_counts.index), part_counts.to_numpy())
+    estimates = sketch.estimate_hashes(sketches.hash_values(counts.index))
+    max_overestimate, probability = sketch.error_bound()
+    assert sketch.total == len(values)
+    assert (estimates >= counts.to_numpy()).all()
+    assert (estimates - counts.to_numpy() <= max_overestimate).mean() >= probability
+
+def test_top_k_finds_the_most_frequent_values():
+    random = np.random.default_rng(2)
+    values = pd.Series(random.zipf(1.3, size=100_000)).astype(str)
+    sketch = sketches.CountMinSketch()
+    top = sketches.TopK(10, sketch)
+    for start in range(0, len(values), 7000):
+        part_counts = values[start:start + 7000].value_counts(sort=False)
+        hashes = sketches.hash_values(part_counts.index)
+        sketch.add_hashes(hashes, part_counts.to_numpy())
+        top.update(part_counts.index, hashes)
+    counts = values.value_counts()
+    assert [value for value, _ in top.items()] == counts.index[:10].tolist()
+    assert [estimate for _, estimate in top.items()] == counts.iloc[:10].tolist()
+
+def test_count_groups_approximate_matches_exact_counts(tmp_path, capsys):
+    # Group i occurs 2 * i + 1 times, the rows of a group are spread over all chunks
+    keys = [f"g{i}" for i in range(200) for _ in range(2 * i + 1)]
+    keys = keys[::2] + keys[1::2] + [''] * 5
+    path = tmp_path / 'groups.csv'
+    pd.DataFrame({'key': keys, 'amount': range(len(keys))}).to_csv(path, index=False)
+
+    result = aggregate_csv_by_column.count_groups_approximate(str(path), 'key', top_k=20, chunksize=3000)
+
+    expected = [(f"g{i}", 2 * i + 1) for i in range(199, 179, -1)]
+    assert list(result.columns) == ['key', 'Estimated Row Count']
+    assert list(result.itertuples(index=False, name=None)) == expected
+    output = capsys.readouterr().out
+    assert "Processed 40000 rows with a value" in output
+    estimate = float(re.search(r"distinct groups: ([\d,]+)", output).group(1).replace(',', ''))
+    assert abs(estimate - 200) <= 4 * sketches.HyperLogLog().relative_error() * 200
+    assert "higher by at most 0." in output
@@ -0,0 +1,44 @@
+import atexit
+import sys
+import tracemalloc
+
+import pytest
+
+import csv_pipeline
+import stage_timer
+
+@pytest.fixture
+def timer(monkeypatch):
+    # Every test starts with the instrumentation off and no summary printed at exit
+    monkeypatch.setattr(stage_timer, 'ENABLED', False)
+    monkeypatch.setattr(stage_timer, 'TRACE_PYTHON_MEMORY', False)
+    monkeypatch.setattr(stage_timer, '_finished_stages', [])
+    monkeypatch.setattr(atexit, 'register', lambda function: None)
+    monkeypatch.delenv(stage_timer.TRACEMALLOC_VARIABLE, raising=False)
+    yield stage_timer
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def test_profile_flag_of_the_pipeline_turns_the_stages_on(timer, tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text("key,amount\na,1\nb,2\na,3\n")
+    assert csv_pipeline.main([str(path), '--count', 'key', '--output-dir', str(tmp_path)]) == 0
+    assert not timer._finished_stages
+
+    assert csv_pipeline.main([str(path), '--count', 'key', '--output-dir', str(tmp_path), '--profile']) == 0
+    stages = {entry['stage']: entry for entry in timer.summarize(timer._finished_stages)}
+    assert stages['group count']['rows'] == 3
+    assert not tracemalloc.is_tracing()
+    if sys.platform.startswith('linux'):
+        # The resident memory of the process
+        assert stages['group count']['peak_mb'] > 1
+
+def test_tracemalloc_is_a_separate_option(timer, monkeypatch):
+    monkeypatch.setenv(stage_timer.TRACEMALLOC_VARIABLE, '1')
+    timer.enable()
+    assert tracemalloc.is_tracing()
+    with timer.stage('allocate'):
+        data = bytearray(8 * 1024 * 1024)
+    del data
+    entry, = timer.summarize(timer._finished_stages)
+    assert 8 <= entry['peak_mb'] < 20